@@ -1,22 +1,24 @@
 import streamlit as st
-import pandas as pd
-import json
-import time
-import snowflake.connector
-import io
 import os
-import tempfile
-import base64
-import re
-from PIL import Image
+import contextvars
+import threading
+import time
+from streamlit.runtime.scriptrunner import add_script_run_ctx
 
 # LANGCHAIN IMPORTS
-from modules.database import search_products_by_vector
-from modules.embedder import get_text_embedding, get_image_embedding_from_bytes
-from modules.llm import get_llm_cortex
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.messages import HumanMessage, AIMessage # Tambahan untuk manual history
+from modules.database import search_products_by_vector, search_products_by_vectors, db_connection, get_search_config, get_catalog_sync, fetch_products_by_keys, get_known_brands, get_similar_products, get_connection_pool, get_neighbor_table
+from modules.embedder import get_text_embedding, get_image_embedding_from_bytes, get_multimodal_embedding, embed_batch, get_voyage_client, get_embedding_cache
+# modules.llm (LangChain) is imported on the chat path only, to keep the first paint fast
+from modules.pipeline import answer_turn, record_answer, format_timings, build_answer_chain, DIRECT_RESPONSE_THOUGHT
+from modules.image_store import ImageStore
+from modules.featured import FeaturedCollection, FEATURED_QUERIES
+from modules.vision import VisionService
+from modules.intent import PrototypeIntentClassifier, SmartRouter
+from modules.context import build_context
+from modules.memory import new_memory_state, ProductCache
+from modules.response_cache import SemanticResponseCache
+from modules import telemetry
+from modules.telemetry import Telemetry, waterfall, format_waterfall
 
 # ==========================================
 # 0. CONFIG & SAFETY CHECK
@@ -73,8 +75,8 @@ if "messages" not in st.session_state:
     st.session_state.messages = [
         {"role": "assistant", "content": "Hi! I'm SoleMate. Upload a photo or describe what you're looking for!", "type": "text"}
     ]
-if "image_cache" not in st.session_state:
-    st.session_state.image_cache = {}
+if "memory" not in st.session_state:
+    st.session_state.memory = new_memory_state()
 
 def switch_page(page_name):
     st.session_state.page = page_name
@@ -83,151 +85,206 @@ def switch_page(page_name):
 # ==========================================
 # 2. HELPER FUNCTIONS
 # ==========================================
+@st.cache_resource
+def get_image_store():
+    """
+    Process-wide on-disk image cache shared by every session (survives restarts).
+    Tune with an optional [images] section in secrets.toml.
+    """
+    cfg = st.secrets.get("images", {})
+    return ImageStore(
+        cfg.get("cache_dir", os.path.join(".cache", "images")),
+        max_bytes=int(cfg.get("max_mb", 512)) * 1024 * 1024,
+    )
+
 def fetch_images_batch(filenames):
-    missing_files = [f for f in filenames if f and f not in st.session_state.image_cache]
-    if not missing_files: return 
-    conn = None
     try:
-        conn = snowflake.connector.connect(**st.secrets["snowflake"])
-        cursor = conn.cursor()
-        for filename in missing_files:
-            try:
-                with tempfile.TemporaryDirectory() as tmpdirname:
-                    safe_tmp_path = tmpdirname.replace(os.sep, '/')
-                    sql = f"GET {STAGE_PATH}/{filename} file://{safe_tmp_path}"
-                    cursor.execute(sql)
-                    downloaded_path = os.path.join(tmpdirname, filename)
-                    possible_gz_path = downloaded_path + ".gz"
-                    final_path = downloaded_path if os.path.exists(downloaded_path) else (possible_gz_path if os.path.exists(possible_gz_path) else None)
-                    if final_path:
-                        with open(final_path, "rb") as f: st.session_state.image_cache[filename] = f.read()
-                    else: st.session_state.image_cache[filename] = None 
-            except Exception: st.session_state.image_cache[filename] = None
+        get_image_store().fetch(filenames, db_connection, STAGE_PATH)
     except Exception: pass
-    finally:
-        if conn: conn.close()
 
-def render_product_image(filename, use_container_width=True):
-    data = st.session_state.image_cache.get(filename)
-    if data: st.image(data, use_container_width=use_container_width)
+@st.cache_resource
+def get_featured_collection():
+    """
+    Home gallery service. The candidate pool is refreshed in the background
+    (tune with an optional [featured] section in secrets.toml).
+    """
+    cfg = st.secrets.get("featured", {})
+    queries = list(cfg.get("queries", FEATURED_QUERIES))
+    pool_size = int(cfg.get("pool_size", 50))
+
+    def _load_pool():
+        # Every featured query in one round-trip
+        vectors = [get_text_embedding(q) for q in queries]
+        return search_products_by_vectors([v for v in vectors if len(v)], limit=pool_size)
+
+    def _prepare_images(filenames):
+        fetch_images_batch(filenames)
+        for filename in filenames:
+            get_image_store().get_variant(filename, "grid")
+
+    featured = FeaturedCollection(
+        _load_pool,
+        prepare_images=_prepare_images,
+        snapshot_path=cfg.get("snapshot_path", os.path.join(".cache", "featured", "pool.json")),
+        page_size=int(cfg.get("page_size", 20)),
+        refresh_interval=int(cfg.get("refresh_interval", 3600)),
+        rotation_seconds=int(cfg.get("rotation_seconds", 600)),
+    )
+    featured.start()
+    return featured
+
+def render_product_image(filename, use_container_width=True, variant="grid"):
+    # Grids get the small WebP thumbnail; the popup asks for variant="popup"
+    path = get_image_store().get_variant(filename, variant)
+    if path: st.image(path, use_container_width=use_container_width)
     else: st.image("https://via.placeholder.com/300x200?text=Image+Not+Found", use_container_width=use_container_width)
 
 def format_context_json(df):
-    if df.empty: return "[]"
-    products = []
-    for _, row in df.iterrows():
-        products.append({
-            "product_name": row['TITLE'],
-            "brand": row['BRAND'],
-            "price": row['PRICE'],
-            "features": row['PRODUCT_DETAILS_CLEAN'][:300] 
-        })
-    return json.dumps(products)
-
-# --- ROBUST JSON PARSER (IMPROVED) ---
-def extract_json_from_text(text):
     """
-    Satpam yang lebih galak mencari JSON valid.
+    Compact prompt context: near-duplicate variants dropped, MMR-diversified,
+    one `name | brand | price | features` line per product, fitted to a token
+    budget (tunable in an optional [context] section of secrets.toml).
     """
-    try:
-        # 1. Coba parse langsung (Ideal)
-        return json.loads(text)
-    except json.JSONDecodeError:
-        pass
-
-    try:
-        # 2. Coba cari blok code ```json ... ```
-        match = re.search(r"```json\s*(.*?)\s*```", text, re.DOTALL)
-        if match:
-            return json.loads(match.group(1))
-        
-        # 3. Coba cari kurung kurawal terluar (Greedy)
-        # Menangkap dari { pertama sampai } terakhir
-        match_bracket = re.search(r"(\{.*\})", text, re.DOTALL)
-        if match_bracket:
-            return json.loads(match_bracket.group(1))
-            
-    except Exception:
-        pass
-        
-    return None 
+    cfg = st.secrets.get("context", {})
+    return build_context(
+        df,
+        token_budget=int(cfg.get("token_budget", 600)),
+        max_products=int(cfg.get("max_products", 8)),
+        features_chars=int(cfg.get("features_chars", 200)),
+        diversity=float(cfg.get("diversity", 0.3)),
+    )
 
 # ==========================================
 # 3. CORE AI MODULES
 # ==========================================
+@st.cache_resource
+def get_vision_service():
+    """
+    Vision descriptions with hash-named staging and a description cache.
+    Tune with an optional [vision] section in secrets.toml.
+    """
+    from modules.llm import get_cortex_client
+    cfg = st.secrets.get("vision", {})
+    service = VisionService(
+        db_connection, STAGE_PATH,
+        max_side=int(cfg.get("max_side", 1024)),
+        cache_size=int(cfg.get("cache_size", 512)),
+        staged_ttl=int(cfg.get("staged_ttl", 3600)),
+        cortex=get_cortex_client(),
+    )
+    service.start_janitor(int(cfg.get("janitor_interval", 600)))
+    return service
+
 def analyze_image_with_cortex(image_file):
-    conn = None
-    tmp_path = None
-    try:
-        conn = snowflake.connector.connect(**st.secrets["snowflake"])
-        cursor = conn.cursor()
-        image_file.seek(0)
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg", mode='wb') as tmp:
-            tmp.write(image_file.read())
-            tmp_path = tmp.name
-        abs_path = os.path.abspath(tmp_path).replace("\\", "/")
-        put_query = f"PUT 'file://{abs_path}' {STAGE_PATH}/temp_vision/ AUTO_COMPRESS=FALSE OVERWRITE=TRUE"
-        cursor.execute(put_query)
-        put_result = cursor.fetchone()
-        if put_result[6] != 'UPLOADED': return f"ERROR_VISION: Upload Failed."
-        target_filename = os.path.basename(abs_path)
-        stage_file_path = f"temp_vision/{target_filename}"
-        model = 'claude-3-5-sonnet'
-        prompt = "Describe this image in detail. Is it footwear? If yes, describe color, material, and style. If no, say what object it is."
-        sql_query = f"SELECT SNOWFLAKE.CORTEX.COMPLETE('{model}', '{prompt}', TO_FILE('{STAGE_PATH}', '{stage_file_path}'))"
-        cursor.execute(sql_query)
-        result = cursor.fetchone()
-        return str(result[0]) if result else "No description returned."
-    except Exception as e: return f"ERROR_VISION: {str(e)}"
-    finally:
-        if tmp_path and os.path.exists(tmp_path):
-            try: os.remove(tmp_path)
-            except: pass 
-        if conn: conn.close()
+    return get_vision_service().describe(image_file)
+
+@st.cache_resource
+def get_smart_router():
+    """
+    Tiered intent router shared by all sessions. The LLM is only called when
+    the local classifier's confidence is below [router] local_threshold.
+    """
+    from modules.llm import get_llm_cortex
+    cfg = st.secrets.get("router", {})
+    classifier = PrototypeIntentClassifier(
+        lambda texts: list(embed_batch(texts, input_type="query")),
+        threshold=float(cfg.get("local_threshold", 0.05)),
+    )
+    return SmartRouter(get_text_embedding, classifier, get_llm_cortex)
+
+@st.cache_resource
+def get_product_cache():
+    return ProductCache()
+
+def get_telemetry_config():
+    cfg = st.secrets.get("telemetry", {})
+    return {
+        "spans_path": cfg.get("spans_path", ""),
+        "metrics_path": cfg.get("metrics_path", os.path.join(".cache", "telemetry", "metrics.prom")),
+        "metrics_port": int(cfg.get("metrics_port", 0)),
+        "debug_panel": bool(cfg.get("debug_panel", False)),
+    }
+
+@st.cache_resource
+def get_telemetry():
+    """
+    Process-wide turn tracing. Configure exports with an optional [telemetry]
+    section in secrets.toml (metrics file / HTTP endpoint, JSONL span log).
+    """
+    cfg = get_telemetry_config()
+    return Telemetry(
+        spans_path=cfg["spans_path"] or None,
+        metrics_path=cfg["metrics_path"] or None,
+        metrics_port=cfg["metrics_port"],
+    )
+
+def get_memory_config():
+    cfg = st.secrets.get("memory", {})
+    return {
+        "token_budget": int(cfg.get("token_budget", 1500)),
+        "max_messages": int(cfg.get("max_messages", 12)),
+    }
+
+@st.cache_resource
+def get_response_cache():
+    """
+    Semantic cache of generated answers for SEARCH turns, shared by all sessions.
+    Tune with an optional [response_cache] section in secrets.toml.
+    """
+    cfg = st.secrets.get("response_cache", {})
+    cache = SemanticResponseCache(
+        threshold=float(cfg.get("threshold", 0.95)),
+        ttl_seconds=int(cfg.get("ttl_seconds", 3600)),
+        capacity=int(cfg.get("capacity", 2000)),
+    )
+    if get_search_config()["backend"] == "local":
+        get_catalog_sync().add_listener(cache.invalidate)
+    return cache
 
 def smart_router(user_text, image_desc):
-    # 1. Fallback Cepat
-    greetings = ['hi', 'hello', 'hey', 'p', 'halo', 'test', 'pagi', 'siang', 'malam']
-    text_lower = user_text.lower().strip()
-    
-    if len(user_text.split()) < 3 and text_lower in greetings:
-        return {"is_footwear": True, "intent": "CHAT"}
-        
-    # Keywords teknis -> Chat
-    keywords_chat = ["model", "who are you", "what are you", "siapa kamu", "ai", "gemini", "gpt", "architecture", "llm"]
-    if any(k in text_lower for k in keywords_chat):
-        return {"is_footwear": True, "intent": "CHAT"}
-
-    # 2. LLM Based Router
-    system_prompt = """
-    You are a Smart Router.
-    INPUTS: User Text: "{user_text}", Image Desc: "{image_desc}"
-    
-    RULES:
-    1. IS_FOOTWEAR: False if image describes car/animal/food. True if shoes or No image.
-    2. INTENT: 
-       - SEARCH: User explicitly asks to FIND, BUY, SHOW, RECOMMEND products.
-       - CHAT: Greetings, General talk, Questions about the AI ("what model", "who made you"), Questions NOT about buying.
-       - If is_footwear=False -> CHAT.
-       
-    OUTPUT JSON ONLY: {{"is_footwear": true/false, "intent": "SEARCH" or "CHAT"}}
+    return get_smart_router().route(user_text, image_desc)
+
+def get_grid_page_size():
+    return int(st.secrets.get("chat", {}).get("grid_page_size", 5))
+
+@st.fragment
+def product_grid(product_ids, key, expanded=False):
     """
-    try:
-        prompt = ChatPromptTemplate.from_template(system_prompt)
-        llm = get_llm_cortex() 
-        chain = prompt | llm | StrOutputParser() 
-        raw_response = chain.invoke({"user_text": user_text, "image_desc": image_desc})
-        parsed = extract_json_from_text(raw_response)
-        
-        if parsed: return parsed
-        else: return {"is_footwear": True, "intent": "CHAT"} 
-            
-    except:
-        return {"is_footwear": True, "intent": "CHAT"}
+    Chat result grid, rendered as a fragment: opening it, paging and clicking
+    View rerun only this grid. Collapsed grids do no work at all; open ones
+    fetch images and rows for the visible page only.
+    """
+    page_size = get_grid_page_size()
+    # The key changes with `expanded`, so a grid that is no longer the latest starts collapsed again
+    if not st.toggle(f"👟 Show {len(product_ids)} Recommendations", value=expanded, key=f"{key}_open_{int(expanded)}"):
+        return
+    shown = min(st.session_state.get(f"{key}_shown", page_size), len(product_ids))
+    visible = product_ids[:shown]
+    fetch_images_batch(visible)
+    df_products = get_product_cache().frame(visible, loader=fetch_products_by_keys)
+    cols = st.columns(5)
+    for idx, row in enumerate(df_products.to_dict("records")):
+        with cols[idx % 5]:
+            with st.container(border=True):
+                render_product_image(row['IMAGE_FILENAME'], use_container_width=True)
+                st.markdown(f"<div class='product-card-title' title='{row['TITLE']}'>{row['TITLE'][:18]}..</div>", unsafe_allow_html=True)
+                st.markdown(f"<div class='product-card-price'>{row['PRICE']}</div>", unsafe_allow_html=True)
+                if st.button("View", key=f"{key}_btn_{idx}", use_container_width=True):
+                    show_product_popup(row)
+    if shown < len(product_ids):
+        st.button(f"⬇️ Load more ({len(product_ids) - shown} more)", key=f"{key}_more",
+                  on_click=lambda: st.session_state.update({f"{key}_shown": shown + page_size}))
+
+@st.fragment(run_every=10)
+def featured_pending():
+    """Placeholder until the background thread has built the first featured pool; then reruns the page."""
+    if not get_featured_collection().page().empty:
+        st.rerun()
+    st.info("Loading collection...")
 
 @st.dialog("✨ Product Details")
 def show_product_popup(product):
-    render_product_image(product['IMAGE_FILENAME'], use_container_width=True)
+    render_product_image(product['IMAGE_FILENAME'], use_container_width=True, variant="popup")
     st.markdown(f"### {product['TITLE']}")
     st.caption(f"Brand: {product['BRAND']}")
     col_price, col_btn = st.columns([1,1])
@@ -238,6 +295,17 @@ def show_product_popup(product):
     st.divider()
     st.markdown("**Description & Features:**")
     st.info(product['PRODUCT_DETAILS_CLEAN'])
+    # Precomputed neighbours: a dict lookup, no embedding or search round-trip
+    similar = get_similar_products(product['IMAGE_FILENAME'], limit=5)
+    if not similar.empty:
+        st.markdown("**You may also like:**")
+        fetch_images_batch(similar['IMAGE_FILENAME'].tolist())
+        cols = st.columns(len(similar))
+        for col, row in zip(cols, similar.to_dict("records")):
+            with col:
+                render_product_image(row['IMAGE_FILENAME'], use_container_width=True)
+                st.markdown(f"<div class='product-card-title' title='{row['TITLE']}'>{row['TITLE'][:18]}..</div>", unsafe_allow_html=True)
+                st.markdown(f"<div class='product-card-price'>{row['PRICE']}</div>", unsafe_allow_html=True)
 
 # ==========================================
 # 4. SIDEBAR CONFIGURATION
@@ -267,8 +335,14 @@ with st.sidebar:
             st.session_state.messages = [
                 {"role": "assistant", "content": "Hi! I'm SoleMate. Upload a photo or describe what you're looking for!", "type": "text"}
             ]
-            st.session_state.image_cache = {}
+            st.session_state.memory = new_memory_state()
             st.rerun()
+        cache_stats = get_response_cache().stats()
+        if cache_stats["hits"]:
+            st.caption(f"♻️ Answer cache: {cache_stats['hit_rate']:.0%} hits · {cache_stats['saved_seconds']:.1f}s saved")
+        vision_stats = get_vision_service().stats()
+        if vision_stats["cache_hits"] or vision_stats["put_skipped"]:
+            st.caption(f"👁️ Vision: {vision_stats['cache_hits']} cached · {vision_stats['put_skipped']} uploads skipped")
 
 # ==========================================
 # 5. PAGE 1: HOME (PRODUCT GALLERY)
@@ -277,14 +351,8 @@ if st.session_state.page == "home":
     st.title("🛍️ Featured Collection")
     st.caption("Explore our latest arrivals. Click 'Ask SoleMate' to find something specific!")
     
-    @st.cache_data(ttl=600)
-    def get_home_products():
-        vector = get_text_embedding("stylish footwear sneakers boots") 
-        df = search_products_by_vector(vector, limit=50) 
-        if not df.empty: return df.sample(n=min(20, len(df)), random_state=int(time.time()))
-        return pd.DataFrame()
-
-    home_products = get_home_products()
+    # Precomputed pool, rotated in memory: no Voyage / Snowflake call per render
+    home_products = get_featured_collection().page()
     
     if not home_products.empty:
         fetch_images_batch(home_products['IMAGE_FILENAME'].tolist())
@@ -298,41 +366,28 @@ if st.session_state.page == "home":
                     if st.button("View", key=f"home_btn_{idx}", use_container_width=True):
                         show_product_popup(row)
     else:
-        st.info("Loading collection...")
+        featured_pending()
 
 # ==========================================
 # 6. PAGE 2: CHATBOT INTERFACE
 # ==========================================
 elif st.session_state.page == "chatbot":
+    from modules.llm import get_llm_cortex
     st.title("💬 Chat with SoleMate")
     
-    all_history_images = []
-    for msg in st.session_state.messages:
-        if msg.get("role") == "assistant" and msg.get("data") is not None and not msg["data"].empty:
-            files = msg["data"]['IMAGE_FILENAME'].tolist()
-            all_history_images.extend(files)
-    if all_history_images: fetch_images_batch(list(set(all_history_images)))
-
     # Render Chat
+    # Messages keep only product ids (= IMAGE_FILENAME); grids are fragments that
+    # fetch and render only their visible page, and older ones start collapsed.
+    last_grid = max((i for i, m in enumerate(st.session_state.messages) if m.get("product_ids")), default=None)
     for i, msg in enumerate(st.session_state.messages):
         with st.chat_message(msg["role"]):
             if msg.get("thought"):
                 with st.expander("🧠 AI Reasoning (Thinking Process)", expanded=False):
                     st.markdown(f"<div class='reasoning-box'>{msg['thought']}</div>", unsafe_allow_html=True)
             st.markdown(msg["content"])
-            if msg.get("role") == "assistant" and msg.get("data") is not None and not msg["data"].empty:
+            if msg.get("role") == "assistant" and msg.get("product_ids"):
                 st.markdown("---")
-                st.caption(f"👟 Found {len(msg['data'])} Recommendations:")
-                df_products = msg["data"]
-                cols = st.columns(5) 
-                for idx, row in df_products.iterrows():
-                    with cols[idx % 5]:
-                        with st.container(border=True):
-                            render_product_image(row['IMAGE_FILENAME'], use_container_width=True)
-                            st.markdown(f"<div class='product-card-title' title='{row['TITLE']}'>{row['TITLE'][:18]}..</div>", unsafe_allow_html=True)
-                            st.markdown(f"<div class='product-card-price'>{row['PRICE']}</div>", unsafe_allow_html=True)
-                            if st.button("View", key=f"chat_btn_{i}_{idx}", use_container_width=True):
-                                show_product_popup(row)
+                product_grid(msg["product_ids"], key=f"grid_{i}", expanded=i == last_grid)
 
     # Input Logic
     uploaded_file = st.session_state.get("sidebar_uploader")
@@ -346,146 +401,145 @@ elif st.session_state.page == "chatbot":
 
     if st.session_state.messages and st.session_state.messages[-1]["role"] == "user":
         last_msg = st.session_state.messages[-1]["content"]
+        # Per-turn trace: stage spans, exported as metrics / OTLP-style spans
+        telemetry_hub = get_telemetry()
+        trace = telemetry_hub.start_turn(has_image=bool(uploaded_file))
         
+        memory_cfg = get_memory_config()
+
+        def prefetch_images(products_df):
+            with telemetry.span("image_fetch"):
+                # Only the first grid page is visible; later pages fetch on "load more"
+                fetch_images_batch(products_df['IMAGE_FILENAME'].head(get_grid_page_size()).tolist())
+
         with st.chat_message("assistant"):
-            with st.status("🧠 SoleMate is thinking...", expanded=True) as status:
-                
-                # Vision
-                image_desc = "No image uploaded."
-                if uploaded_file and "🖼️" in last_msg:
-                    st.write("👁️ Analyzing Image...")
-                    image_desc = analyze_image_with_cortex(uploaded_file)
-                    st.write("✅ Image Analyzed.")
-                
-                # Routing
-                st.write("🚦 Routing Intent...")
-                router_res = smart_router(last_msg, image_desc)
-                intent = router_res.get("intent", "CHAT")
-                is_footwear = router_res.get("is_footwear", True)
-                st.write(f"   → Intent: {intent}")
-
-                # Logic Flow
-                products_df = pd.DataFrame()
-                context_str = "[]"
-                
-                if not is_footwear or intent == "CHAT":
-                    st.write("💬 Conversational Mode (Skipping Search)")
-                
-                elif intent == "SEARCH":
-                    st.write("🔍 Searching Database...")
-                    vector = []
-                    if uploaded_file: vector = get_image_embedding_from_bytes(uploaded_file)
-                    else:
-                        search_query = last_msg
-                        if "No image" not in image_desc: search_query += f" ({image_desc})"
-                        vector = get_text_embedding(search_query)
-
-                    if len(vector) > 0:
-                        products_df = search_products_by_vector(vector, limit=15)
-                        if not products_df.empty:
-                            fetch_images_batch(products_df['IMAGE_FILENAME'].tolist())
-                            context_str = format_context_json(products_df)
-                            st.write(f"✅ Found {len(products_df)} items.")
-
-                # Generation
-                st.write("✍️ Drafting Response...")
-                
-                # --- MANUAL HISTORY INJECTION ---
-                # Mengubah st.session_state.messages menjadi format LangChain (HumanMessage/AIMessage)
-                history_langchain = []
-                for msg in st.session_state.messages[:-1]: # Skip pesan user terakhir (karena sudah masuk 'input')
-                    if msg["role"] == "user":
-                        history_langchain.append(HumanMessage(content=msg["content"]))
-                    elif msg["role"] == "assistant":
-                        history_langchain.append(AIMessage(content=msg["content"]))
-
-                prompt = ChatPromptTemplate.from_messages([
-                    ("system", """
-                    You are SoleMate, an expert footwear consultant.
-                    
-                    CONTEXT: {context}
-                    IMAGE_DESC: "{img_desc}"
-                    INTENT: {intent}
-                    IS_FOOTWEAR: {is_footwear}
-                    
-                    INSTRUCTIONS:
-                    1. ALWAYS OUTPUT VALID JSON.
-                    2. If IS_FOOTWEAR=False, politely explain you only deal with shoes.
-                    3. If INTENT=CHAT, reply naturally and friendly. If asked about your model/identity, answer briefly as an AI assistant.
-                    4. If INTENT=SEARCH:
-                       - Select Top 3 products from CONTEXT.
-                       - For EACH product, write detailed recommendation.
-                    
-                    OUTPUT JSON FORMAT: 
-                    {{ "classification": "recommendation"|"chat", "thought": "Reasoning...", "response_text": "Markdown string...", "recommended_products": [] }}
-                    """),
-                    MessagesPlaceholder(variable_name="chat_history"), # Placeholder untuk history manual
-                    ("human", "{input}")
-                ])
-                
-                llm = get_llm_cortex()
-                chain = prompt | llm | StrOutputParser()
-                
-                final_res = {}
-                
-                try:
-                    # Invoke dengan Manual History
-                    raw_response = chain.invoke(
-                        {
-                            "input": last_msg, 
-                            "chat_history": history_langchain, # Inject history disini
-                            "context": context_str, 
-                            "img_desc": image_desc, 
-                            "is_footwear": is_footwear, 
-                            "intent": intent
-                        }
-                    )
-                    
-                    parsed_json = extract_json_from_text(raw_response)
-                    
-                    if parsed_json:
-                        final_res = parsed_json
-                    else:
-                        # Fallback jika gagal parse JSON
-                        final_res = {
-                            "classification": "chat",
-                            "thought": "Direct response (non-JSON).",
-                            "response_text": raw_response 
-                        }
-                    
-                    status.update(label="✅ Done!", state="complete", expanded=False)
-                
-                except Exception as e:
-                    st.error(f"Error: {e}")
-                    st.stop()
+            status = st.status("🧠 SoleMate is thinking...", expanded=True)
+            # Slots so the reasoning expander still renders above the streamed answer
+            thought_slot = st.empty()
+            response_slot = st.empty()
+
+            try:
+                # Vision, routing and retrieval overlapped, then context, history,
+                # response cache and generation (see modules/pipeline.py)
+                turn = answer_turn(
+                    last_msg, uploaded_file, st.session_state.messages, st.session_state.memory,
+                    analyze_image=analyze_image_with_cortex,
+                    route=smart_router,
+                    embed_text=get_text_embedding,
+                    embed_image=get_image_embedding_from_bytes,
+                    embed_multimodal=get_multimodal_embedding,
+                    search=search_products_by_vector,
+                    known_brands=get_known_brands(),
+                    chain=build_answer_chain(get_llm_cortex()),
+                    response_cache=get_response_cache(),
+                    build_context=format_context_json,
+                    token_budget=memory_cfg["token_budget"],
+                    max_messages=memory_cfg["max_messages"],
+                    streaming=st.secrets.get("chat", {}).get("streaming", True),
+                    progress=status.write,
+                    on_products=prefetch_images,
+                    on_generation=lambda: status.update(label="✍️ SoleMate is writing...", state="running", expanded=False),
+                    on_text=lambda shown: response_slot.markdown(shown + "▌"),
+                )
+                trace.root.set(intent=turn["intent"], is_footwear=turn["is_footwear"])
+                final_res = turn["answer"]
+                products_df = turn["products_df"]
+
+                with status:
+                    cache_note = " · ♻️ cached answer" if turn["cached"] else ""
+                    st.caption(f"⏱️ {format_timings(turn['timings'])}{cache_note}")
+                status.update(label="✅ Done!", state="complete", expanded=False)
+                telemetry_hub.finish(trace)
+            
+            except Exception as e:
+                trace.root.status = "ERROR"
+                telemetry_hub.finish(trace)
+                status.update(label="❌ Failed", state="error", expanded=False)
+                st.error(f"Error: {e}")
+                st.stop()
             
             # FINAL RENDER
-            if final_res.get('thought') and final_res.get('thought') != "Direct response (non-JSON).":
-                with st.expander("🧠 AI Reasoning (Thinking Process)", expanded=False):
+            if final_res.get('thought') and final_res.get('thought') != DIRECT_RESPONSE_THOUGHT:
+                with thought_slot.expander("🧠 AI Reasoning (Thinking Process)", expanded=False):
                     st.markdown(f"**Thought Process:**\n{final_res.get('thought')}")
             
-            st.markdown(final_res.get("response_text"))
+            response_slot.markdown(final_res.get("response_text"))
+
+            if get_telemetry_config()["debug_panel"]:
+                with st.expander("🔬 Turn waterfall", expanded=False):
+                    st.code(format_waterfall(trace), language=None)
+                    st.dataframe(waterfall(trace), use_container_width=True, hide_index=True)
             
             show_grid = False
             if final_res.get('classification') == 'recommendation' and not products_df.empty:
                 show_grid = True
                 
+            product_ids = get_product_cache().put(products_df) if show_grid else None
             if show_grid:
                 st.markdown("---")
                 st.markdown("### 🛍️ Explore Recommendations")
-                cols = st.columns(5)
-                for idx, row in products_df.iterrows():
-                    with cols[idx % 5]:
-                        with st.container(border=True):
-                            render_product_image(row['IMAGE_FILENAME'], use_container_width=True)
-                            st.markdown(f"<div class='product-card-title' title='{row['TITLE']}'>{row['TITLE'][:18]}..</div>", unsafe_allow_html=True)
-                            st.markdown(f"<div class='product-card-price'>{row['PRICE']}</div>", unsafe_allow_html=True)
-                            if st.button("View", key=f"now_btn_{idx}", use_container_width=True):
-                                show_product_popup(row)
-
-            st.session_state.messages.append({
-                "role": "assistant", 
-                "content": final_res.get("response_text"),
-                "thought": final_res.get("thought"),
-                "data": products_df if show_grid else None
-            })
\ No newline at end of file
+                # Same key as the history render of this message, so paging state carries over
+                product_grid(product_ids, key=f"grid_{len(st.session_state.messages)}", expanded=True)
+
+            # Summarize turns that slid out of the window, off the critical path
+            record_answer(
+                st.session_state.messages, st.session_state.memory, final_res, get_llm_cortex,
+                product_ids=product_ids,
+                token_budget=memory_cfg["token_budget"], max_messages=memory_cfg["max_messages"],
+            )
+
+# ==========================================
+# 7. PRE-WARM (after the first paint)
+# ==========================================
+@st.cache_resource
+def start_prewarm():
+    """
+    Runs once per process, at the end of the first script run (the page is
+    already on screen): a background thread imports the chat-path
+    dependencies and builds pools, clients and caches, so the first chat turn
+    doesn't pay for them. Disable with [startup] prewarm = false.
+    Returns {step: {"seconds", "error"}} as steps complete; failed steps are
+    retried lazily by the first call that needs them.
+    """
+    timings = {}
+
+    def _prewarm():
+        from modules.llm import get_llm_cortex, get_cortex_client
+        steps = [
+            ("voyage", get_voyage_client),
+            ("embedding_cache", get_embedding_cache),
+            ("cortex", get_cortex_client),
+            ("answer_chain", lambda: build_answer_chain(get_llm_cortex())),
+            ("router", get_smart_router),  # embeds the intent prototypes
+            ("vision", get_vision_service),
+            ("brands", get_known_brands),
+            ("neighbors", get_neighbor_table),
+            # Last: opening connections can block for the whole login timeout
+            ("pool", lambda: get_connection_pool().warm_up()),
+        ]
+        for name, step in steps:
+            started = time.perf_counter()
+            error = None
+            try:
+                step()
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            timings[name] = {"seconds": round(time.perf_counter() - started, 3), "error": error}
+
+    # Script run context: st.secrets / st.cache_resource behave as in the session (no
+    # missing ScriptRunContext warnings). Copied contextvars: the getters count as nested
+    # in this cached call, so they don't draw spinners into a run that has already ended.
+    thread = threading.Thread(target=contextvars.copy_context().run, args=(_prewarm,), name="prewarm", daemon=True)
+    add_script_run_ctx(thread)
+    thread.start()
+    return timings
+
+if st.secrets.get("startup", {}).get("prewarm", True):
+    prewarm = start_prewarm()
+    if get_telemetry_config()["debug_panel"]:
+        with st.sidebar.expander("🔥 Pre-warm", expanded=False):
+            for name, step in dict(prewarm).items():
+                if step["error"]:
+                    st.caption(f"❌ {name} {step['seconds']:.2f}s · {step['error']}")
+                else:
+                    st.caption(f"✅ {name} {step['seconds']:.2f}s")
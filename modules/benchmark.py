@@ -0,0 +1,578 @@
+"""
+Offline latency benchmark for the SoleMate turn logic.
+
+Runs the same turn as main.py (pipeline.answer_turn: run_turn -> context ->
+memory -> response cache -> generate_response) and the real modules/database.py, embedder.py and llm.py
+entry points, with Snowflake, Voyage and Cortex replaced by local fakes that
+inject configurable latency:
+
+    python -m modules.benchmark --sessions 8 --turns 10 --out bench.json
+    python -m modules.benchmark --compare bench.json      # regression check
+
+Reports p50/p95/p99 per stage and throughput per scenario as JSON.
+"""
+import contextlib
+import io
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+
+DIM = 1024
+
+# Seconds; each call is scaled by a log-normal jitter (sigma = "jitter")
+DEFAULT_LATENCY = {
+    "sql": 0.05,              # plain query round-trip
+    "vector_sql": 0.35,       # VECTOR_COSINE_SIMILARITY scan over PRODUCTS_FINAL
+    "stage": 0.08,            # LIST / REMOVE / GET
+    "put": 0.25,              # PUT of one upload
+    "vision": 1.8,            # CORTEX.COMPLETE with TO_FILE
+    "voyage": 0.15,           # one multimodal_embed request
+    "voyage_per_input": 0.002,
+    "llm_call": 0.6,          # Cortex chat COMPLETE: fixed cost per call
+    "llm_token": 0.012,       # per 16 characters of answer
+    "jitter": 0.25,
+}
+
+BRANDS = ["Nike", "Adidas", "Asics", "New Balance", "Puma", "Vans", "Converse", "Hoka", "Brooks", "Dr. Martens"]
+STYLES = ["running shoe", "sneaker", "leather boot", "trail runner", "sandal", "loafer", "basketball shoe", "chelsea boot"]
+COLORS = ["white", "black", "red", "blue", "grey", "brown", "green"]
+
+TEXT_QUERIES = [
+    "show me {color} {style}s",
+    "{brand} {style} under ${price}",
+    "I need a comfortable {style} for walking",
+    "recommend {color} {brand} {style}s",
+    "looking for a {style} between ${low} and ${price}",
+]
+CHAT_QUERIES = ["thanks, that's helpful", "how do I clean suede shoes", "what can you do",
+                "how are you today", "why are leather boots so expensive", "okay bye"]
+
+
+def _duration(latency, key, scale=1.0):
+    base = latency[key] * scale
+    return base * random.lognormvariate(0, latency["jitter"]) if base > 0 else 0.0
+
+
+def _sleep(latency, key, scale=1.0):
+    seconds = _duration(latency, key, scale)
+    if seconds > 0:
+        time.sleep(seconds)
+
+
+# ==========================================
+# FAKE VOYAGE
+# ==========================================
+_token_vectors = {}
+_token_lock = threading.Lock()
+
+
+def _token_vector(token):
+    with _token_lock:
+        vector = _token_vectors.get(token)
+        if vector is None:
+            vector = np.random.default_rng(zlib.crc32(token.encode("utf-8"))).standard_normal(DIM).astype(np.float32)
+            _token_vectors[token] = vector
+    return vector
+
+
+def fake_embedding(parts):
+    """
+    Deterministic bag-of-words embedding: texts that share words get similar
+    vectors, so routing and retrieval behave roughly like the real model.
+    """
+    total = np.zeros(DIM, dtype=np.float32)
+    for part in parts:
+        if isinstance(part, str):
+            for token in re.findall(r"[a-z0-9]+", part.lower()):
+                total += _token_vector(token)
+        else:
+            # Images: content-derived random vector
+            total += _token_vector(f"img:{zlib.crc32(part.tobytes()[:4096])}")
+    norm = np.linalg.norm(total)
+    return (total / norm if norm else _token_vector("empty")).tolist()
+
+
+class FakeVoyageResult:
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+
+
+class FakeVoyageClient:
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+
+    def multimodal_embed(self, inputs, model=None, input_type=None):
+        self.calls += 1
+        _sleep(self.latency, "voyage")
+        _sleep(self.latency, "voyage_per_input", len(inputs))
+        return FakeVoyageResult([fake_embedding(parts) for parts in inputs])
+
+
+# ==========================================
+# FAKE SNOWFLAKE
+# ==========================================
+def make_catalog(n_products=5000, seed=0):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n_products):
+        brand, style, color = rng.choice(BRANDS), rng.choice(STYLES), rng.choice(COLORS)
+        title = f"{brand} {color.title()} {style.title()} {i}"
+        details = f"{color} {style} with cushioned midsole, breathable upper and durable rubber outsole"
+        rows.append({
+            "TITLE": title,
+            "BRAND": brand,
+            "PRICE": f"${rng.randint(30, 250)}.99",
+            "PRODUCT_DETAILS_CLEAN": details,
+            "IMAGE_FILENAME": f"img_{i:06d}.jpg",
+            "VECTOR_TEXT": fake_embedding([f"{title} {details}"]),
+        })
+    return pd.DataFrame(rows)
+
+
+class FakeCursor:
+    """DB-API cursor answering the statements the app issues, with injected latency."""
+
+    def __init__(self, env):
+        self.env = env
+        self.description = None
+        self._rows = []
+
+    def _result(self, df):
+        self.description = [(c, None, None, None, None, None, None) for c in df.columns]
+        self._rows = list(df.itertuples(index=False, name=None))
+
+    def execute(self, sql, params=None):
+        latency = self.env.latency
+        upper = sql.upper()
+        self.description, self._rows = [("RESULT", None, None, None, None, None, None)], []
+        if "CORTEX.COMPLETE" in upper:
+            value, seconds = fake_complete(latency, sql, params)
+            time.sleep(seconds)
+            self._rows = [(value,)]
+        elif upper.lstrip().startswith("PUT"):
+            _sleep(latency, "put")
+            self._rows = [("f.jpg", "f.jpg", 1, 1, "NONE", "NONE", "UPLOADED", "")]
+        elif upper.lstrip().startswith(("LIST", "REMOVE", "GET")):
+            _sleep(latency, "stage")
+        elif "FLATTEN" in upper and "VECTOR_COSINE_SIMILARITY" in upper:
+            _sleep(latency, "vector_sql")
+            limit = int(re.search(r"RANK\s*<=\s*(\d+)", upper).group(1))
+            self._result(self.env.index.search_many(json.loads(params[0]), limit=limit))
+        elif "VECTOR_COSINE_SIMILARITY" in upper:
+            _sleep(latency, "vector_sql")
+            limit = int(re.search(r"LIMIT\s+(\d+)", upper).group(1))
+            self._result(self.env.index.search(json.loads(params[0]), limit=limit))
+        elif "DISTINCT BRAND" in upper:
+            _sleep(latency, "sql")
+            self._result(pd.DataFrame({"BRAND": BRANDS}))
+        elif "FROM PRODUCTS_FINAL" in upper:
+            _sleep(latency, "sql")
+            meta = self.env.index.metadata
+            self._result(meta[meta["IMAGE_FILENAME"].isin(params or [])])
+        else:
+            _sleep(latency, "sql")
+        return self
+
+    def execute_async(self, sql, params=None):
+        # Only Cortex statements are issued asynchronously; they finish after their sampled latency
+        value, seconds = fake_complete(self.env.latency, sql, params)
+        self.sfqid = self.env.queries.submit(value, seconds)
+        return {"queryId": self.sfqid}
+
+    def get_results_from_sfqid(self, query_id):
+        self.description = [("RESULT", None, None, None, None, None, None)]
+        self._rows = [(self.env.queries.result(query_id),)]
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self):
+        return list(self._rows)
+
+    def fetch_pandas_batches(self):
+        yield pd.DataFrame(self._rows, columns=[d[0] for d in self.description])
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, env):
+        self.env = env
+
+    def cursor(self):
+        return FakeCursor(self.env)
+
+    def get_query_status_throw_if_error(self, query_id):
+        return self.env.queries.status(query_id)
+
+    def is_still_running(self, status):
+        return status == "RUNNING"
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+# ==========================================
+# FAKE CORTEX
+# ==========================================
+ANSWER = json.dumps({
+    "classification": "recommendation",
+    "thought": "Matched the request against the catalog context.",
+    "response_text": " ".join(["Great cushioning and a breathable upper for daily runs."] * 13),
+    "recommended_products": [],
+})
+VISION_ANSWER = "A white leather low-top sneaker with a gum rubber sole. Yes, it is footwear."
+
+
+def fake_complete(latency, sql, params):
+    """Value and simulated duration of a CORTEX.COMPLETE statement (chat messages or TO_FILE vision)."""
+    if "TO_FILE" in sql.upper():
+        return VISION_ANSWER, _duration(latency, "vision")
+    prompt = " ".join(str(m.get("content")) for m in json.loads(params[1]))
+    if "Smart Router" in prompt:
+        text = json.dumps({"is_footwear": True, "intent": "SEARCH" if "buy" in prompt.lower() else "CHAT"})
+    elif "Summarize this shopping conversation" in prompt:
+        text = "User wants running shoes under $100."
+    else:
+        text = ANSWER
+    seconds = _duration(latency, "llm_call") + _duration(latency, "llm_token", len(text) / 16)
+    response = {"choices": [{"messages": text}], "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(text) // 4}}
+    return json.dumps(response), seconds
+
+
+class FakeQueries:
+    """Server side of execute_async: query ids that turn SUCCESS once their latency has elapsed."""
+
+    def __init__(self):
+        self._queries = {}
+        self._lock = threading.Lock()
+        self._next = 0
+
+    def submit(self, value, seconds):
+        with self._lock:
+            self._next += 1
+            query_id = f"fake-{self._next}"
+            self._queries[query_id] = (time.monotonic() + seconds, value)
+        return query_id
+
+    def status(self, query_id):
+        return "RUNNING" if time.monotonic() < self._queries[query_id][0] else "SUCCESS"
+
+    def result(self, query_id):
+        with self._lock:
+            return self._queries.pop(query_id)[1]
+
+
+# ==========================================
+# ENVIRONMENT
+# ==========================================
+class FakeSecrets(dict):
+    """Stands in for st.secrets (a read-only mapping of secrets.toml sections)."""
+
+
+class BenchEnv:
+    """
+    Patches the app modules onto the fakes. The real functions in
+    modules/database.py, embedder.py and llm.py still run; only their
+    connection / client / model factories are swapped.
+    """
+
+    def __init__(self, latency, n_products=5000, backend="snowflake", workdir=None):
+        import streamlit as st
+
+        self.latency = latency
+        self.workdir = workdir or tempfile.mkdtemp(prefix="solemate-bench-")
+        st.secrets = FakeSecrets({
+            "voyage": {"api_key": "fake"},
+            "search": {"backend": backend},
+            "embedding_cache": {"disk_path": os.path.join(self.workdir, "embeddings.sqlite3")},
+            "chat": {"streaming": True},
+        })
+
+        from modules import database, embedder, llm
+        from modules.cortex import CortexClient
+        from modules.vector_index import LocalVectorIndex
+
+        self.index = LocalVectorIndex.from_frame(make_catalog(n_products))
+        self.voyage = FakeVoyageClient(latency)
+        self.queries = FakeQueries()
+
+        @contextlib.contextmanager
+        def fake_db_connection():
+            yield FakeConnection(self)
+
+        database.db_connection = fake_db_connection
+        database.get_local_index = lambda: self.index
+        embedder.get_voyage_client = lambda: self.voyage
+        # The real CortexClient + CortexChat run against the fake connections
+        self.cortex_client = CortexClient(fake_db_connection)
+        self.cortex = llm.CortexChat(client=self.cortex_client)
+        llm.get_llm_cortex = lambda *args, **kwargs: self.cortex
+        self.db_connection = fake_db_connection
+        self.database, self.embedder, self.llm = database, embedder, llm
+        self._build_services()
+
+    def _build_services(self):
+        from modules.intent import PrototypeIntentClassifier, SmartRouter
+        from modules.response_cache import SemanticResponseCache
+        from modules.vision import VisionService
+        from modules.pipeline import build_answer_chain
+        from modules.telemetry import Telemetry
+        from modules.featured import FeaturedCollection, FEATURED_QUERIES
+
+        embedder = self.embedder
+        self.telemetry = Telemetry()
+        self.vision = VisionService(self.db_connection, "@BENCH_STAGE", cortex=self.cortex_client)
+        self.router = SmartRouter(
+            embedder.get_text_embedding,
+            PrototypeIntentClassifier(lambda texts: list(embedder.embed_batch(texts, input_type="query"))),
+            self.llm.get_llm_cortex,
+        )
+        self.response_cache = SemanticResponseCache()
+        self.chain = build_answer_chain(self.llm.get_llm_cortex())
+        # Warmed up front, as the background refresh would have done
+        self.featured = FeaturedCollection(
+            lambda: self.database.search_products_by_vectors([embedder.get_text_embedding(q) for q in FEATURED_QUERIES], limit=50))
+        self.featured.refresh()
+
+
+# ==========================================
+# SCENARIOS (mirror main.py)
+# ==========================================
+def _random_text_query(rng):
+    price = rng.randrange(60, 220, 10)
+    return rng.choice(TEXT_QUERIES).format(color=rng.choice(COLORS), style=rng.choice(STYLES),
+                                           brand=rng.choice(BRANDS), price=price, low=price - 50)
+
+
+def _random_image(rng):
+    from PIL import Image
+
+    buf = io.BytesIO()
+    Image.new("RGB", (1600, 1200), tuple(rng.randrange(256) for _ in range(3))).save(buf, "JPEG", quality=90)
+    buf.seek(0)
+    return buf
+
+
+def chat_turn(env, session, text, uploaded_file=None):
+    """One chat turn through the same pipeline.answer_turn as main.py. Returns stage timings."""
+    from modules.context import build_context
+    from modules.pipeline import answer_turn, record_answer, IMAGE_MARKER
+
+    database, embedder = env.database, env.embedder
+    last_msg = f"{IMAGE_MARKER} {text}" if uploaded_file else text
+    session["messages"].append({"role": "user", "content": last_msg})
+
+    trace = env.telemetry.start_turn(has_image=bool(uploaded_file))
+    turn = answer_turn(
+        last_msg, uploaded_file, session["messages"], session["memory"],
+        analyze_image=env.vision.describe,
+        route=env.router.route,
+        embed_text=embedder.get_text_embedding,
+        embed_image=embedder.get_image_embedding_from_bytes,
+        embed_multimodal=embedder.get_multimodal_embedding,
+        search=database.search_products_by_vector,
+        known_brands=database.get_known_brands(),
+        chain=env.chain,
+        response_cache=env.response_cache,
+        build_context=build_context,
+    )
+    trace.root.set(intent=turn["intent"], is_footwear=turn["is_footwear"])
+    record_answer(session["messages"], session["memory"], turn["answer"], env.llm.get_llm_cortex)
+    env.telemetry.finish(trace)
+    return turn["timings"]
+
+
+def home_turn(env, session):
+    """A home page render: the rotated featured page, read from memory."""
+    start = time.perf_counter()
+    env.featured.page()
+    return {"total": time.perf_counter() - start}
+
+
+def batch_search_turn(env, session, rng, n_queries=16):
+    """Multi-query fan-out (evaluation / rewrites): one call per vector vs. one batch call."""
+    vectors = list(env.embedder.embed_batch([_random_text_query(rng) for _ in range(n_queries)], input_type="query"))
+    start = time.perf_counter()
+    for vector in vectors:
+        env.database.search_products_by_vector(vector, limit=10)
+    looped = time.perf_counter()
+    env.database.search_products_by_vectors(vectors, limit=10)
+    end = time.perf_counter()
+    return {"vector_search_loop": looped - start, "vector_search_batch": end - looped, "total": end - start}
+
+
+SCENARIOS = {
+    "text_search": lambda env, session, rng: chat_turn(env, session, _random_text_query(rng)),
+    "image_search": lambda env, session, rng: chat_turn(env, session, "find me something like this", _random_image(rng)),
+    "chat_only": lambda env, session, rng: chat_turn(env, session, rng.choice(CHAT_QUERIES)),
+    "home": lambda env, session, rng: home_turn(env, session),
+    "batch_search": batch_search_turn,
+}
+
+
+# ==========================================
+# RUNNER & REPORT
+# ==========================================
+def summarize(samples):
+    """p50/p95/p99/mean (ms) per stage from a list of timing dicts (seconds)."""
+    stages = {}
+    for name in sorted({k for s in samples for k in s}):
+        values = np.asarray([s[name] for s in samples if name in s], dtype=np.float64) * 1000
+        stages[name] = {
+            "count": int(len(values)),
+            "mean_ms": round(float(values.mean()), 2),
+            "p50_ms": round(float(np.percentile(values, 50)), 2),
+            "p95_ms": round(float(np.percentile(values, 95)), 2),
+            "p99_ms": round(float(np.percentile(values, 99)), 2),
+        }
+    return stages
+
+
+def run_scenario(env, name, sessions=4, turns=5, seed=0):
+    """N concurrent simulated sessions, each running `turns` turns of one scenario."""
+    from modules.memory import new_memory_state
+
+    scenario = SCENARIOS[name]
+    first_error, first_error_lock = [], threading.Lock()
+
+    def _session(session_id):
+        rng = random.Random(seed * 1000 + session_id)
+        session = {"messages": [{"role": "assistant", "content": "Hi! I'm SoleMate."}], "memory": new_memory_state()}
+        samples, errors = [], 0
+        for _ in range(turns):
+            try:
+                samples.append(scenario(env, session, rng))
+            except Exception:
+                errors += 1
+                with first_error_lock:
+                    if not first_error:
+                        first_error.append(traceback.format_exc())
+        return samples, errors
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions, thread_name_prefix=f"bench-{name}") as pool:
+        results = list(pool.map(_session, range(sessions)))
+    wall = time.perf_counter() - start
+    samples = [s for session_samples, _ in results for s in session_samples]
+    if first_error:
+        # Only the first one; the rest are usually the same failure repeated per turn
+        print(f"{name}: first failure\n{first_error[0]}", file=sys.stderr)
+    return {
+        "sessions": sessions,
+        "turns": len(samples),
+        "errors": sum(e for _, e in results),
+        "wall_s": round(wall, 3),
+        "throughput_turns_per_s": round(len(samples) / wall, 3) if wall else 0.0,
+        "stages": summarize(samples),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+
+def compare(current, baseline, threshold=0.10):
+    """
+    p95 per scenario/stage against a previous run. Returns (lines, regressed)
+    where regressed is True when any p95 grew by more than `threshold`.
+    """
+    lines, regressed = [], False
+    for name, scenario in current["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base:
+            continue
+        for stage, stats in scenario["stages"].items():
+            old = base["stages"].get(stage, {}).get("p95_ms")
+            if not old:
+                continue
+            change = stats["p95_ms"] / old - 1
+            flag = " <-- regression" if change > threshold else ""
+            regressed |= bool(flag)
+            lines.append(f"{name:>13} {stage:>14} p95 {old:>9.1f} -> {stats['p95_ms']:>9.1f} ms ({change:+.0%}){flag}")
+    return lines, regressed
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Offline SoleMate latency benchmark (fake Snowflake / Voyage / Cortex).")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated: " + ", ".join(SCENARIOS))
+    parser.add_argument("--sessions", type=int, default=4, help="concurrent simulated sessions")
+    parser.add_argument("--turns", type=int, default=5, help="turns per session")
+    parser.add_argument("--products", type=int, default=5000, help="synthetic catalog size")
+    parser.add_argument("--backend", default="snowflake", choices=["snowflake", "local"])
+    parser.add_argument("--latency", action="append", default=[], metavar="KEY=SECONDS",
+                        help="override a fake latency, e.g. --latency vision=0.5 (keys: " + ", ".join(DEFAULT_LATENCY) + ")")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply every fake latency")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write the JSON report here (default: stdout)")
+    parser.add_argument("--compare", help="previous JSON report to compare p95s against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="p95 growth that counts as a regression")
+    args = parser.parse_args()
+
+    latency = dict(DEFAULT_LATENCY)
+    for override in args.latency:
+        key, value = override.split("=", 1)
+        if key not in latency:
+            parser.error(f"unknown latency key: {key}")
+        latency[key] = float(value)
+    latency = {k: v * args.scale if k != "jitter" else v for k, v in latency.items()}
+
+    random.seed(args.seed)
+    env = BenchEnv(latency, n_products=args.products, backend=args.backend)
+    # Bare-mode Streamlit and pandas (non-SQLAlchemy connection) warnings are expected here
+    import logging
+    import warnings
+    warnings.filterwarnings("ignore", category=UserWarning, message="pandas only supports SQLAlchemy")
+    for logger_name in list(logging.root.manager.loggerDict):
+        if logger_name.startswith("streamlit"):
+            logging.getLogger(logger_name).setLevel(logging.ERROR)
+    report = {
+        "meta": {
+            "git_commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "backend": args.backend,
+            "products": args.products,
+            "latency": latency,
+        },
+        "scenarios": {},
+    }
+    for name in args.scenarios.split(","):
+        report["scenarios"][name] = run_scenario(env, name, sessions=args.sessions, turns=args.turns, seed=args.seed)
+        print(f"{name}: {report['scenarios'][name]['throughput_turns_per_s']} turns/s", file=sys.stderr)
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            lines, regressed = compare(report, json.load(f), args.threshold)
+        print("\n".join(lines), file=sys.stderr)
+        sys.exit(1 if regressed else 0)
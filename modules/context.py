@@ -0,0 +1,156 @@
+import json
+import re
+import numpy as np
+import pandas as pd
+from modules.memory import estimate_tokens
+
+CONTEXT_HEADER = "# name | brand | price | features"
+
+_NOISE = re.compile(r"\b(men'?s|women'?s|unisex|(size|us|uk|eu)\s*\d+(\.\d+)?|pack|pair|new)\b")
+_NON_WORD = re.compile(r"[^a-z0-9 ]+")
+
+
+def legacy_context_json(df, features_chars=300):
+    """The original context format (raw JSON, every product), kept for comparison."""
+    if df.empty: return "[]"
+    return json.dumps([
+        {"product_name": r["TITLE"], "brand": r["BRAND"], "price": r["PRICE"],
+         "features": str(r["PRODUCT_DETAILS_CLEAN"])[:features_chars]}
+        for r in df.to_dict("records")
+    ])
+
+
+def title_key(titles, brands):
+    """
+    Normalized title used to spot variants of one product (sizes, colours,
+    gender labels): lowercase, punctuation/sizes stripped, brand removed.
+    """
+    t = titles.fillna("").astype(str).str.lower()
+    b = brands.fillna("").astype(str).str.lower()
+    t = t.str.replace(_NOISE, " ", regex=True).str.replace(_NON_WORD, " ", regex=True)
+    t = pd.Series([_strip_brand(title, brand) for title, brand in zip(t, b)], index=t.index)
+    return t.str.split().str[:6].str.join(" ") + "|" + b
+
+
+def _strip_brand(title, brand):
+    # Only a leading whole-word brand: "on cloud 5" -> "cloud 5", but "running" stays intact
+    words = _NON_WORD.sub(" ", brand).split()
+    if not words:
+        return title
+    pattern = r"^\s*" + r"\s+".join(re.escape(w) for w in words) + r"\b"
+    return re.sub(pattern, " ", title)
+
+
+def deduplicate(df):
+    """Keeps the best-scoring row of each (brand, normalized title) group."""
+    if df.empty:
+        return df
+    keys = title_key(df["TITLE"], df["BRAND"])
+    return df.loc[~keys.duplicated(keep="first")]
+
+
+def _token_sets(df):
+    text = (df["TITLE"].fillna("").astype(str) + " " + df["BRAND"].fillna("").astype(str)).str.lower()
+    return [set(_NON_WORD.sub(" ", t).split()) for t in text]
+
+
+def similarity_matrix(df):
+    """Pairwise product similarity: Jaccard over title/brand tokens (search results carry no vectors)."""
+    sets = _token_sets(df)
+    n = len(sets)
+    sim = np.eye(n, dtype=np.float32)
+    for i in range(n):
+        for j in range(i + 1, n):
+            union = len(sets[i] | sets[j])
+            sim[i, j] = sim[j, i] = len(sets[i] & sets[j]) / union if union else 0.0
+    return sim
+
+
+def mmr_order(relevance, similarity, k, diversity=0.3):
+    """
+    Maximal Marginal Relevance: greedily pick items that are relevant but not
+    redundant with what was already picked. Returns row positions.
+    """
+    n = len(relevance)
+    k = min(k, n)
+    if k == 0:
+        return []
+    relevance = np.asarray(relevance, dtype=np.float32)
+    chosen = [int(np.argmax(relevance))]
+    max_sim = similarity[chosen[0]].copy()
+    remaining = np.ones(n, dtype=bool)
+    remaining[chosen[0]] = False
+    while len(chosen) < k:
+        scores = (1 - diversity) * relevance - diversity * max_sim
+        scores[~remaining] = -np.inf
+        pick = int(np.argmax(scores))
+        chosen.append(pick)
+        remaining[pick] = False
+        max_sim = np.maximum(max_sim, similarity[pick])
+    return chosen
+
+
+def encode_rows(df, features_chars):
+    """Vectorized compact encoding: one `name | brand | price | features` line per product."""
+    clean = lambda col: df[col].fillna("").astype(str).str.replace(r"\s+", " ", regex=True).str.replace("|", "/", regex=False).str.strip()
+    features = clean("PRODUCT_DETAILS_CLEAN").str.slice(0, features_chars)
+    lines = clean("TITLE") + " | " + clean("BRAND") + " | " + clean("PRICE") + " | " + features
+    return lines.tolist()
+
+
+def build_context(df, token_budget=600, max_products=8, features_chars=200, diversity=0.3):
+    """
+    Compact, deduplicated, diversity-ranked product context for the prompt.
+    Drops near-duplicate variants, re-ranks with MMR, then shrinks the feature
+    snippets (and finally the product count) until it fits `token_budget`.
+    """
+    if df is None or df.empty:
+        return "[]"
+    df = deduplicate(df.reset_index(drop=True)).reset_index(drop=True)
+    relevance = df["SIMILARITY_SCORE"].to_numpy() if "SIMILARITY_SCORE" in df.columns else np.linspace(1, 0, len(df))
+    order = mmr_order(relevance, similarity_matrix(df), max_products, diversity)
+    df = df.iloc[order]
+
+    while True:
+        lines = encode_rows(df, features_chars)
+        text = "\n".join([CONTEXT_HEADER] + lines)
+        if estimate_tokens(text) <= token_budget:
+            return text
+        if features_chars > 60:
+            features_chars = int(features_chars * 0.7)
+        elif len(df) > 3:
+            df = df.iloc[:-1]
+        else:
+            return text
+
+
+if __name__ == "__main__":
+    # Prompt-size check: python -m modules.context [results.csv]
+    # Without a CSV a synthetic 15-row result set (with size/colour variants) is used.
+    import sys
+
+    if len(sys.argv) > 1:
+        sample = pd.read_csv(sys.argv[1])
+    else:
+        rng = np.random.default_rng(0)
+        brands = ["Nike", "Adidas", "Asics", "New Balance", "Puma"]
+        rows = []
+        for i in range(15):
+            # Every third row is a size variant of the previous one
+            brand = brands[(i - (i % 3 == 2)) % 5]
+            model = f"Runner {i - (i % 3 == 2)}"
+            rows.append({
+                "TITLE": f"{brand} Men's {model} Running Shoe Size {8 + i % 3}",
+                "BRAND": brand,
+                "PRICE": f"${60 + 5 * i}.99",
+                "PRODUCT_DETAILS_CLEAN": "Lightweight mesh upper with responsive foam midsole, " * 8,
+                "IMAGE_FILENAME": f"{i}.jpg",
+                "SIMILARITY_SCORE": 0.9 - 0.01 * i + rng.normal(0, 0.001),
+            })
+        sample = pd.DataFrame(rows)
+    before = legacy_context_json(sample)
+    after = build_context(sample)
+    print(f"products: {len(sample)} -> {len(after.splitlines()) - 1}")
+    print(f"chars:    {len(before)} -> {len(after)}")
+    print(f"tokens~:  {estimate_tokens(before)} -> {estimate_tokens(after)} "
+          f"({100 * (1 - estimate_tokens(after) / estimate_tokens(before)):.0f}% smaller)")
@@ -0,0 +1,254 @@
+import json
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError, TimeoutError as FutureTimeoutError
+from modules import telemetry
+
+
+class CortexError(Exception):
+    """Raised when a Cortex statement fails after all retries."""
+
+
+class CortexTimeoutError(CortexError):
+    """Raised when a Cortex statement is still running after the timeout."""
+
+
+class _Job:
+    def __init__(self, key, sql, params):
+        self.key = key
+        self.sql = sql
+        self.params = params
+        self.future = Future()
+        self.attempts = 0
+        self.query_id = None
+        self.started_at = None
+        self.not_before = 0.0
+
+
+class CortexClient:
+    """
+    Non-blocking SNOWFLAKE.CORTEX.COMPLETE calls.
+    Statements are started with execute_async on a pooled connection that is
+    returned to the pool right away; a single poller thread tracks every
+    running query id, so no connection or worker thread is held per call.
+    Identical in-flight requests share one statement (single-flight), at most
+    `max_concurrency` statements run at once (the rest wait in a FIFO queue),
+    and attempts that fail or exceed `timeout` seconds are cancelled and
+    retried with exponential backoff.
+    """
+
+    def __init__(self, connection_factory, max_concurrency=4, timeout=60, retries=2,
+                 backoff=0.5, poll_interval=0.1):
+        self.connection_factory = connection_factory
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.poll_interval = poll_interval
+        self._queue = []     # jobs waiting for a concurrency slot, FIFO
+        self._running = []   # jobs with a query id
+        self._inflight = {}  # key -> job (queued or running)
+        self._cond = threading.Condition()
+        self._poller = None
+        self.counters = {"submitted": 0, "coalesced": 0, "completed": 0, "retries": 0,
+                         "timeouts": 0, "failures": 0, "max_queued": 0, "poller_errors": 0}
+
+    # ------------------------------------------
+    # Public API
+    # ------------------------------------------
+    def submit(self, sql, params=()):
+        """
+        Starts `sql` (a single-value SELECT) and returns a Future of that value.
+        A request identical to one still in flight gets the same Future.
+        """
+        key = (sql, tuple(params))
+        with self._cond:
+            job = self._inflight.get(key)
+            if job is not None:
+                self.counters["coalesced"] += 1
+                return job.future
+            job = _Job(key, sql, tuple(params))
+            self._inflight[key] = job
+            self._queue.append(job)
+            self.counters["submitted"] += 1
+            self.counters["max_queued"] = max(self.counters["max_queued"], len(self._queue))
+            self._ensure_poller()
+            self._cond.notify_all()
+        return job.future
+
+    def run(self, sql, params=(), wait=None):
+        """
+        Blocking helper: submit() and wait for the value (traced as a cortex.complete span).
+        `wait` defaults to the longest the poller can take: every attempt timing
+        out plus the backoff between them.
+        """
+        if wait is None:
+            wait = self.max_wait()
+        with telemetry.span("cortex.complete") as span:
+            with self._cond:
+                coalesced = (sql, tuple(params)) in self._inflight
+            future = self.submit(sql, params)
+            span.set(coalesced=coalesced)
+            try:
+                return future.result(timeout=wait)
+            except FutureTimeoutError:
+                raise CortexTimeoutError(f"No Cortex result after {wait:.1f}s.") from None
+
+    def max_wait(self):
+        """Seconds a statement can take across all attempts: timeouts plus backoff (plus one poll)."""
+        backoff = sum(self.backoff * 2 ** i for i in range(self.retries))
+        return self.timeout * (self.retries + 1) + backoff + self.poll_interval
+
+    def complete(self, model, messages, options=None):
+        """
+        Chat completion over a list of {"role", "content"} messages.
+        Returns (text, usage) as reported by Cortex.
+        """
+        raw = self.run(
+            "SELECT SNOWFLAKE.CORTEX.COMPLETE(%s, PARSE_JSON(%s), PARSE_JSON(%s))",
+            (model, json.dumps(messages), json.dumps(options or {})),
+        )
+        response = json.loads(raw) if isinstance(raw, str) else raw
+        return response["choices"][0]["messages"], response.get("usage", {})
+
+    def complete_file(self, model, prompt, stage_path, file_path):
+        """Single-prompt completion over a staged file (e.g. an image for a vision model)."""
+        return self.run(
+            f"SELECT SNOWFLAKE.CORTEX.COMPLETE(%s, %s, TO_FILE('{stage_path}', %s))",
+            (model, prompt, file_path),
+        )
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self.counters)
+            stats["queued"] = len(self._queue)
+            stats["running"] = len(self._running)
+        return stats
+
+    # ------------------------------------------
+    # Poller
+    # ------------------------------------------
+    def _ensure_poller(self):
+        if self._poller is None or not self._poller.is_alive():
+            self._poller = threading.Thread(target=self._loop, name="cortex-poller", daemon=True)
+            self._poller.start()
+
+    def _loop(self):
+        while True:
+            try:
+                self._step()
+            except Exception:
+                # A bad round must not kill the poller: every waiting future would hang
+                with self._cond:
+                    self.counters["poller_errors"] += 1
+                time.sleep(self.poll_interval)
+
+    def _step(self):
+        with self._cond:
+            while not self._queue and not self._running:
+                self._cond.wait()
+            now = time.monotonic()
+            ready = [j for j in self._queue if j.not_before <= now]
+            to_start = ready[:max(0, self.max_concurrency - len(self._running))]
+            for job in to_start:
+                self._queue.remove(job)
+            running = list(self._running)
+        try:
+            if to_start or running:
+                with self.connection_factory() as conn:
+                    for job in to_start:
+                        self._start(conn, job)
+                    for job in running:
+                        self._poll(conn, job)
+        except Exception as e:
+            # No connection this round, or it failed on release after the round's work was done:
+            # jobs that never started count a failed attempt, running ones keep their deadline
+            with self._cond:
+                unstarted = [j for j in to_start
+                             if j not in self._running and j not in self._queue and not j.future.done()]
+                running = [j for j in running if j in self._running]
+            for job in unstarted:
+                job.attempts += 1
+                self._retry_or_fail(job, e)
+            for job in running:
+                if time.monotonic() - job.started_at > self.timeout:
+                    self._finish_attempt(job)
+                    self._retry_or_fail(job, CortexTimeoutError(f"Cortex query {job.query_id} exceeded {self.timeout}s."))
+        with self._cond:
+            if self._running or self._queue:
+                self._cond.wait(self.poll_interval)
+
+    def _start(self, conn, job):
+        job.attempts += 1
+        try:
+            cursor = conn.cursor()
+            cursor.execute_async(job.sql, job.params)
+            job.query_id = cursor.sfqid
+            job.started_at = time.monotonic()
+        except Exception as e:
+            self._retry_or_fail(job, e)
+            return
+        with self._cond:
+            self._running.append(job)
+
+    def _poll(self, conn, job):
+        try:
+            status = conn.get_query_status_throw_if_error(job.query_id)
+        except Exception as e:
+            self._finish_attempt(job)
+            self._retry_or_fail(job, e)
+            return
+        if conn.is_still_running(status):
+            if time.monotonic() - job.started_at > self.timeout:
+                self._cancel(conn, job.query_id)
+                self._finish_attempt(job)
+                with self._cond:
+                    self.counters["timeouts"] += 1
+                self._retry_or_fail(job, CortexTimeoutError(f"Cortex query {job.query_id} exceeded {self.timeout}s."))
+            return
+        self._finish_attempt(job)
+        try:
+            cursor = conn.cursor()
+            cursor.get_results_from_sfqid(job.query_id)
+            row = cursor.fetchone()
+        except Exception as e:
+            self._retry_or_fail(job, e)
+            return
+        self._resolve(job, result=row[0] if row else None)
+
+    def _cancel(self, conn, query_id):
+        try:
+            conn.cursor().execute("SELECT SYSTEM$CANCEL_QUERY(%s)", (query_id,))
+        except Exception:
+            pass
+
+    def _finish_attempt(self, job):
+        with self._cond:
+            if job in self._running:
+                self._running.remove(job)
+
+    def _retry_or_fail(self, job, error):
+        if job.attempts <= self.retries:
+            with self._cond:
+                self.counters["retries"] += 1
+                job.not_before = time.monotonic() + self.backoff * 2 ** (job.attempts - 1)
+                self._queue.insert(0, job)
+            return
+        if not isinstance(error, CortexError):
+            error = CortexError(f"Cortex call failed after {job.attempts} attempts: {error}")
+        self._resolve(job, error=error)
+
+    def _resolve(self, job, result=None, error=None):
+        with self._cond:
+            if self._inflight.get(job.key) is job:
+                self._inflight.pop(job.key)
+            if job.future.done():
+                return
+            self.counters["failures" if error else "completed"] += 1
+        try:
+            if error:
+                job.future.set_exception(error)
+            else:
+                job.future.set_result(result)
+        except InvalidStateError:
+            pass  # cancelled by the caller in the meantime
@@ -1,22 +1,486 @@
 import streamlit as st
-import snowflake.connector
 import pandas as pd
 import json
+import re
+import os
+import shutil
+import threading
+import time
+from modules.pool import ConnectionPool
+from modules import telemetry
+from modules.query_parser import has_filters
+from modules.vector_index import LocalVectorIndex, BATCH_RESULT_COLUMNS, RESULT_COLUMNS
+from modules.neighbors import NeighborTable, NEIGHBORS_DIR
+
+INDEX_DIR = os.path.join(".cache", "vector_index")
 
 def get_db_connection():
     """
     Establishes a connection to Snowflake using credentials from secrets.toml.
+    Prefer db_connection() on hot paths; this opens a brand new session.
+    """
+    # Imported here: the connector is slow to import and the first page doesn't need a session
+    import snowflake.connector
+    # Merged rather than passed twice, in case secrets.toml already sets it
+    return snowflake.connector.connect(**{**st.secrets["snowflake"], "client_session_keep_alive": True})
+
+@st.cache_resource
+def get_connection_pool():
     """
-    return snowflake.connector.connect(
-        **st.secrets["snowflake"]
+    Process-wide connection pool, shared across sessions and reruns.
+    Sizing can be tuned with an optional [pool] section in secrets.toml.
+    """
+    cfg = st.secrets.get("pool", {})
+    pool = ConnectionPool(
+        get_db_connection,
+        min_size=int(cfg.get("min_size", 1)),
+        max_size=int(cfg.get("max_size", 8)),
+        max_idle_seconds=int(cfg.get("max_idle_seconds", 300)),
+        health_check_interval=int(cfg.get("health_check_interval", 60)),
+        acquire_timeout=int(cfg.get("acquire_timeout", 30)),
     )
+    pool.start_keepalive()
+    return pool
+
+def db_connection():
+    """
+    Context manager yielding a pooled connection.
+    Usage: `with db_connection() as conn: ...`
+    """
+    return get_connection_pool().connection()
+
+def get_search_config():
+    """
+    Reads the optional [search] section of secrets.toml.
+    backend = "snowflake" (default) or "local"; n_probe > 0 enables IVF search.
+    sync_mode = "watermark" (needs watermark_column) or "changes" (table CHANGE_TRACKING).
+    keyword_weight = share of the keyword leg in hybrid ranking (0 = vector only).
+    vector_weights = {column = weight} vector columns fused into SIMILARITY_SCORE.
+    """
+    cfg = st.secrets.get("search", {})
+    return {
+        "backend": cfg.get("backend", "snowflake"),
+        "ivf_lists": int(cfg.get("ivf_lists", 0)),
+        "n_probe": int(cfg.get("n_probe", 0)),
+        "sync_mode": cfg.get("sync_mode", "watermark"),
+        "key_column": cfg.get("key_column", "IMAGE_FILENAME"),
+        "watermark_column": cfg.get("watermark_column", "UPDATED_AT"),
+        "sync_interval": int(cfg.get("sync_interval", 0)),
+        "keyword_weight": float(cfg.get("keyword_weight", 0.3)),
+        "vector_weights": {k: float(v) for k, v in dict(cfg.get("vector_weights", {"VECTOR_TEXT": 1.0})).items()},
+    }
+
+CATALOG_COLUMNS = "TITLE, BRAND, PRICE, PRODUCT_DETAILS_CLEAN, IMAGE_FILENAME, VECTOR_TEXT"
+
+def fetch_frame_batches(sql, params=None):
+    """
+    Runs a query and streams the result as DataFrame batches through the
+    connector's Arrow path (fetch_pandas_batches) instead of pd.read_sql.
+    """
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        for batch in cursor.fetch_pandas_batches():
+            yield batch
+
+def load_catalog_frame(where="", params=None, extra_columns=""):
+    """
+    Pulls product metadata and text vectors from PRODUCTS_FINAL.
+    `where`/`params` narrow the pull for incremental syncs.
+    """
+    sql = f"SELECT {CATALOG_COLUMNS}{extra_columns} FROM PRODUCTS_FINAL {where}"
+    batches = list(fetch_frame_batches(sql, params))
+    if not batches:
+        return pd.DataFrame(columns=[c.strip() for c in CATALOG_COLUMNS.split(",")])
+    return pd.concat(batches, ignore_index=True)
+
+class CatalogSync:
+    """
+    Owns the live LocalVectorIndex and keeps it fresh with incremental pulls.
+    Each sync builds a new index off to the side and swaps the reference, so
+    searches in flight keep reading the previous version untouched.
+    """
+
+    def __init__(self, cfg):
+        self.cfg = cfg
+        self._lock = threading.Lock()
+        self._scheduler = None
+        self.last_error = None
+        self.last_changes = {"upserts": 0, "deletes": 0}
+        self._listeners = []
+        self.index = LocalVectorIndex.load(INDEX_DIR)
+        if self.index is None:
+            self.full_load()
+        elif self.index.info.get("ivf_lists", 0) != self.cfg["ivf_lists"]:
+            # ivf_lists changed since the snapshot was written: re-partition the loaded vectors
+            self._publish(self._partition(self.index))
+
+    # ------------------------------------------
+    # Loading
+    # ------------------------------------------
+    def full_load(self):
+        with self._lock:
+            # Read before the load: rows changed while it runs are newer and come in with the next sync
+            watermark = self._initial_watermark()
+            df = load_catalog_frame()
+            index = self._partition(LocalVectorIndex.from_frame(df))
+            index.info["watermark"] = watermark
+            index.info["synced_at"] = time.time()
+            self._publish(index)
+
+    def _partition(self, index):
+        """Builds (or drops) the IVF partitions to match the configured ivf_lists."""
+        if self.cfg["ivf_lists"] > 0:
+            index.build_ivf(n_lists=self.cfg["ivf_lists"])
+        else:
+            index.centroids = index.assignments = index._lists = None
+        index.info["ivf_lists"] = self.cfg["ivf_lists"]
+        return index
 
-def search_products_by_vector(query_vector, limit=5):
+    def sync(self):
+        """Pulls rows changed since the stored watermark and applies them."""
+        with self._lock:
+            try:
+                if self.cfg["sync_mode"] == "changes":
+                    upserts, deletes, watermark = self._pull_changes()
+                else:
+                    upserts, deletes, watermark = self._pull_watermark()
+                changed = not upserts.empty or bool(deletes)
+                if changed:
+                    index = self.index.apply_changes(upserts, deletes, key_column=self.cfg["key_column"])
+                    index.info.update(watermark=watermark, synced_at=time.time())
+                    self._publish(index)
+                else:
+                    # Nothing changed: keep the same arrays, persist only the new watermark
+                    index = self.index.with_info(watermark=watermark, synced_at=time.time())
+                    if os.path.exists(INDEX_DIR):
+                        index.save_manifest(INDEX_DIR)
+                    self.index = index
+                self.last_changes = {"upserts": len(upserts), "deletes": len(deletes)}
+                self.last_error = None
+                if changed:
+                    self._notify()
+            except Exception as e:
+                self.last_error = str(e)
+                raise
+
+    def _pull_watermark(self):
+        col = self.cfg["watermark_column"]
+        watermark = self.index.info.get("watermark")
+        df = load_catalog_frame(
+            where=f"WHERE {col} > %s::TIMESTAMP_LTZ" if watermark else "",
+            params=[watermark] if watermark else None,
+            extra_columns=f", {col} AS SYNC_WATERMARK",
+        )
+        if not df.empty:
+            watermark = str(df["SYNC_WATERMARK"].max())
+        df = df.drop(columns=["SYNC_WATERMARK"], errors="ignore")
+
+        # Watermarks can't see deletes; reconcile keys (a narrow, cheap scan).
+        key = self.cfg["key_column"]
+        live_keys = set()
+        for batch in fetch_frame_batches(f"SELECT {key} FROM PRODUCTS_FINAL"):
+            live_keys.update(batch[key])
+        deletes = set(self.index.metadata[key]) - live_keys if len(self.index) else set()
+        return df, deletes, watermark
+
+    def _pull_changes(self):
+        started = self._server_now()
+        df = load_catalog_frame(
+            where="CHANGES(INFORMATION => DEFAULT) AT(TIMESTAMP => %s::TIMESTAMP_LTZ)",
+            params=[self.index.info.get("watermark")],
+            extra_columns=', METADATA$ACTION AS SYNC_ACTION, METADATA$ISUPDATE AS SYNC_ISUPDATE',
+        )
+        if df.empty:
+            return df, set(), started
+        is_delete = (df["SYNC_ACTION"] == "DELETE") & ~df["SYNC_ISUPDATE"].astype(bool)
+        deletes = set(df.loc[is_delete, self.cfg["key_column"]])
+        upserts = df[df["SYNC_ACTION"] == "INSERT"].drop(columns=["SYNC_ACTION", "SYNC_ISUPDATE"])
+        return upserts, deletes - set(upserts[self.cfg["key_column"]]), started
+
+    def _initial_watermark(self):
+        if self.cfg["sync_mode"] == "changes":
+            return self._server_now()
+        col = self.cfg["watermark_column"]
+        try:
+            with db_connection() as conn:
+                row = conn.cursor().execute(f"SELECT MAX({col}) FROM PRODUCTS_FINAL").fetchone()
+            return str(row[0]) if row and row[0] is not None else None
+        except Exception:
+            return None
+
+    def _server_now(self):
+        with db_connection() as conn:
+            return str(conn.cursor().execute("SELECT CURRENT_TIMESTAMP()").fetchone()[0])
+
+    def add_listener(self, callback):
+        """Registers a no-arg callback fired after a sync that changed the catalog."""
+        self._listeners.append(callback)
+
+    def _notify(self):
+        for callback in self._listeners:
+            try:
+                callback()
+            except Exception:
+                pass
+
+    def _publish(self, index):
+        # Snapshot first, then swap the in-memory reference.
+        save_index_snapshot(index)
+        self.index = index
+
+    # ------------------------------------------
+    # Scheduling & metrics
+    # ------------------------------------------
+    def start_scheduler(self, interval):
+        if self._scheduler is not None or interval <= 0:
+            return
+
+        def _loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.sync()
+                except Exception:
+                    pass
+
+        self._scheduler = threading.Thread(target=_loop, name="catalog-sync", daemon=True)
+        self._scheduler.start()
+
+    def staleness_seconds(self):
+        synced_at = self.index.info.get("synced_at")
+        return time.time() - synced_at if synced_at else float("inf")
+
+    def stats(self):
+        return {
+            "rows": len(self.index),
+            "watermark": self.index.info.get("watermark"),
+            "staleness_seconds": self.staleness_seconds(),
+            "last_upserts": self.last_changes["upserts"],
+            "last_deletes": self.last_changes["deletes"],
+            "last_error": self.last_error,
+        }
+
+def save_index_snapshot(index):
+    """
+    Writes the snapshot into a sibling directory and swaps it into place, so
+    readers never load a mix of old and new files.
+    """
+    staging = INDEX_DIR + ".new"
+    retired = INDEX_DIR + ".old"
+    shutil.rmtree(staging, ignore_errors=True)
+    index.save(staging)
+    shutil.rmtree(retired, ignore_errors=True)
+    if os.path.exists(INDEX_DIR):
+        os.replace(INDEX_DIR, retired)
+    os.replace(staging, INDEX_DIR)
+    shutil.rmtree(retired, ignore_errors=True)
+
+@st.cache_resource
+def get_catalog_sync():
+    cfg = get_search_config()
+    sync = CatalogSync(cfg)
+    sync.start_scheduler(cfg["sync_interval"])
+    return sync
+
+def get_local_index():
+    """
+    Returns the current local vector index, loaded from its on-disk snapshot
+    (memory-mapped) or built from Snowflake once and kept fresh by CatalogSync.
+    """
+    return get_catalog_sync().index
+
+def fetch_products_by_keys(keys, key_column="IMAGE_FILENAME"):
+    """
+    Product rows (same columns as a search result, without a score) for the given keys.
+    Used to rehydrate chat history grids whose rows fell out of the product cache.
+    """
+    if not keys:
+        return pd.DataFrame()
+    placeholders = ", ".join(["%s"] * len(keys))
+    sql = f"""
+    SELECT TITLE, BRAND, PRICE, PRODUCT_DETAILS_CLEAN, IMAGE_FILENAME
+    FROM PRODUCTS_FINAL
+    WHERE {key_column} IN ({placeholders})
+    """
+    try:
+        with db_connection() as conn:
+            return pd.read_sql(sql, conn, params=list(keys))
+    except Exception as e:
+        st.error(f"❌ Database Error: {e}")
+        return pd.DataFrame()
+
+@st.cache_resource(max_entries=1)
+def _load_neighbor_table(manifest_mtime):
+    return NeighborTable.load(NEIGHBORS_DIR) if manifest_mtime else None
+
+def get_neighbor_table():
+    """
+    Precomputed similar-products table (built offline by `python -m modules.neighbors`), or None.
+    Keyed on the manifest's mtime (written last by save), so a table built or
+    rebuilt while the app runs is picked up on the next lookup.
+    """
+    try:
+        manifest_mtime = os.stat(os.path.join(NEIGHBORS_DIR, "manifest.json")).st_mtime_ns
+    except OSError:
+        manifest_mtime = None
+    return _load_neighbor_table(manifest_mtime)
+
+def get_similar_products(product_id, limit=5):
+    """
+    Products most similar to `product_id` (= IMAGE_FILENAME), looked up in the
+    neighbour table: O(1), no embedding or vector search at request time.
+    Empty when the table has not been built or the product is newer than it.
+    """
+    table = get_neighbor_table()
+    if table is None:
+        return pd.DataFrame(columns=RESULT_COLUMNS)
+    return table.similar(product_id, limit=limit)
+
+@st.cache_resource(ttl=3600)
+def get_known_brands():
+    """Distinct catalog brands, used by query_parser to recognise brand filters."""
+    if get_search_config()["backend"] == "local":
+        return sorted(get_local_index().metadata["BRAND"].dropna().astype(str).unique().tolist())
+    try:
+        with db_connection() as conn:
+            df = pd.read_sql("SELECT DISTINCT BRAND FROM PRODUCTS_FINAL WHERE BRAND IS NOT NULL", conn)
+        return sorted(df["BRAND"].astype(str).tolist())
+    except Exception:
+        return []
+
+def search_products_by_vector(query_vector, limit=5, filters=None):
+    """
+    Searches for similar products using the configured backend.
+    `filters` (from query_parser.parse_query) restrict brand / price before
+    ranking and add a keyword leg fused with the vector similarity.
+    Returns a DataFrame containing the top N most similar products.
+    """
+    cfg = get_search_config()
+    telemetry.annotate(backend=cfg["backend"], filtered=has_filters(filters))
+    if cfg["backend"] == "local":
+        try:
+            df = get_local_index().search(query_vector, limit=limit, n_probe=cfg["n_probe"],
+                                          filters=filters, keyword_weight=cfg["keyword_weight"])
+        except Exception as e:
+            st.error(f"❌ Local Index Error: {e}")
+            df = pd.DataFrame()
+    else:
+        df = search_products_in_snowflake(query_vector, limit=limit, filters=filters,
+                                          keyword_weight=cfg["keyword_weight"],
+                                          vector_weights=cfg["vector_weights"])
+    telemetry.annotate(rows=len(df))
+    return df
+
+def search_products_by_vectors(query_vectors, limit=5, filters=None, batch_size=256):
+    """
+    Batch variant of search_products_by_vector: top `limit` products for each
+    query vector, in one statement per `batch_size` queries (Snowflake) or one
+    matrix multiply (local backend).
+    Returns a long-format DataFrame keyed by QUERY_INDEX (position in
+    `query_vectors`) and RANK (1-based), plus the usual result columns.
+    No keyword leg: filters only restrict brand / price.
+    """
+    query_vectors = [list(map(float, v)) for v in query_vectors]
+    if not query_vectors:
+        return pd.DataFrame(columns=BATCH_RESULT_COLUMNS)
+    cfg = get_search_config()
+    if cfg["backend"] == "local":
+        try:
+            return get_local_index().search_many(query_vectors, limit=limit, n_probe=cfg["n_probe"], filters=filters)
+        except Exception as e:
+            st.error(f"❌ Local Index Error: {e}")
+            return pd.DataFrame(columns=BATCH_RESULT_COLUMNS)
+    frames = []
+    for offset in range(0, len(query_vectors), batch_size):
+        df = search_batch_in_snowflake(query_vectors[offset:offset + batch_size], limit, filters, cfg["vector_weights"])
+        df["QUERY_INDEX"] += offset
+        frames.append(df)
+    return pd.concat(frames, ignore_index=True)
+
+def search_batch_in_snowflake(query_vectors, limit=5, filters=None, vector_weights=None):
+    """
+    One statement for many queries: the vectors are bound as a single JSON
+    array, FLATTENed into a (QUERY_INDEX, QV) table, cross-joined with the
+    catalog and cut to the top `limit` per query with QUALIFY.
+    """
+    try:
+        where, where_params = filter_predicates(filters)
+        sql = f"""
+        WITH q AS (
+            SELECT f.INDEX as QUERY_INDEX, CAST(f.VALUE AS VECTOR(FLOAT, 1024)) as QV
+            FROM TABLE(FLATTEN(INPUT => PARSE_JSON(%s))) f
+        ), scored AS (
+            SELECT
+                q.QUERY_INDEX,
+                TITLE, BRAND, PRICE, PRODUCT_DETAILS_CLEAN, IMAGE_FILENAME,
+                {similarity_sql(vector_weights)} as SIMILARITY_SCORE
+            FROM PRODUCTS_FINAL, q
+            {where}
+        )
+        SELECT *, ROW_NUMBER() OVER (PARTITION BY QUERY_INDEX ORDER BY SIMILARITY_SCORE DESC) as RANK
+        FROM scored
+        QUALIFY RANK <= {int(limit)}
+        ORDER BY QUERY_INDEX, RANK
+        """
+        with db_connection() as conn:
+            with telemetry.span("db.query", statement="vector_search_batch", queries=len(query_vectors)):
+                df = pd.read_sql(sql, conn, params=[json.dumps(query_vectors)] + where_params)
+        df.columns = [c.upper() for c in df.columns]
+        return df.reindex(columns=BATCH_RESULT_COLUMNS)
+    except Exception as e:
+        st.error(f"❌ Database Error: {e}")
+        return pd.DataFrame(columns=BATCH_RESULT_COLUMNS)
+
+PRICE_EXPR = "TRY_TO_DECIMAL(REGEXP_REPLACE(PRICE, '[^0-9.]', ''), 10, 2)"
+
+def filter_predicates(filters):
+    """SQL WHERE clause (with %s params) for brand / price filters."""
+    clauses, params = [], []
+    if filters and filters.get("brands"):
+        clauses.append(f"LOWER(BRAND) IN ({', '.join(['%s'] * len(filters['brands']))})")
+        params += [b.lower() for b in filters["brands"]]
+    if filters and filters.get("min_price") is not None:
+        clauses.append(f"{PRICE_EXPR} >= %s")
+        params.append(filters["min_price"])
+    if filters and filters.get("max_price") is not None:
+        clauses.append(f"{PRICE_EXPR} <= %s")
+        params.append(filters["max_price"])
+    return ("WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+def similarity_sql(vector_weights=None):
+    """
+    SIMILARITY_SCORE expression over one or more vector columns, each compared
+    with the query vector QV. Multiple columns are fused as a weighted mean of
+    their cosine similarities; rows missing a vector are scored on the rest.
+    """
+    weights = vector_weights or {"VECTOR_TEXT": 1.0}
+    for column in weights:
+        if not re.fullmatch(r"[A-Za-z_][A-Za-z0-9_]*", column):
+            raise ValueError(f"Invalid vector column: {column}")
+    if len(weights) == 1:
+        return f"VECTOR_COSINE_SIMILARITY({next(iter(weights))}, q.QV)"
+    sims = {c: f"VECTOR_COSINE_SIMILARITY({c}, q.QV)" for c in weights}
+    num = " + ".join(f"{w} * COALESCE({sims[c]}, 0)" for c, w in weights.items())
+    den = " + ".join(f"IFF({c} IS NULL, 0, {w})" for c, w in weights.items())
+    return f"({num}) / NULLIF({den}, 0)"
+
+def search_products_multi_vector(query_vector, vector_weights, limit=5, filters=None, keyword_weight=0.0):
+    """
+    Scores one query vector against several vector columns (e.g. VECTOR_TEXT
+    and VECTOR_IMAGE) with weighted fusion, in a single query.
+    """
+    return search_products_in_snowflake(query_vector, limit=limit, filters=filters,
+                                        keyword_weight=keyword_weight, vector_weights=vector_weights)
+
+def search_products_in_snowflake(query_vector, limit=5, filters=None, keyword_weight=0.0, vector_weights=None):
     """
     Searches for similar products using Snowflake's VECTOR_COSINE_SIMILARITY function.
+    Filters become WHERE predicates so only matching rows are scored; keywords
+    add a CONTAINS hit count whose rank is fused with the vector rank (RRF).
+    `vector_weights` fuses several vector columns (see similarity_sql).
     Returns a DataFrame containing the top N most similar products.
     """
-    conn = get_db_connection()
     try:
         # FIX APPLIED:
         # 1. We dump the list to a JSON string in Python to be safe.
@@ -24,27 +488,56 @@ def search_products_by_vector(query_vector, limit=5):
         # This resolves the "Unsupported data type 'FIXED'" error.
         
         vector_json = json.dumps(query_vector)
-        
-        sql = f"""
-        SELECT 
-            TITLE, 
-            BRAND, 
-            PRICE, 
-            PRODUCT_DETAILS_CLEAN,
-            IMAGE_FILENAME,
-            VECTOR_COSINE_SIMILARITY(VECTOR_TEXT, CAST(PARSE_JSON(%s) AS VECTOR(FLOAT, 1024))) as SIMILARITY_SCORE
-        FROM PRODUCTS_FINAL
-        ORDER BY SIMILARITY_SCORE DESC
-        LIMIT {limit}
-        """
-        
+        where, where_params = filter_predicates(filters)
+        keywords = (filters or {}).get("keywords") or []
+        similarity = similarity_sql(vector_weights)
+        # The query vector is bound once and shared by every similarity term
+        query_cte = "q AS (SELECT CAST(PARSE_JSON(%s) AS VECTOR(FLOAT, 1024)) as QV)"
+
+        if not keywords or keyword_weight <= 0:
+            sql = f"""
+            WITH {query_cte}
+            SELECT 
+                TITLE, 
+                BRAND, 
+                PRICE, 
+                PRODUCT_DETAILS_CLEAN,
+                IMAGE_FILENAME,
+                {similarity} as SIMILARITY_SCORE
+            FROM PRODUCTS_FINAL, q
+            {where}
+            ORDER BY SIMILARITY_SCORE DESC
+            LIMIT {int(limit)}
+            """
+            params = [vector_json] + where_params
+        else:
+            hits = " + ".join(["IFF(CONTAINS(SEARCH_TEXT, %s), 1, 0)"] * len(keywords))
+            sql = f"""
+            WITH {query_cte}, candidates AS (
+                SELECT
+                    TITLE, BRAND, PRICE, PRODUCT_DETAILS_CLEAN, IMAGE_FILENAME,
+                    {similarity} as SIMILARITY_SCORE,
+                    LOWER(COALESCE(TITLE, '') || ' ' || COALESCE(BRAND, '') || ' ' || COALESCE(PRODUCT_DETAILS_CLEAN, '')) as SEARCH_TEXT
+                FROM PRODUCTS_FINAL, q
+                {where}
+            ), scored AS (
+                SELECT *, ({hits}) as KEYWORD_HITS FROM candidates
+            )
+            SELECT TITLE, BRAND, PRICE, PRODUCT_DETAILS_CLEAN, IMAGE_FILENAME, SIMILARITY_SCORE
+            FROM scored
+            ORDER BY
+                (1 - %s) / (60 + RANK() OVER (ORDER BY SIMILARITY_SCORE DESC))
+                + IFF(KEYWORD_HITS > 0, %s / (60 + RANK() OVER (ORDER BY KEYWORD_HITS DESC)), 0) DESC
+            LIMIT {int(limit)}
+            """
+            params = [vector_json] + where_params + list(keywords) + [keyword_weight, keyword_weight]
+
         # We pass the JSON string, not the raw list
-        df = pd.read_sql(sql, conn, params=[vector_json])
+        with db_connection() as conn:
+            with telemetry.span("db.query", statement="vector_search"):
+                df = pd.read_sql(sql, conn, params=params)
         return df
         
     except Exception as e:
         st.error(f"❌ Database Error: {e}")
-        return pd.DataFrame() 
-        
-    finally:
-        conn.close()
\ No newline at end of file
+        return pd.DataFrame()
@@ -1,22 +1,54 @@
 import streamlit as st
-import voyageai
-from PIL import Image
 import io
+import random
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from modules.embedding_cache import EmbeddingCache, make_key
 
-# Init Client
-client = voyageai.Client(api_key=st.secrets["voyage"]["api_key"])
+MODEL_NAME = "voyage-multimodal-3"
+
+# voyage-multimodal-3 request limits
+MAX_BATCH_INPUTS = 1000
+MAX_BATCH_TOKENS = 320_000
+# Errors worth retrying (matched by class name so fake clients can raise them too)
+RETRYABLE_ERRORS = {"RateLimitError", "ServiceUnavailableError", "Timeout", "APIConnectionError", "TryAgain"}
+
+@st.cache_resource
+def get_voyage_client():
+    """
+    Voyage client, built on first use. voyageai (and PIL below) are imported
+    lazily so importing this module doesn't slow down app startup.
+    """
+    import voyageai
+    return voyageai.Client(api_key=st.secrets["voyage"]["api_key"])
+
+@st.cache_resource
+def get_embedding_cache():
+    """
+    Process-wide embedding cache. Configure with an optional [embedding_cache]
+    section in secrets.toml; disk_path enables the shared SQLite tier.
+    """
+    cfg = st.secrets.get("embedding_cache", {})
+    return EmbeddingCache(
+        max_entries=int(cfg.get("max_entries", 5000)),
+        ttl_seconds=int(cfg.get("ttl_seconds", 7 * 24 * 3600)),
+        disk_path=cfg.get("disk_path", ".cache/embeddings.sqlite3"),
+        disk_max_entries=int(cfg.get("disk_max_entries", 200000)),
+        prune_every=int(cfg.get("prune_every", 1000)),
+    )
 
 def get_text_embedding(text_query):
     """
     Generate embedding untuk teks.
     """
     try:
-        result = client.multimodal_embed(
+        key = make_key("text", text_query, MODEL_NAME, "query")
+        return get_embedding_cache().get_or_compute(key, lambda: get_voyage_client().multimodal_embed(
             inputs=[[text_query]], 
-            model="voyage-multimodal-3", 
+            model=MODEL_NAME, 
             input_type="query"
-        )
-        return result.embeddings[0]
+        ).embeddings[0])
     except Exception as e:
         st.error(f"❌ Text Embedding Error: {e}")
         return []
@@ -29,22 +61,162 @@ def get_image_embedding_from_bytes(uploaded_file):
     try:
         # 1. Pastikan pointer file ada di awal (Penting untuk Streamlit)
         uploaded_file.seek(0)
+        image_bytes = uploaded_file.read()
+        key = make_key("image", image_bytes, MODEL_NAME, "query")
         
-        # 2. Convert file upload Streamlit menjadi PIL Image
-        # Ini format yang diminta oleh error message tadi ("PIL images")
-        pil_image = Image.open(uploaded_file)
+        def _embed():
+            # 2. Convert file upload Streamlit menjadi PIL Image
+            # Ini format yang diminta oleh error message tadi ("PIL images")
+            from PIL import Image
+            pil_image = Image.open(io.BytesIO(image_bytes))
+            
+            # 3. Kirim ke Voyage
+            # Format: inputs=[ [content_1, content_2] ]
+            # Kita kirim [[pil_image]] karena ini single multimodal query
+            result = get_voyage_client().multimodal_embed(
+                inputs=[[pil_image]], 
+                model=MODEL_NAME,
+                input_type="query" 
+            )
+            return result.embeddings[0]
         
-        # 3. Kirim ke Voyage
-        # Format: inputs=[ [content_1, content_2] ]
-        # Kita kirim [[pil_image]] karena ini single multimodal query
-        result = client.multimodal_embed(
-            inputs=[[pil_image]], 
-            model="voyage-multimodal-3",
-            input_type="query" 
-        )
-        
-        return result.embeddings[0]
+        return get_embedding_cache().get_or_compute(key, _embed)
         
     except Exception as e:
         st.error(f"❌ Image Embedding Error: {e}")
-        return []
\ No newline at end of file
+        return []
+
+def get_multimodal_embedding(text_query, uploaded_file):
+    """
+    Generate satu embedding untuk teks + gambar sekaligus.
+    voyage-multimodal-3 menerima input interleaved, jadi teks yang diketik user
+    dan gambar yang di-upload di-embed bersama dalam satu request.
+    """
+    try:
+        uploaded_file.seek(0)
+        image_bytes = uploaded_file.read()
+        key = make_key("text+image", text_query.encode("utf-8") + b"\x00" + image_bytes, MODEL_NAME, "query")
+
+        def _embed():
+            from PIL import Image
+            pil_image = Image.open(io.BytesIO(image_bytes))
+            # Format: inputs=[ [text, image] ] -> satu query multimodal
+            result = get_voyage_client().multimodal_embed(
+                inputs=[[text_query, pil_image]],
+                model=MODEL_NAME,
+                input_type="query"
+            )
+            return result.embeddings[0]
+
+        return get_embedding_cache().get_or_compute(key, _embed)
+
+    except Exception as e:
+        st.error(f"❌ Multimodal Embedding Error: {e}")
+        return []
+
+def warm_embedding_cache(query_log_path):
+    """
+    Pre-computes embeddings for every distinct query in a log file (one query per line).
+    Returns the number of queries that were not cached yet.
+    """
+    cache = get_embedding_cache()
+    with open(query_log_path, encoding="utf-8") as f:
+        queries = list(dict.fromkeys(line.strip() for line in f if line.strip()))
+    missing = [q for q in queries if cache.get(make_key("text", q, MODEL_NAME, "query")) is None]
+    for _ in embed_batch(missing, input_type="query"):
+        pass
+    return len(missing)
+
+# ==========================================
+# BATCH API (offline jobs: catalog re-embed, log replay, evaluation)
+# ==========================================
+def _estimate_tokens(item):
+    # Rough Voyage accounting: ~4 chars per text token, 560 pixels per image token.
+    if isinstance(item, str):
+        return max(1, len(item) // 4)
+    from PIL import Image
+    if isinstance(item, Image.Image):
+        return max(1, item.width * item.height // 560)
+    return 1000
+
+def _to_voyage_input(item):
+    if isinstance(item, (bytes, bytearray)):
+        from PIL import Image
+        return Image.open(io.BytesIO(item))
+    return item
+
+def _cache_key(item, input_type):
+    if isinstance(item, str):
+        return make_key("text", item, MODEL_NAME, input_type)
+    if isinstance(item, (bytes, bytearray)):
+        return make_key("image", bytes(item), MODEL_NAME, input_type)
+    return None
+
+def _embed_chunk(voyage_client, chunk, input_type, max_retries, base_delay):
+    inputs = [[_to_voyage_input(item)] for _, item in chunk]
+    for attempt in range(max_retries + 1):
+        try:
+            result = voyage_client.multimodal_embed(inputs=inputs, model=MODEL_NAME, input_type=input_type)
+            return result.embeddings
+        except Exception as e:
+            if type(e).__name__ not in RETRYABLE_ERRORS or attempt == max_retries:
+                raise
+            # Exponential backoff with full jitter
+            time.sleep(random.uniform(0, base_delay * (2 ** attempt)))
+
+def embed_batch(items, input_type="document", max_workers=4, max_inputs=MAX_BATCH_INPUTS,
+                max_tokens=MAX_BATCH_TOKENS, max_retries=5, base_delay=1.0, use_cache=True,
+                voyage_client=None):
+    """
+    Embeds an iterable of texts (str) or images (bytes / PIL Image).
+    Cache misses are chunked to Voyage's batch limits and up to `max_workers`
+    chunks are in flight at once. Yields one vector per input, in input order:
+    each chunk's vectors come out as soon as it and every earlier chunk are
+    done (the input iterable is consumed lazily, and read-ahead stops at
+    2 x max_workers queued chunks).
+    """
+    voyage_client = voyage_client or get_voyage_client()
+    cache = get_embedding_cache() if use_cache else None
+
+    def _run(chunk):
+        # chunk: list of [item, key, vector]; only entries without a vector hit the API
+        misses = [entry for entry in chunk if entry[2] is None]
+        if misses:
+            vectors = _embed_chunk(voyage_client, [(None, entry[0]) for entry in misses],
+                                   input_type, max_retries, base_delay)
+            for entry, vector in zip(misses, vectors):
+                entry[2] = vector
+                if cache and entry[1]:
+                    cache.put(entry[1], vector)
+        return [entry[2] for entry in chunk]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        in_flight = deque()
+
+        def _drain(keep):
+            while len(in_flight) > keep:
+                yield from in_flight.popleft().result()
+
+        def _ready():
+            # Finished chunks at the head of the queue, without waiting on the rest
+            while in_flight and in_flight[0].done():
+                yield from in_flight.popleft().result()
+
+        chunk, n_misses, tokens = [], 0, 0
+        for item in items:
+            key = _cache_key(item, input_type) if cache else None
+            vector = cache.get(key) if key else None
+            cost = 0 if vector is not None else _estimate_tokens(_to_voyage_input(item))
+            if n_misses and (n_misses >= max_inputs or tokens + cost > max_tokens):
+                in_flight.append(pool.submit(_run, chunk))
+                chunk, n_misses, tokens = [], 0, 0
+                yield from _ready()
+                # Bounded read-ahead: wait for the oldest chunk before queueing more
+                yield from _drain(max_workers * 2)
+            chunk.append([item, key, vector])
+            if vector is None:
+                n_misses += 1
+                tokens += cost
+        if chunk:
+            in_flight.append(pool.submit(_run, chunk))
+        yield from _drain(0)
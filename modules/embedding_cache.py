@@ -0,0 +1,177 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from modules import telemetry
+
+
+def normalize_text(text):
+    """Collapses whitespace so trivially different spellings share a cache entry."""
+    return " ".join(str(text).split())
+
+
+def make_key(kind, payload, model, input_type):
+    """
+    Content-addressed cache key: sha256 over model, input_type, kind and payload.
+    `payload` is normalized text (str) or raw image bytes.
+    """
+    h = hashlib.sha256()
+    h.update(f"{model}\x00{input_type}\x00{kind}\x00".encode("utf-8"))
+    h.update(payload if isinstance(payload, bytes) else normalize_text(payload).encode("utf-8"))
+    return h.hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache.
+    Tier 1 is an in-process LRU; tier 2 is an optional SQLite file that several
+    Streamlit workers can share. Both tiers honour the same TTL; the disk tier
+    is pruned to disk_max_entries every `prune_every` writes.
+    """
+
+    def __init__(self, max_entries=5000, ttl_seconds=7 * 24 * 3600, disk_path=None, disk_max_entries=200000,
+                 prune_every=1000):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_max_entries = disk_max_entries
+        self.prune_every = prune_every
+        self._disk_writes = 0
+        self._memory = OrderedDict()  # key -> (vector, stored_at)
+        self._lock = threading.Lock()
+        self._disk_path = disk_path
+        self._local = threading.local()
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0, "evictions": 0, "prunes": 0}
+        if disk_path:
+            directory = os.path.dirname(disk_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with self._db() as db:
+                db.execute(
+                    "CREATE TABLE IF NOT EXISTS embeddings ("
+                    "key TEXT PRIMARY KEY, vector BLOB NOT NULL, stored_at REAL NOT NULL)"
+                )
+                db.execute("CREATE INDEX IF NOT EXISTS embeddings_stored_at ON embeddings(stored_at)")
+
+    def _db(self):
+        # sqlite3 connections can't be shared across threads; keep one per thread.
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self._disk_path, timeout=5)
+            db.execute("PRAGMA journal_mode=WAL")
+            self._local.db = db
+        return db
+
+    def _expired(self, stored_at):
+        return self.ttl_seconds and time.time() - stored_at > self.ttl_seconds
+
+    # ------------------------------------------
+    # Lookup / store
+    # ------------------------------------------
+    def get(self, key):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if not self._expired(entry[1]):
+                    self._memory.move_to_end(key)
+                    self._counters["memory_hits"] += 1
+                    return entry[0].tolist()
+                del self._memory[key]
+
+        if self._disk_path:
+            try:
+                row = self._db().execute(
+                    "SELECT vector, stored_at FROM embeddings WHERE key = ?", (key,)
+                ).fetchone()
+            except sqlite3.Error:
+                row = None
+            if row and not self._expired(row[1]):
+                vector = np.frombuffer(row[0], dtype=np.float32)
+                self._remember(key, vector, row[1])
+                with self._lock:
+                    self._counters["disk_hits"] += 1
+                return vector.tolist()
+
+        with self._lock:
+            self._counters["misses"] += 1
+        return None
+
+    def put(self, key, vector):
+        if vector is None or len(vector) == 0:
+            return
+        vector = np.asarray(vector, dtype=np.float32)
+        now = time.time()
+        self._remember(key, vector, now)
+        with self._lock:
+            self._counters["writes"] += 1
+        if self._disk_path:
+            try:
+                with self._db() as db:
+                    db.execute(
+                        "INSERT OR REPLACE INTO embeddings (key, vector, stored_at) VALUES (?, ?, ?)",
+                        (key, vector.tobytes(), now),
+                    )
+            except sqlite3.Error:
+                return
+            with self._lock:
+                self._disk_writes += 1
+                due = self.prune_every and self._disk_writes % self.prune_every == 0
+            if due:
+                try:
+                    self.prune_disk()
+                except sqlite3.Error:
+                    pass
+
+    def _remember(self, key, vector, stored_at):
+        with self._lock:
+            self._memory[key] = (vector, stored_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    def get_or_compute(self, key, compute):
+        """Returns the cached vector or computes, stores and returns it."""
+        vector = self.get(key)
+        telemetry.annotate(cache_hit=vector is not None)
+        if vector is not None:
+            return vector
+        with telemetry.span("voyage.embed"):
+            vector = compute()
+        self.put(key, vector)
+        return vector
+
+    # ------------------------------------------
+    # Maintenance
+    # ------------------------------------------
+    def prune_disk(self):
+        """Drops expired rows and trims the SQLite store to disk_max_entries (oldest first)."""
+        if not self._disk_path:
+            return
+        with self._db() as db:
+            if self.ttl_seconds:
+                db.execute("DELETE FROM embeddings WHERE stored_at < ?", (time.time() - self.ttl_seconds,))
+            db.execute(
+                "DELETE FROM embeddings WHERE key IN ("
+                "SELECT key FROM embeddings ORDER BY stored_at DESC LIMIT -1 OFFSET ?)",
+                (self.disk_max_entries,),
+            )
+        with self._lock:
+            self._counters["prunes"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        if self._disk_path:
+            with self._db() as db:
+                db.execute("DELETE FROM embeddings")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,135 @@
+import json
+import os
+import threading
+import time
+import numpy as np
+import pandas as pd
+
+FEATURED_QUERIES = ["stylish footwear sneakers boots"]
+
+
+class FeaturedCollection:
+    """
+    Home-page gallery served from memory.
+    A candidate pool is precomputed in the background (vector searches for
+    `queries`, images and thumbnails pre-fetched) and snapshotted to disk, so a
+    restart serves the last pool without any external call. Every
+    `rotation_seconds` a different page of the pool is shown; pages are picked
+    deterministically per rotation slot and memoized.
+    """
+
+    def __init__(self, load_pool, prepare_images=None, snapshot_path=None, page_size=20,
+                 refresh_interval=3600, rotation_seconds=600):
+        self.load_pool = load_pool
+        self.prepare_images = prepare_images
+        self.snapshot_path = snapshot_path
+        self.page_size = page_size
+        self.refresh_interval = refresh_interval
+        self.rotation_seconds = rotation_seconds
+        self._pool = pd.DataFrame()
+        self._refreshed_at = None
+        self._pages = {}  # rotation slot -> DataFrame
+        self._lock = threading.Lock()
+        self._refreshing = threading.Lock()
+        self._scheduler = None
+        self.counters = {"renders": 0, "refreshes": 0, "refresh_errors": 0}
+
+    # ------------------------------------------
+    # Pool maintenance (background only)
+    # ------------------------------------------
+    def load_snapshot(self):
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return False
+        try:
+            with open(self.snapshot_path, encoding="utf-8") as f:
+                snapshot = json.load(f)
+            self._publish(pd.DataFrame(snapshot["products"]), snapshot["refreshed_at"])
+            return True
+        except (OSError, ValueError, KeyError):
+            return False
+
+    def _save_snapshot(self, pool, refreshed_at):
+        if not self.snapshot_path:
+            return
+        os.makedirs(os.path.dirname(self.snapshot_path) or ".", exist_ok=True)
+        tmp = self.snapshot_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"refreshed_at": refreshed_at, "products": pool.to_dict("records")}, f, default=str)
+        os.replace(tmp, self.snapshot_path)
+
+    def _publish(self, pool, refreshed_at):
+        with self._lock:
+            self._pool = pool.reset_index(drop=True)
+            self._refreshed_at = refreshed_at
+            self._pages = {}
+
+    def refresh(self):
+        """Rebuilds the candidate pool; the old one keeps serving until the swap."""
+        if not self._refreshing.acquire(blocking=False):
+            return False
+        try:
+            pool = self.load_pool()
+            if pool is None or pool.empty:
+                raise ValueError("empty featured pool")
+            pool = pool.drop_duplicates(subset="IMAGE_FILENAME")
+            if self.prepare_images:
+                # Thumbnails are generated here so renders only read local files
+                self.prepare_images(pool["IMAGE_FILENAME"].tolist())
+            refreshed_at = time.time()
+            self._save_snapshot(pool, refreshed_at)
+            self._publish(pool, refreshed_at)
+            self.counters["refreshes"] += 1
+            return True
+        except Exception:
+            self.counters["refresh_errors"] += 1
+            return False
+        finally:
+            self._refreshing.release()
+
+    def start(self):
+        """
+        Serves the snapshot right away; refreshes in the background when stale.
+        Never blocks the caller: on a cold start (no snapshot) the first pool is
+        built on the refresh thread and page() stays empty until it lands.
+        """
+        if self._scheduler is not None:
+            return
+        self.load_snapshot()
+
+        def _loop():
+            while True:
+                if self.staleness_seconds() >= self.refresh_interval:
+                    self.refresh()
+                time.sleep(min(self.refresh_interval, 60) if self._refreshed_at is None else self.refresh_interval)
+
+        self._scheduler = threading.Thread(target=_loop, name="featured-refresh", daemon=True)
+        self._scheduler.start()
+
+    def staleness_seconds(self):
+        return time.time() - self._refreshed_at if self._refreshed_at else float("inf")
+
+    # ------------------------------------------
+    # Rendering (pure in-memory)
+    # ------------------------------------------
+    def page(self, now=None):
+        """The products to show for the current rotation slot (empty until the first pool exists)."""
+        slot = int((now or time.time()) // self.rotation_seconds)
+        with self._lock:
+            self.counters["renders"] += 1
+            cached = self._pages.get(slot)
+            if cached is not None:
+                return cached
+            pool = self._pool
+            if pool.empty:
+                return pool
+            rng = np.random.default_rng(slot)
+            picked = pool.iloc[rng.choice(len(pool), size=min(self.page_size, len(pool)), replace=False)]
+            self._pages = {slot: picked.reset_index(drop=True)}
+            return self._pages[slot]
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats["pool_size"] = len(self._pool)
+        stats["staleness_seconds"] = self.staleness_seconds()
+        return stats
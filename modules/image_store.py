@@ -0,0 +1,321 @@
+import gzip
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from modules import telemetry
+
+# Pre-resized variants: name -> longest side in pixels
+VARIANTS = {"grid": 320, "popup": 1024}
+VARIANT_FORMAT = "WEBP"
+VARIANT_QUALITY = 80
+
+
+class ImageStore:
+    """
+    Size-bounded, on-disk LRU cache for product images pulled from a Snowflake stage.
+    One store is shared by every session in the process and survives restarts;
+    callers get file paths back, never copies of the bytes.
+    """
+
+    def __init__(self, directory, max_bytes=512 * 1024 * 1024, negative_ttl=600):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # local path -> size, least recently used first
+        self._missing = {}  # stage filename -> time it was found missing
+        self._total = 0
+        self._counters = {"hits": 0, "misses": 0, "downloads": 0, "evictions": 0}
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                if name.endswith(".part"):
+                    os.remove(path)
+                    continue
+                stat = os.stat(path)
+                files.append((stat.st_mtime, path, stat.st_size))
+        for _, path, size in sorted(files):
+            self._entries[path] = size
+            self._total += size
+
+    def local_path(self, filename):
+        """Deterministic location of a stage file inside the cache directory."""
+        digest = hashlib.sha1(filename.encode("utf-8")).hexdigest()
+        ext = os.path.splitext(filename)[1].lower()
+        if ext == ".gz":
+            ext = os.path.splitext(filename[:-3])[1].lower()
+        return os.path.join(self.directory, digest[:2], digest + ext)
+
+    def variant_path(self, filename, variant):
+        base = os.path.splitext(self.local_path(filename))[0]
+        return f"{base}.{variant}.{VARIANT_FORMAT.lower()}"
+
+    # ------------------------------------------
+    # Lookup
+    # ------------------------------------------
+    def get(self, filename):
+        """Returns the cached file path, or None if the image isn't cached."""
+        if not filename:
+            return None
+        path = self.local_path(filename)
+        with self._lock:
+            if path in self._entries:
+                self._entries.move_to_end(path)
+                self._counters["hits"] += 1
+                hit = True
+            else:
+                hit = False
+        if hit:
+            try:
+                os.utime(path)  # persist recency for the next restart's scan
+            except OSError:
+                with self._lock:
+                    self._forget(path)
+                return None
+            return path
+        return None
+
+    def get_variant(self, filename, variant):
+        """
+        Path of a pre-resized variant, generating it from the cached original
+        if needed. Falls back to the original when resizing isn't possible.
+        """
+        if not filename or variant not in VARIANTS:
+            return self.get(filename)
+        path = self.variant_path(filename, variant)
+        with self._lock:
+            cached = path in self._entries
+            if cached:
+                self._entries.move_to_end(path)
+        if cached and os.path.exists(path):
+            return path
+        original = self.get(filename)
+        if original is None:
+            return None
+        return self._make_variant(original, path, VARIANTS[variant]) or original
+
+    def is_known_missing(self, filename):
+        with self._lock:
+            seen = self._missing.get(filename)
+            if seen is None:
+                return False
+            if time.time() - seen > self.negative_ttl:
+                del self._missing[filename]
+                return False
+            return True
+
+    def missing(self, filenames):
+        """Filenames that are neither cached nor recently confirmed absent from the stage."""
+        out = []
+        for filename in dict.fromkeys(f for f in filenames if f):
+            if self.get(filename) is None and not self.is_known_missing(filename):
+                out.append(filename)
+        with self._lock:
+            self._counters["misses"] += len(out)
+        return out
+
+    # ------------------------------------------
+    # Insertion & eviction
+    # ------------------------------------------
+    def put_file(self, filename, source_path):
+        """
+        Moves a downloaded file into the cache, gunzipping `.gz` payloads on the way.
+        Writes go to a .part file first so readers never see a partial image.
+        """
+        target = self.local_path(filename)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        part = _part_path(target)
+        try:
+            if source_path.endswith(".gz"):
+                with gzip.open(source_path, "rb") as src, open(part, "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+            else:
+                shutil.move(source_path, part)
+            os.replace(part, target)
+        except Exception:
+            self._remove([part])
+            raise
+        size = os.path.getsize(target)
+        with self._lock:
+            self._forget(target)
+            self._entries[target] = size
+            self._total += size
+            self._missing.pop(filename, None)
+            self._counters["downloads"] += 1
+            victims = self._select_victims()
+        self._remove(victims)
+        # Generate grid/popup variants on first fetch, while the file is hot
+        for variant, size in VARIANTS.items():
+            self._make_variant(target, self.variant_path(filename, variant), size)
+        return target
+
+    def _make_variant(self, original, path, max_side):
+        part = None
+        try:
+            from PIL import Image, ImageOps
+            with Image.open(original) as img:
+                img = ImageOps.exif_transpose(img)
+                img.thumbnail((max_side, max_side))
+                if img.mode not in ("RGB", "RGBA"):
+                    img = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+                part = _part_path(path)
+                img.save(part, format=VARIANT_FORMAT, quality=VARIANT_QUALITY, method=4)
+            os.replace(part, path)
+        except Exception:
+            if part:
+                self._remove([part])
+            return None
+        size = os.path.getsize(path)
+        with self._lock:
+            self._forget(path)
+            self._entries[path] = size
+            self._total += size
+            victims = self._select_victims()
+        self._remove(victims)
+        return path
+
+    def _remove(self, paths):
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def mark_missing(self, filename):
+        with self._lock:
+            self._missing[filename] = time.time()
+
+    def _forget(self, path):
+        size = self._entries.pop(path, None)
+        if size is not None:
+            self._total -= size
+
+    def _select_victims(self):
+        victims = []
+        while self._total > self.max_bytes and len(self._entries) > 1:
+            path, size = self._entries.popitem(last=False)
+            self._total -= size
+            self._counters["evictions"] += 1
+            victims.append(path)
+        return victims
+
+    # ------------------------------------------
+    # Fetching from the stage
+    # ------------------------------------------
+    def fetch(self, filenames, connection_factory, stage_path, chunk_size=10, max_workers=4):
+        """
+        Downloads every missing file. Files are grouped into multi-file
+        `GET ... PATTERN=` statements and the groups run concurrently, each on
+        its own connection from `connection_factory` (a context manager).
+        Returns {filename: local path or None}.
+        """
+        todo = self.missing(filenames)
+        telemetry.annotate(requested=len(filenames), downloaded=len(todo), get_statements=-(-len(todo) // chunk_size))
+        chunks = [todo[i:i + chunk_size] for i in range(0, len(todo), chunk_size)]
+        if len(chunks) == 1:
+            self._fetch_chunk(chunks[0], connection_factory, stage_path)
+        elif chunks:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as pool:
+                list(pool.map(lambda c: self._fetch_chunk(c, connection_factory, stage_path), chunks))
+        return {f: self.get(f) for f in filenames if f}
+
+    def _fetch_chunk(self, filenames, connection_factory, stage_path):
+        try:
+            with tempfile.TemporaryDirectory() as tmpdirname:
+                safe_tmp_path = tmpdirname.replace(os.sep, '/')
+                with connection_factory() as conn:
+                    conn.cursor().execute(
+                        f"GET {stage_path} file://{safe_tmp_path} PATTERN = '{stage_pattern(filenames)}'"
+                    )
+                downloaded = {}
+                for root, _, names in os.walk(tmpdirname):
+                    for name in names:
+                        downloaded[name] = os.path.join(root, name)
+                for filename in filenames:
+                    base = os.path.basename(filename)
+                    path = downloaded.get(base) or downloaded.get(base + ".gz")
+                    if path:
+                        self.put_file(filename, path)
+                    else:
+                        self.mark_missing(filename)
+        except Exception:
+            # Leave them un-cached (not negative-cached) so a later render retries
+            pass
+
+    def pregenerate(self, connection_factory, stage_path, chunk_size=50, max_workers=4, progress=None):
+        """
+        Pulls every image on the stage into the cache (building its variants) so
+        first page loads don't pay for downloads or resizing. Returns the file count.
+        """
+        with connection_factory() as conn:
+            rows = conn.cursor().execute(f"LIST {stage_path}").fetchall()
+        stage_name = stage_path.lstrip("@").split(".")[-1].split("/")[0].lower()
+        filenames = []
+        for row in rows:
+            # LIST returns "<stage_name>/<relative path>"
+            name = row[0].split("/", 1)[1] if row[0].lower().startswith(stage_name + "/") else row[0]
+            if name.endswith(".gz"):
+                name = name[:-3]
+            if not name.startswith("temp_vision/"):
+                filenames.append(name)
+        for i in range(0, len(filenames), chunk_size * max_workers):
+            batch = filenames[i:i + chunk_size * max_workers]
+            self.fetch(batch, connection_factory, stage_path, chunk_size=chunk_size, max_workers=max_workers)
+            for filename in batch:
+                for variant in VARIANTS:
+                    self.get_variant(filename, variant)
+            if progress:
+                progress(min(i + len(batch), len(filenames)), len(filenames))
+        return len(filenames)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats["files"] = len(self._entries)
+            stats["bytes"] = self._total
+        return stats
+
+
+def _part_path(path):
+    """
+    A fresh `<name>.<random>.part` next to `path`. Each writer gets its own, so two
+    fetches of the same file never write into (or publish) each other's half-written temp file.
+    """
+    fd, part = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path) + ".", suffix=".part")
+    os.close(fd)
+    return part
+
+
+def stage_pattern(filenames):
+    """
+    Anchored regex matching exactly these stage paths (optionally gzipped),
+    escaped for use inside a single-quoted SQL literal.
+    """
+    alternatives = "|".join(re.sub(r"([.^$*+?()\[\]{}|\\])", r"\\\1", f) for f in filenames)
+    pattern = f"(.*/)?({alternatives})(\\.gz)?"
+    return pattern.replace("\\", "\\\\").replace("'", "\\'")
+
+
+if __name__ == "__main__":
+    # Bulk warm-up: python -m modules.image_store [STAGE] [CACHE_DIR]
+    import sys
+    import streamlit as st
+    from modules.database import db_connection
+
+    cfg = st.secrets.get("images", {})
+    stage = sys.argv[1] if len(sys.argv) > 1 else "@RETAIL_GENAI_DB.PUBLIC.PRODUCT_IMAGES_STAGE"
+    cache_dir = sys.argv[2] if len(sys.argv) > 2 else cfg.get("cache_dir", os.path.join(".cache", "images"))
+    store = ImageStore(cache_dir, max_bytes=int(cfg.get("max_mb", 512)) * 1024 * 1024)
+    total = store.pregenerate(db_connection, stage, progress=lambda done, n: print(f"{done}/{n} images cached"))
+    print(f"Done: {total} images, {store.stats()['bytes'] / 1e6:.1f} MB on disk.")
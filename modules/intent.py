@@ -0,0 +1,263 @@
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from modules.embedding_cache import normalize_text
+from modules.json_stream import parse_json_object
+from modules import telemetry
+
+DEFAULT_ROUTE = {"is_footwear": True, "intent": "CHAT"}
+
+# Fast rules (unchanged from the original router)
+GREETINGS = ['hi', 'hello', 'hey', 'p', 'halo', 'test', 'pagi', 'siang', 'malam']
+KEYWORDS_CHAT = ["model", "who are you", "what are you", "siapa kamu", "ai", "gemini", "gpt", "architecture", "llm"]
+
+# Labeled prototypes for the local classifier. Keep them short and varied;
+# their embeddings are averaged into one centroid per intent.
+INTENT_PROTOTYPES = {
+    "SEARCH": [
+        "show me white sneakers",
+        "running shoes under $100",
+        "I want to buy leather boots",
+        "recommend comfortable shoes for walking all day",
+        "find me something like this",
+        "do you have black heels for a wedding",
+        "looking for waterproof hiking boots",
+        "cari sepatu lari yang ringan",
+        "suggest sandals for the beach",
+        "need basketball shoes with good ankle support",
+        "any cheap slip-on shoes",
+        "Nike trainers in size 42",
+    ],
+    "CHAT": [
+        "thanks, that's helpful",
+        "how are you today",
+        "what can you do",
+        "how should I clean suede shoes",
+        "what's the difference between trail and road running shoes",
+        "tell me a joke",
+        "good morning",
+        "how do I know my shoe size",
+        "why are leather boots so expensive",
+        "okay bye",
+        "terima kasih",
+        "what's the weather like",
+    ],
+}
+
+FOOTWEAR_TERMS = ["footwear", "shoe", "sneaker", "boot", "sandal", "heel", "loafer", "slipper", "trainer", "flip-flop", "clog", "mule", "oxford"]
+NOT_FOOTWEAR_TERMS = ["not footwear", "not a shoe", "not shoes", "no, this is", "no, it is", "no, it's", "isn't footwear", "is not footwear"]
+
+ROUTER_PROMPT = """
+    You are a Smart Router.
+    INPUTS: User Text: "{user_text}", Image Desc: "{image_desc}"
+
+    RULES:
+    1. IS_FOOTWEAR: False if image describes car/animal/food. True if shoes or No image.
+    2. INTENT:
+       - SEARCH: User explicitly asks to FIND, BUY, SHOW, RECOMMEND products.
+       - CHAT: Greetings, General talk, Questions about the AI ("what model", "who made you"), Questions NOT about buying.
+       - If is_footwear=False -> CHAT.
+
+    OUTPUT JSON ONLY: {{"is_footwear": true/false, "intent": "SEARCH" or "CHAT"}}
+    """
+
+
+def rule_route(user_text):
+    """Greeting / meta-question shortcuts. Returns a route or None."""
+    text_lower = user_text.lower().strip()
+    if len(user_text.split()) < 3 and text_lower in GREETINGS:
+        return dict(DEFAULT_ROUTE)
+    # Keywords teknis -> Chat
+    if any(k in text_lower for k in KEYWORDS_CHAT):
+        return dict(DEFAULT_ROUTE)
+    return None
+
+
+def classify_footwear(image_desc):
+    """
+    Reads the vision description: True / False when it is unambiguous,
+    None when the LLM should decide.
+    """
+    if not image_desc or "No image" in image_desc:
+        return True
+    desc = image_desc.lower()
+    if desc.startswith("error_vision"):
+        return None
+    if any(t in desc for t in NOT_FOOTWEAR_TERMS):
+        return False
+    if any(t in desc for t in FOOTWEAR_TERMS):
+        return True
+    return None
+
+
+def llm_route(user_text, image_desc, llm):
+    """The original LLM router: one Cortex call returning is_footwear + intent."""
+    from langchain_core.prompts import ChatPromptTemplate
+    from langchain_core.output_parsers import StrOutputParser
+
+    try:
+        prompt = ChatPromptTemplate.from_template(ROUTER_PROMPT)
+        chain = prompt | llm | StrOutputParser()
+        raw_response = chain.invoke({"user_text": user_text, "image_desc": image_desc})
+        parsed = parse_json_object(raw_response)
+        return parsed if parsed else dict(DEFAULT_ROUTE)
+    except Exception:
+        return dict(DEFAULT_ROUTE)
+
+
+class PrototypeIntentClassifier:
+    """
+    Nearest-centroid intent classifier over query embeddings.
+    Confidence is the cosine margin between the best and second-best intent.
+    """
+
+    def __init__(self, embed_many, prototypes=None, threshold=0.05):
+        self.embed_many = embed_many
+        self.prototypes = prototypes or INTENT_PROTOTYPES
+        self.threshold = threshold
+        self.labels = list(self.prototypes)
+        self._centroids = None
+        self._lock = threading.Lock()
+
+    def centroids(self):
+        with self._lock:
+            if self._centroids is None:
+                rows = []
+                for label in self.labels:
+                    vectors = np.asarray(self.embed_many(self.prototypes[label]), dtype=np.float32)
+                    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+                    centroid = vectors.mean(axis=0)
+                    rows.append(centroid / np.linalg.norm(centroid))
+                self._centroids = np.vstack(rows)
+        return self._centroids
+
+    def predict(self, vector):
+        """Returns (intent, confidence)."""
+        q = np.asarray(vector, dtype=np.float32)
+        q = q / (np.linalg.norm(q) or 1.0)
+        sims = self.centroids() @ q
+        order = np.argsort(-sims)
+        margin = float(sims[order[0]] - sims[order[1]]) if len(order) > 1 else 1.0
+        return self.labels[order[0]], margin
+
+
+class SmartRouter:
+    """
+    Tiered router: rules -> memo of recent decisions -> local classifier ->
+    LLM fallback (only when the local tier is not confident).
+    """
+
+    def __init__(self, embed_one, classifier, llm_factory, memo_size=1024, memo_ttl=3600):
+        self.embed_one = embed_one
+        self.classifier = classifier
+        self.llm_factory = llm_factory
+        self.memo_size = memo_size
+        self.memo_ttl = memo_ttl
+        self._memo = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {"rule": 0, "memo": 0, "local": 0, "llm": 0}
+
+    def _count(self, tier):
+        with self._lock:
+            self.counters[tier] += 1
+        telemetry.annotate(route_tier=tier)
+
+    def _memo_get(self, key):
+        with self._lock:
+            entry = self._memo.get(key)
+            if entry and time.time() - entry[1] < self.memo_ttl:
+                self._memo.move_to_end(key)
+                return dict(entry[0])
+            self._memo.pop(key, None)
+        return None
+
+    def _memo_put(self, key, route):
+        with self._lock:
+            self._memo[key] = (dict(route), time.time())
+            self._memo.move_to_end(key)
+            while len(self._memo) > self.memo_size:
+                self._memo.popitem(last=False)
+
+    def local_route(self, user_text, image_desc):
+        """Returns a route if the local tier is confident, else None."""
+        is_footwear = classify_footwear(image_desc)
+        if is_footwear is None:
+            return None
+        if is_footwear is False:
+            return {"is_footwear": False, "intent": "CHAT"}
+        vector = self.embed_one(user_text)
+        if vector is None or len(vector) == 0:
+            return None
+        intent, confidence = self.classifier.predict(vector)
+        if confidence < self.classifier.threshold:
+            return None
+        return {"is_footwear": True, "intent": intent}
+
+    def route(self, user_text, image_desc):
+        route = rule_route(user_text)
+        if route:
+            self._count("rule")
+            return route
+
+        key = (normalize_text(user_text).lower(), normalize_text(image_desc))
+        route = self._memo_get(key)
+        if route:
+            self._count("memo")
+            return route
+
+        try:
+            route = self.local_route(user_text, image_desc)
+        except Exception:
+            route = None
+        if route:
+            self._count("local")
+        else:
+            self._count("llm")
+            route = llm_route(user_text, image_desc, self.llm_factory())
+        self._memo_put(key, route)
+        return route
+
+
+def evaluate_router(labeled, router, llm_factory):
+    """
+    Offline comparison of the tiered router and the pure LLM router.
+    `labeled` is a list of {"text", "intent", optional "image_desc"}.
+    Returns accuracy, mean/p95 latency per router and how often the LLM was skipped.
+    """
+    results = {"local": {"correct": 0, "latency": []}, "llm": {"correct": 0, "latency": []}}
+    llm_calls_before = router.counters["llm"]
+    for row in labeled:
+        image_desc = row.get("image_desc", "No image uploaded.")
+        expected = row["intent"]
+        for name, fn in (("local", router.route), ("llm", lambda t, d: llm_route(t, d, llm_factory()))):
+            start = time.perf_counter()
+            route = fn(row["text"], image_desc)
+            results[name]["latency"].append(time.perf_counter() - start)
+            results[name]["correct"] += route.get("intent") == expected
+    report = {}
+    for name, r in results.items():
+        latency = np.asarray(r["latency"]) if r["latency"] else np.zeros(1)
+        report[name] = {
+            "accuracy": r["correct"] / len(labeled) if labeled else 0.0,
+            "mean_latency_s": float(latency.mean()),
+            "p95_latency_s": float(np.percentile(latency, 95)),
+        }
+    llm_calls = router.counters["llm"] - llm_calls_before
+    report["local"]["llm_fallback_rate"] = llm_calls / len(labeled) if labeled else 0.0
+    return report
+
+
+if __name__ == "__main__":
+    # Offline evaluation: python -m modules.intent labeled_queries.jsonl
+    # Each line: {"text": "...", "intent": "SEARCH"|"CHAT", "image_desc": "..."(optional)}
+    import json
+    import sys
+    from modules.embedder import get_text_embedding, embed_batch
+    from modules.llm import get_llm_cortex
+
+    with open(sys.argv[1], encoding="utf-8") as f:
+        labeled = [json.loads(line) for line in f if line.strip()]
+    classifier = PrototypeIntentClassifier(lambda texts: list(embed_batch(texts, input_type="query")))
+    router = SmartRouter(get_text_embedding, classifier, get_llm_cortex)
+    print(json.dumps(evaluate_router(labeled, router, get_llm_cortex), indent=2))
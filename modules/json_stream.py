@@ -0,0 +1,144 @@
+import json
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class IncrementalJSONParser:
+    """
+    Streaming reader for the LLM's JSON answer.
+    Feed it chunks as they arrive; it tracks the first top-level object and
+    decodes its string fields character by character, so `response_text` can be
+    shown while the model is still writing. Anything before the first `{`
+    (prose, ```json fences) is ignored.
+    """
+
+    def __init__(self):
+        self.buffer = []
+        self.fields = {}  # top-level string fields decoded so far
+        self.done = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = None  # None, "" (after backslash) or partial \\uXXXX digits
+        self._string = []
+        self._key = None
+        self._expect_key = False
+        self._capture = None  # field name whose string value is being decoded
+        self._high_surrogate = None
+        self._start = None
+
+    def feed(self, chunk):
+        """
+        Consumes a chunk of model output.
+        Returns {field: newly decoded text} for top-level string fields.
+        """
+        deltas = {}
+        for ch in chunk:
+            self.buffer.append(ch)
+            if self.done:
+                continue
+            if self._depth == 0:
+                if ch == "{":
+                    self._start = len(self.buffer) - 1
+                    self._depth = 1
+                    self._expect_key = True
+                continue
+            if self._in_string:
+                decoded = self._string_char(ch)
+                if decoded and self._capture:
+                    self.fields[self._capture] = self.fields.get(self._capture, "") + decoded
+                    deltas[self._capture] = deltas.get(self._capture, "") + decoded
+                continue
+            if ch == '"':
+                self._in_string = True
+                self._string = []
+                if self._depth == 1 and not self._expect_key and self._key is not None:
+                    self._capture = self._key
+                    self.fields.setdefault(self._capture, "")
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self.done = True
+            elif ch == "," and self._depth == 1:
+                self._expect_key = True
+                self._key = None
+            elif ch == ":" and self._depth == 1:
+                self._expect_key = False
+        return deltas
+
+    def _string_char(self, ch):
+        # Returns the decoded text for this character ("" while mid-escape)
+        if self._escape is not None:
+            if self._escape == "" and ch != "u":
+                self._escape = None
+                return self._emit(_ESCAPES.get(ch, ch))
+            self._escape += ch
+            if len(self._escape) < 5:  # "u" + 4 hex digits
+                return ""
+            code = self._escape[1:]
+            self._escape = None
+            try:
+                point = int(code, 16)
+            except ValueError:
+                return ""
+            if 0xD800 <= point <= 0xDBFF:
+                # First half of a surrogate pair (e.g. emoji); wait for the second
+                self._high_surrogate = point
+                return ""
+            if 0xDC00 <= point <= 0xDFFF and self._high_surrogate is not None:
+                point = 0x10000 + ((self._high_surrogate - 0xD800) << 10) + (point - 0xDC00)
+            self._high_surrogate = None
+            return self._emit(chr(point))
+        if ch == "\\":
+            self._escape = ""
+            return ""
+        if ch == '"':
+            self._in_string = False
+            text = "".join(self._string)
+            if self._depth == 1 and self._expect_key:
+                self._key = text
+            self._capture = None
+            return ""
+        return self._emit(ch)
+
+    def _emit(self, text):
+        self._string.append(text)
+        return text
+
+    @property
+    def text(self):
+        return "".join(self.buffer)
+
+    def result(self):
+        """Parses the complete object once streaming is over (None if there is none)."""
+        if self.done and self._start is not None:
+            try:
+                return json.JSONDecoder().raw_decode(self.text, self._start)[0]
+            except json.JSONDecodeError:
+                pass
+        return parse_json_object(self.text)
+
+
+def parse_json_object(text):
+    """
+    Returns the first JSON object that can be decoded from `text`, tolerating
+    surrounding prose and markdown fences. None if there is no valid object.
+    """
+    try:
+        parsed = json.loads(text)
+        if isinstance(parsed, dict):
+            return parsed
+    except (json.JSONDecodeError, TypeError):
+        pass
+    decoder = json.JSONDecoder()
+    pos = text.find("{") if isinstance(text, str) else -1
+    while pos != -1:
+        try:
+            parsed, _ = decoder.raw_decode(text, pos)
+            if isinstance(parsed, dict):
+                return parsed
+        except json.JSONDecodeError:
+            pass
+        pos = text.find("{", pos + 1)
+    return None
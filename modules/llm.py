@@ -1,22 +1,71 @@
 import streamlit as st
-from langchain_community.chat_models import ChatSnowflakeCortex
-from modules.database import get_db_connection
-
-def get_llm_cortex():
-    
-    creds = st.secrets["snowflake"]
-
-    chat = ChatSnowflakeCortex(
-        model="claude-3-5-sonnet",
-        cortex_function="complete",
-        temperature=0.7,
-        snowflake_account=creds["account"],
-        snowflake_username=creds["user"],
-        snowflake_password=creds["password"],
-        snowflake_database=creds["database"],
-        snowflake_schema=creds["schema"],
-        snowflake_warehouse=creds["warehouse"],
-        snowflake_role=creds["role"]
+from typing import Any
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from modules.cortex import CortexClient
+from modules import database
+
+ROLES = {"system": "system", "human": "user", "ai": "assistant"}
+
+
+class CortexChat(BaseChatModel):
+    """
+    LangChain chat model on top of the shared CortexClient, so prompt | llm
+    chains (router, answer generation, summaries) go through its queue,
+    single-flight and retries instead of a blocking Snowpark session.
+    """
+
+    client: Any
+    model: str = "claude-3-5-sonnet"
+    temperature: float = 0.7
+    max_tokens: int = 2048
+    stream_chunk_chars: int = 50
+
+    @property
+    def _llm_type(self):
+        return "snowflake-cortex-async"
+
+    def _call(self, messages, stop=None):
+        payload = [{"role": ROLES.get(m.type, "user"), "content": str(m.content)} for m in messages]
+        text, usage = self.client.complete(
+            self.model, payload, {"temperature": self.temperature, "max_tokens": self.max_tokens})
+        for token in stop or []:
+            text = text.split(token)[0]
+        return text, usage
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        text, usage = self._call(messages, stop)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text, response_metadata=usage))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        # COMPLETE over SQL returns the whole answer at once: this only re-chunks it so the UI can
+        # render progressively. It is not token streaming (the first chunk arrives with the last).
+        text, _ = self._call(messages, stop)
+        for i in range(0, len(text), self.stream_chunk_chars):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=text[i:i + self.stream_chunk_chars]))
+
+
+@st.cache_resource
+def get_cortex_client():
+    """
+    Process-wide Cortex client (router, vision and answer generation).
+    Tune with an optional [cortex] section in secrets.toml.
+    """
+    cfg = st.secrets.get("cortex", {})
+    return CortexClient(
+        database.db_connection,
+        max_concurrency=int(cfg.get("max_concurrency", 4)),
+        timeout=float(cfg.get("timeout", 60)),
+        retries=int(cfg.get("retries", 2)),
+        backoff=float(cfg.get("backoff", 0.5)),
+        poll_interval=float(cfg.get("poll_interval", 0.1)),
     )
-    
-    return chat
\ No newline at end of file
+
+@st.cache_resource
+def _build_llm_cortex(model, temperature):
+    return CortexChat(client=get_cortex_client(), model=model, temperature=temperature)
+
+def get_llm_cortex(model="claude-3-5-sonnet", temperature=0.7):
+
+    return _build_llm_cortex(model, temperature)
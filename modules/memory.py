@@ -0,0 +1,185 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+
+SUMMARY_PROMPT = """
+Summarize this shopping conversation between a user and SoleMate (a footwear assistant)
+in at most 120 words. Keep the user's stated preferences (budget, brand, size, style,
+use case) and which products were already recommended. Plain text only.
+
+PREVIOUS SUMMARY: {summary}
+
+NEW TURNS:
+{turns}
+"""
+
+
+def estimate_tokens(text):
+    # ~4 characters per token is close enough for budgeting English prompts
+    return max(1, len(text or "") // 4)
+
+
+def new_memory_state():
+    """Per-session memory bookkeeping, stored in st.session_state."""
+    return {"summary": "", "summarized_upto": 0, "pending": False}
+
+
+def select_window(messages, token_budget, max_messages=12):
+    """
+    Index of the first message kept verbatim: walk back from the newest turn
+    until the token budget or message cap is reached.
+    """
+    used = 0
+    start = len(messages)
+    for i in range(len(messages) - 1, -1, -1):
+        cost = estimate_tokens(messages[i].get("content"))
+        if len(messages) - i > max_messages or used + cost > token_budget:
+            break
+        used += cost
+        start = i
+    return start
+
+
+def build_chat_history(messages, state, token_budget=1500, max_messages=12):
+    """
+    LangChain history for the prompt: a rolling summary of older turns (if one
+    is ready) followed by the most recent turns that fit in `token_budget`.
+    """
+    from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+
+    start = select_window(messages, token_budget, max_messages)
+    history = []
+    if state.get("summary") and start > 0:
+        history.append(SystemMessage(content=f"Earlier in this conversation: {state['summary']}"))
+    for msg in messages[start:]:
+        if msg["role"] == "user":
+            history.append(HumanMessage(content=msg["content"]))
+        elif msg["role"] == "assistant":
+            history.append(AIMessage(content=msg["content"] or ""))
+    return history
+
+
+_summarizer_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="summarizer")
+
+
+def schedule_summary(messages, state, llm_factory, token_budget=1500, max_messages=12):
+    """
+    Folds turns that have slid out of the window into the rolling summary, on a
+    background thread so the user never waits for it. The next turn picks up
+    whatever summary is ready by then.
+    """
+    start = select_window(messages, token_budget, max_messages)
+    if start <= state["summarized_upto"] or state["pending"]:
+        return None
+    evicted = messages[state["summarized_upto"]:start]
+    state["pending"] = True
+
+    def _run():
+        from langchain_core.prompts import ChatPromptTemplate
+        from langchain_core.output_parsers import StrOutputParser
+
+        try:
+            turns = "\n".join(f"{m['role'].upper()}: {m.get('content') or ''}" for m in evicted)
+            chain = ChatPromptTemplate.from_template(SUMMARY_PROMPT) | llm_factory() | StrOutputParser()
+            state["summary"] = chain.invoke({"summary": state["summary"] or "(none)", "turns": turns}).strip()
+            state["summarized_upto"] = start
+        except Exception:
+            pass
+        finally:
+            state["pending"] = False
+
+    return _summarizer_pool.submit(_run)
+
+
+class ProductCache:
+    """
+    Process-wide product rows keyed by IMAGE_FILENAME, so chat messages can
+    store just the ids of their results and rehydrate the grid on render.
+    """
+
+    def __init__(self, capacity=20000, key_column="IMAGE_FILENAME"):
+        self.capacity = capacity
+        self.key_column = key_column
+        self._rows = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, df):
+        """Stores the rows and returns their ids, in order."""
+        if df is None or df.empty:
+            return []
+        records = df.to_dict("records")
+        with self._lock:
+            for record in records:
+                key = record[self.key_column]
+                self._rows[key] = record
+                self._rows.move_to_end(key)
+            while len(self._rows) > self.capacity:
+                self._rows.popitem(last=False)
+        return [r[self.key_column] for r in records]
+
+    def frame(self, ids, loader=None):
+        """
+        DataFrame for `ids` in the given order. Ids that were evicted are
+        reloaded with `loader(missing_ids) -> DataFrame` when provided.
+        """
+        with self._lock:
+            missing = [i for i in ids if i not in self._rows]
+        if missing and loader is not None:
+            self.put(loader(missing))
+        with self._lock:
+            rows = [self._rows[i] for i in ids if i in self._rows]
+        return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    # Benchmark: prompt tokens and latency vs. turn count, full transcript
+    # replay vs. budgeted window + summary.
+    #   python -m modules.memory [TURNS] [--live]
+    # --live also times a real Cortex call with each history (needs secrets).
+    import sys
+
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    turns = int(args[0]) if args else 60
+    live = "--live" in sys.argv
+    if live:
+        from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+        from langchain_core.output_parsers import StrOutputParser
+        from modules.llm import get_llm_cortex
+
+        chain = ChatPromptTemplate.from_messages([
+            ("system", "You are SoleMate. Answer in one short sentence."),
+            MessagesPlaceholder(variable_name="chat_history"),
+            ("human", "{input}"),
+        ]) | get_llm_cortex() | StrOutputParser()
+
+    def _full_history(msgs):
+        from langchain_core.messages import HumanMessage, AIMessage
+        return [HumanMessage(content=m["content"]) if m["role"] == "user" else AIMessage(content=m["content"]) for m in msgs]
+
+    def _timed_call(history):
+        start = time.perf_counter()
+        chain.invoke({"input": "Any other suggestions?", "chat_history": history})
+        return (time.perf_counter() - start) * 1000
+
+    reply = "Here are three options that match: " + "great cushioning and a breathable upper. " * 12
+    messages = [{"role": "assistant", "content": "Hi! I'm SoleMate."}]
+    state = new_memory_state()
+    state["summary"] = "User wants white running shoes under $100, size 42; Nike and Asics already shown."
+    header = f"{'turn':>5} {'full_tokens':>12} {'budget_tokens':>14} {'build_ms':>9}"
+    print(header + (f" {'full_ms':>9} {'budget_ms':>10}" if live else ""))
+    for turn in range(1, turns + 1):
+        messages.append({"role": "user", "content": f"Show me more running shoes, option {turn}"})
+        messages.append({"role": "assistant", "content": reply})
+        if not (turn in (1, 2, 5) or turn % 10 == 0):
+            continue
+        full = sum(estimate_tokens(m["content"]) for m in messages)
+        start = time.perf_counter()
+        history = build_chat_history(messages, state)
+        build_ms = (time.perf_counter() - start) * 1000
+        budget = sum(estimate_tokens(m.content) for m in history)
+        line = f"{turn:>5} {full:>12} {budget:>14} {build_ms:>9.2f}"
+        if live:
+            line += f" {_timed_call(_full_history(messages)):>9.0f} {_timed_call(history):>10.0f}"
+        print(line)
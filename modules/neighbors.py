@@ -0,0 +1,120 @@
+import json
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+from modules.vector_index import METADATA_COLUMNS, RESULT_COLUMNS, normalize_rows, top_k_indices
+
+NEIGHBORS_DIR = os.path.join(".cache", "neighbors")
+
+
+def nearest_neighbors(vectors, k=10, block_size=1024):
+    """
+    Top-k cosine neighbours of every row (itself excluded), best first.
+    Rows are scored in blocks of `block_size` against the whole matrix, so peak
+    memory is block_size x n scores instead of n x n.
+    Returns (indices int32, scores float32), both shaped (n, k).
+    """
+    vectors = normalize_rows(vectors)
+    n = len(vectors)
+    k = max(0, min(k, n - 1))
+    indices = np.zeros((n, k), dtype=np.int32)
+    scores = np.zeros((n, k), dtype=np.float32)
+    for start in range(0, n, block_size):
+        stop = min(start + block_size, n)
+        block = vectors[start:stop] @ vectors.T
+        block[np.arange(stop - start), np.arange(start, stop)] = -np.inf
+        idx = top_k_indices(block, k)
+        indices[start:stop] = idx
+        scores[start:stop] = np.take_along_axis(block, idx, axis=1)
+    return indices, scores
+
+
+class NeighborTable:
+    """
+    Precomputed "similar products" lookup.
+    Row i holds the k nearest products of product i (indices into the same
+    table plus float16 scores), and product ids (IMAGE_FILENAME) map to rows
+    through a dict, so a lookup is O(1) with no vector math at request time.
+    """
+
+    def __init__(self, metadata, neighbors, scores, info=None):
+        self.metadata = metadata.reset_index(drop=True)
+        self.neighbors = neighbors
+        self.scores = scores
+        self.info = info or {}
+        self._rows = {key: row for row, key in enumerate(self.metadata["IMAGE_FILENAME"])}
+
+    @classmethod
+    def build(cls, index, k=10, block_size=1024):
+        """Builds the table from a LocalVectorIndex (the vector matrix plus its metadata)."""
+        started = time.time()
+        neighbors, scores = nearest_neighbors(index.vectors, k=k, block_size=block_size)
+        info = {"k": neighbors.shape[1], "built_at": time.time(), "build_seconds": round(time.time() - started, 2),
+                "watermark": index.info.get("watermark")}
+        return cls(index.metadata.reindex(columns=METADATA_COLUMNS), neighbors, scores.astype(np.float16), info)
+
+    def __len__(self):
+        return len(self.metadata)
+
+    def similar(self, product_id, limit=5):
+        """Search-result shaped DataFrame of the products most similar to `product_id` (empty if unknown)."""
+        row = self._rows.get(product_id)
+        if row is None:
+            return pd.DataFrame(columns=RESULT_COLUMNS)
+        idx = np.asarray(self.neighbors[row, :limit])
+        df = self.metadata.iloc[idx].reset_index(drop=True)
+        df["SIMILARITY_SCORE"] = np.asarray(self.scores[row, :limit], dtype=float)
+        return df.reindex(columns=RESULT_COLUMNS)
+
+    # ------------------------------------------
+    # Persistence
+    # ------------------------------------------
+    def save(self, directory):
+        """Same layout as LocalVectorIndex.save: .npy arrays, metadata.pkl, manifest.json (temp + rename)."""
+        os.makedirs(directory, exist_ok=True)
+        for name, array in (("neighbors.npy", self.neighbors), ("scores.npy", self.scores)):
+            tmp = os.path.join(directory, name + ".tmp")
+            with open(tmp, "wb") as f:
+                np.save(f, array)
+            os.replace(tmp, os.path.join(directory, name))
+        tmp = os.path.join(directory, "metadata.pkl.tmp")
+        self.metadata.to_pickle(tmp)
+        os.replace(tmp, os.path.join(directory, "metadata.pkl"))
+        tmp = os.path.join(directory, "manifest.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump({"rows": len(self), "info": self.info}, f)
+        os.replace(tmp, os.path.join(directory, "manifest.json"))
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """Loads a table written by save(); returns None if there is none."""
+        if not os.path.exists(os.path.join(directory, "manifest.json")):
+            return None
+        mode = "r" if mmap else None
+        with open(os.path.join(directory, "manifest.json")) as f:
+            manifest = json.load(f)
+        return cls(
+            pd.read_pickle(os.path.join(directory, "metadata.pkl")),
+            np.load(os.path.join(directory, "neighbors.npy"), mmap_mode=mode),
+            np.load(os.path.join(directory, "scores.npy"), mmap_mode=mode),
+            manifest.get("info", {}),
+        )
+
+
+if __name__ == "__main__":
+    # Offline job: python -m modules.neighbors [K] [OUT_DIR]
+    # Uses the local vector index snapshot when present, otherwise reads PRODUCTS_FINAL from Snowflake.
+    from modules.database import INDEX_DIR, load_catalog_frame
+    from modules.vector_index import LocalVectorIndex
+
+    k = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    out_dir = sys.argv[2] if len(sys.argv) > 2 else NEIGHBORS_DIR
+    index = LocalVectorIndex.load(INDEX_DIR, mmap=False)
+    if index is None:
+        print("No local index snapshot, reading PRODUCTS_FINAL...")
+        index = LocalVectorIndex.from_frame(load_catalog_frame())
+    table = NeighborTable.build(index, k=k)
+    table.save(out_dir)
+    print(f"{len(table)} products x {table.info['k']} neighbours in {table.info['build_seconds']}s -> {out_dir}")
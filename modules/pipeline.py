@@ -0,0 +1,328 @@
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from modules.json_stream import IncrementalJSONParser, parse_json_object
+from modules.memory import estimate_tokens, build_chat_history, schedule_summary
+from modules.query_parser import parse_query
+from modules.response_cache import fingerprint, products_fingerprint
+from modules import telemetry
+
+try:
+    from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+except ImportError:  # running outside Streamlit (benchmarks, scripts)
+    add_script_run_ctx = get_script_run_ctx = None
+
+NO_IMAGE_DESC = "No image uploaded."
+DIRECT_RESPONSE_THOUGHT = "Direct response (non-JSON)."
+IMAGE_MARKER = "🖼️ [Image Attached]"
+
+ANSWER_SYSTEM_PROMPT = """
+    You are SoleMate, an expert footwear consultant.
+    
+    CONTEXT (one product per line: name | brand | price | features):
+    {context}
+    IMAGE_DESC: "{img_desc}"
+    INTENT: {intent}
+    IS_FOOTWEAR: {is_footwear}
+    
+    INSTRUCTIONS:
+    1. ALWAYS OUTPUT VALID JSON.
+    2. If IS_FOOTWEAR=False, politely explain you only deal with shoes.
+    3. If INTENT=CHAT, reply naturally and friendly. If asked about your model/identity, answer briefly as an AI assistant.
+    4. If INTENT=SEARCH:
+       - Select Top 3 products from CONTEXT.
+       - For EACH product, write detailed recommendation.
+    
+    OUTPUT JSON FORMAT: 
+    {{ "classification": "recommendation"|"chat", "thought": "Reasoning...", "response_text": "Markdown string...", "recommended_products": [] }}
+    """
+
+
+class StageTimer:
+    """
+    Collects wall-clock start/end offsets per pipeline stage (thread-safe).
+    Each wrapped stage is also a span of the current telemetry trace.
+    """
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def wrap(self, name, fn):
+        def _timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                with telemetry.span(name):
+                    return fn(*args, **kwargs)
+            finally:
+                end = time.perf_counter()
+                with self._lock:
+                    self.stages[name] = (start - self.origin, end - self.origin)
+        return _timed
+
+    def durations(self):
+        with self._lock:
+            out = {name: end - start for name, (start, end) in self.stages.items()}
+        out["total"] = time.perf_counter() - self.origin
+        return out
+
+
+def _make_executor(max_workers):
+    # Worker threads inherit the Streamlit script context so st.secrets,
+    # st.cache_* and st.error keep working inside stage functions.
+    ctx = get_script_run_ctx() if get_script_run_ctx else None
+    trace = telemetry.current_trace()
+
+    def _init():
+        if ctx is not None:
+            add_script_run_ctx(threading.current_thread(), ctx)
+        telemetry.activate(trace)
+
+    return ThreadPoolExecutor(max_workers=max_workers, initializer=_init, thread_name_prefix="turn")
+
+
+def run_turn(last_msg, uploaded_file, analyze_image, route, embed_text, embed_image, search,
+             search_limit=15, speculative=True, progress=None, embed_multimodal=None):
+    """
+    Runs the retrieval half of a chat turn (vision -> routing -> embed -> search)
+    with independent stages overlapped:
+
+    * the image embedding does not depend on the vision description, so
+      embedding + vector search start immediately, in parallel with vision;
+    * routing waits only for vision; the speculative search result is used if
+      the intent is SEARCH and discarded otherwise.
+
+    With `embed_multimodal`, image turns that also carry typed text embed both
+    together (one interleaved text+image query) instead of the image alone.
+
+    Stage callables are injected so the pipeline can run against fakes.
+    Returns a dict with image_desc, intent, is_footwear, products_df, query_vector
+    and timings.
+    """
+    progress = progress or (lambda msg: None)
+    timer = StageTimer()
+    has_image = bool(uploaded_file) and "🖼️" in last_msg
+    image_bytes = None
+    if uploaded_file:
+        # Vision and embedding run concurrently; give each its own file
+        # object instead of racing on the shared upload's read pointer.
+        uploaded_file.seek(0)
+        image_bytes = uploaded_file.read()
+
+    def _retrieve(image_desc):
+        typed_text = last_msg.replace(IMAGE_MARKER, "").strip()
+        if uploaded_file and embed_multimodal and typed_text:
+            vector = timer.wrap("embedding", embed_multimodal)(typed_text, io.BytesIO(image_bytes))
+        elif uploaded_file:
+            vector = timer.wrap("embedding", embed_image)(io.BytesIO(image_bytes))
+        else:
+            search_query = last_msg
+            if "No image" not in image_desc: search_query += f" ({image_desc})"
+            vector = timer.wrap("embedding", embed_text)(search_query)
+        if len(vector) == 0:
+            return vector, pd.DataFrame()
+        return vector, timer.wrap("vector_search", search)(vector, limit=search_limit)
+
+    pool = _make_executor(max_workers=2)
+    try:
+        vision_future = pool.submit(timer.wrap("vision", analyze_image), io.BytesIO(image_bytes)) if has_image else None
+        if vision_future: progress("👁️ Analyzing Image...")
+
+        # Retrieval never needs the vision output: image turns embed the image
+        # itself and text-only turns have no vision step.
+        retrieval_future = pool.submit(_retrieve, NO_IMAGE_DESC) if speculative else None
+
+        image_desc = NO_IMAGE_DESC
+        if vision_future:
+            image_desc = vision_future.result()
+            progress("✅ Image Analyzed.")
+
+        progress("🚦 Routing Intent...")
+        router_res = timer.wrap("routing", route)(last_msg, image_desc)
+        intent = router_res.get("intent", "CHAT")
+        is_footwear = router_res.get("is_footwear", True)
+        progress(f"   → Intent: {intent}")
+
+        products_df = pd.DataFrame()
+        query_vector = []
+        if not is_footwear or intent == "CHAT":
+            progress("💬 Conversational Mode (Skipping Search)")
+        elif intent == "SEARCH":
+            progress("🔍 Searching Database...")
+            query_vector, products_df = retrieval_future.result() if retrieval_future else _retrieve(image_desc)
+            if not products_df.empty:
+                progress(f"✅ Found {len(products_df)} items.")
+    finally:
+        # Don't block the turn on a discarded speculative search
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    return {
+        "image_desc": image_desc,
+        "intent": intent,
+        "is_footwear": is_footwear,
+        "products_df": products_df,
+        "query_vector": query_vector,
+        "timings": timer.durations(),
+    }
+
+
+def format_timings(timings):
+    """One-line summary like 'vision 1.20s · routing 0.80s · total 2.10s'."""
+    order = ["vision", "routing", "embedding", "vector_search", "generation", "total"]
+    parts = [f"{name} {timings[name]:.2f}s" for name in order if name in timings]
+    return " · ".join(parts)
+
+
+def build_answer_chain(llm):
+    """prompt | llm | str parser for the SoleMate answer (shared by the app and benchmarks)."""
+    from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+    from langchain_core.output_parsers import StrOutputParser
+
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", ANSWER_SYSTEM_PROMPT),
+        MessagesPlaceholder(variable_name="chat_history"), # Placeholder untuk history manual
+        ("human", "{input}")
+    ])
+    return prompt | llm | StrOutputParser()
+
+
+def generate_response(chain, inputs, on_text=None, timings=None, streaming=True):
+    """
+    Runs the generation chain. In streaming mode, `response_text` is decoded out
+    of the partial JSON chunk by chunk and passed (accumulated) to `on_text`.
+    Cortex COMPLETE over SQL returns the whole answer at once (CortexChat only
+    re-chunks it), so this renders progressively but does not shorten the wait
+    for the first words; no time-to-first-token is recorded for that reason.
+    Records generation time in `timings`. Returns (parsed_json_or_None, raw_text).
+    """
+    timings = timings if timings is not None else {}
+    prompt_tokens = sum(estimate_tokens(str(v)) for v in inputs.values())
+    with telemetry.span("generation", prompt_tokens=prompt_tokens, streaming=streaming) as span:
+        start = time.perf_counter()
+        if not streaming:
+            raw_response = chain.invoke(inputs)
+            timings["generation"] = time.perf_counter() - start
+            span.set(response_tokens=estimate_tokens(raw_response))
+            return parse_json_object(raw_response), raw_response
+
+        parser = IncrementalJSONParser()
+        shown = ""
+        for chunk in chain.stream(inputs):
+            delta = parser.feed(chunk).get("response_text")
+            if delta:
+                shown += delta
+                if on_text:
+                    on_text(shown)
+        timings["generation"] = time.perf_counter() - start
+        span.set(response_tokens=estimate_tokens(parser.text))
+        return parser.result(), parser.text
+
+
+def answer_turn(last_msg, uploaded_file, messages, memory, *, analyze_image, route, embed_text, embed_image,
+                search, chain, response_cache, build_context, known_brands=(), embed_multimodal=None,
+                search_limit=15, token_budget=1500, max_messages=12, streaming=True,
+                progress=None, on_products=None, on_generation=None, on_text=None):
+    """
+    A whole chat turn up to the final answer, shared by main.py and the benchmark:
+    query filters -> run_turn -> context -> history -> response cache -> generation.
+    `messages` is the session history ending with the user message being answered.
+
+    UI hooks (all optional): `progress(msg)` for status lines, `on_products(df)`
+    once retrieval returns rows, `on_generation()` right before the answer is
+    generated and `on_text(shown)` with the streamed response_text so far.
+
+    Returns the run_turn dict plus `answer` (classification / thought /
+    response_text, non-JSON output wrapped as a chat answer) and `cached`.
+    """
+    progress = progress or (lambda msg: None)
+    started = time.perf_counter()
+
+    # Brand / price / category hints in the text become search filters
+    filters = parse_query(last_msg.replace(IMAGE_MARKER, ""), known_brands)
+    turn = run_turn(
+        last_msg, uploaded_file,
+        analyze_image=analyze_image,
+        route=route,
+        embed_text=embed_text,
+        embed_image=embed_image,
+        embed_multimodal=embed_multimodal,
+        search=lambda vector, limit: search(vector, limit=limit, filters=filters),
+        search_limit=search_limit,
+        progress=progress,
+    )
+    timings = turn["timings"]
+    products_df = turn["products_df"]
+    intent, is_footwear = turn["intent"], turn["is_footwear"]
+
+    context_started = time.perf_counter()
+    context_str = "[]"
+    if not products_df.empty:
+        if on_products:
+            on_products(products_df)
+        with telemetry.span("context", rows=len(products_df)):
+            context_str = build_context(products_df)
+
+    progress("✍️ Drafting Response...")
+    # Recent turns within the token budget + rolling summary of older ones
+    # Skip pesan user terakhir (karena sudah masuk 'input')
+    history = build_chat_history(messages[:-1], memory, token_budget=token_budget, max_messages=max_messages)
+    timings["context"] = time.perf_counter() - context_started
+    if on_generation:
+        on_generation()
+
+    # Semantic cache: only SEARCH answers, which depend on the query and
+    # the retrieved products rather than on the conversation so far.
+    cache_keys = cached = None
+    if intent == "SEARCH" and is_footwear and not products_df.empty:
+        cache_keys = (
+            fingerprint(intent, is_footwear, "image" if uploaded_file else "text"),
+            products_fingerprint(products_df),
+        )
+        with telemetry.span("response_cache") as cache_span:
+            cached = response_cache.lookup(turn["query_vector"], *cache_keys)
+            cache_span.set(cache_hit=bool(cached))
+
+    if cached:
+        parsed_json, raw_response = cached, cached.get("response_text")
+        timings["generation"] = 0.0
+    else:
+        parsed_json, raw_response = generate_response(
+            chain,
+            {
+                "input": last_msg,
+                "chat_history": history,
+                "context": context_str,
+                "img_desc": turn["image_desc"],
+                "is_footwear": is_footwear,
+                "intent": intent,
+            },
+            on_text=on_text,
+            timings=timings,
+            streaming=streaming,
+        )
+        if cache_keys and parsed_json:
+            response_cache.store(turn["query_vector"], *cache_keys, parsed_json, timings["generation"])
+
+    # Fallback jika gagal parse JSON
+    turn["answer"] = parsed_json or {
+        "classification": "chat",
+        "thought": DIRECT_RESPONSE_THOUGHT,
+        "response_text": raw_response,
+    }
+    turn["cached"] = bool(cached)
+    timings["total"] = time.perf_counter() - started
+    return turn
+
+
+def record_answer(messages, memory, answer, llm_factory, product_ids=None, token_budget=1500, max_messages=12):
+    """Appends the assistant message and folds older turns into the rolling summary, off the critical path."""
+    messages.append({
+        "role": "assistant",
+        "content": answer.get("response_text"),
+        "thought": answer.get("thought"),
+        "product_ids": product_ids,
+    })
+    schedule_summary(messages, memory, llm_factory, token_budget=token_budget, max_messages=max_messages)
@@ -0,0 +1,223 @@
+import threading
+import time
+from contextlib import contextmanager
+from modules import telemetry
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no connection becomes available within the acquire timeout."""
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of Snowflake connections shared by the whole process.
+    Connections are created lazily up to max_size, health-checked before reuse,
+    and idle connections above min_size are evicted by a keep-alive thread.
+    """
+
+    def __init__(self, connect_fn, min_size=1, max_size=8, max_idle_seconds=300,
+                 health_check_interval=60, acquire_timeout=30, keepalive_interval=30):
+        self._connect_fn = connect_fn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_idle_seconds = max_idle_seconds
+        self.health_check_interval = health_check_interval
+        self.acquire_timeout = acquire_timeout
+        self.keepalive_interval = keepalive_interval
+
+        self._lock = threading.Condition()
+        self._idle = []  # list of (conn, last_used_ts), most recently used at the end
+        self._in_use = 0
+        self._closed = False
+        self._metrics = {
+            "checkouts": 0,
+            "creations": 0,
+            "evictions": 0,
+            "health_check_failures": 0,
+            "timeouts": 0,
+            "total_wait_seconds": 0.0,
+            "max_wait_seconds": 0.0,
+        }
+        self._keepalive_thread = None
+
+    # ------------------------------------------
+    # Checkout / checkin
+    # ------------------------------------------
+    def acquire(self, timeout=None):
+        timeout = self.acquire_timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+        with self._lock:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Connection pool is closed.")
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    self._in_use += 1
+                    break
+                if self._in_use < self.max_size:
+                    conn, last_used = None, None
+                    self._in_use += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._metrics["timeouts"] += 1
+                    raise PoolTimeoutError(f"No Snowflake connection available after {timeout}s.")
+                self._lock.wait(remaining)
+
+        # Network work (connect / ping) happens outside the lock
+        try:
+            if conn is not None and not self._is_healthy(conn, last_used):
+                with self._lock:
+                    self._metrics["health_check_failures"] += 1
+                self._safe_close(conn)
+                conn = None
+            if conn is None:
+                conn = self._connect_fn()
+                with self._lock:
+                    self._metrics["creations"] += 1
+        except Exception:
+            with self._lock:
+                self._in_use -= 1
+                self._lock.notify()
+            raise
+
+        waited = time.monotonic() - start
+        with self._lock:
+            self._metrics["checkouts"] += 1
+            self._metrics["total_wait_seconds"] += waited
+            self._metrics["max_wait_seconds"] = max(self._metrics["max_wait_seconds"], waited)
+        return conn
+
+    def release(self, conn, discard=False):
+        with self._lock:
+            self._in_use -= 1
+            if discard or self._closed or conn.is_closed():
+                self._lock.notify()
+            else:
+                self._idle.append((conn, time.monotonic()))
+                self._lock.notify()
+                return
+        self._safe_close(conn)
+
+    @contextmanager
+    def connection(self):
+        """
+        Checks out a connection for the duration of the block.
+        Connections that raise inside the block are discarded, not returned.
+        """
+        with telemetry.span("db.acquire") as span:
+            conn = self.acquire()
+            span.set(in_use=self._in_use)
+        try:
+            yield conn
+        except Exception:
+            self.release(conn, discard=True)
+            raise
+        else:
+            self.release(conn)
+
+    # ------------------------------------------
+    # Health & maintenance
+    # ------------------------------------------
+    def _is_healthy(self, conn, last_used):
+        if conn.is_closed():
+            return False
+        if time.monotonic() - last_used < self.health_check_interval:
+            return True
+        try:
+            conn.cursor().execute("SELECT 1").fetchone()
+            return True
+        except Exception:
+            return False
+
+    def _safe_close(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def evict_idle(self):
+        """Closes idle connections older than max_idle_seconds, keeping min_size warm."""
+        now = time.monotonic()
+        expired = []
+        with self._lock:
+            keep = []
+            # Newest first, so the freshest connections are the ones kept for min_size
+            for conn, last_used in reversed(self._idle):
+                total = len(keep) + self._in_use
+                if now - last_used > self.max_idle_seconds and total >= self.min_size:
+                    expired.append(conn)
+                else:
+                    keep.append((conn, last_used))
+            self._idle = keep[::-1]
+            self._metrics["evictions"] += len(expired)
+        for conn in expired:
+            self._safe_close(conn)
+
+    def keepalive(self):
+        """Pings idle connections due for a health check so sessions don't time out server-side."""
+        with self._lock:
+            due = [item for item in self._idle if time.monotonic() - item[1] >= self.health_check_interval]
+            for item in due:
+                self._idle.remove(item)
+            self._in_use += len(due)
+        for conn, last_used in due:
+            if self._is_healthy(conn, last_used):
+                self.release(conn)
+            else:
+                with self._lock:
+                    self._metrics["health_check_failures"] += 1
+                self.release(conn, discard=True)
+
+    def warm_up(self):
+        """Opens connections until the pool holds min_size, then returns them all as idle."""
+        with self._lock:
+            if len(self._idle) + self._in_use >= self.min_size:
+                return
+            wanted = self.min_size - self._in_use
+        # acquire() hands out idle connections first, so check out all `wanted` before releasing any
+        conns = []
+        try:
+            for _ in range(wanted):
+                conns.append(self.acquire())
+        finally:
+            for conn in conns:
+                self.release(conn)
+
+    def start_keepalive(self):
+        if self._keepalive_thread is not None:
+            return
+
+        def _loop():
+            while not self._closed:
+                time.sleep(self.keepalive_interval)
+                try:
+                    self.evict_idle()
+                    self.keepalive()
+                except Exception:
+                    pass
+
+        self._keepalive_thread = threading.Thread(target=_loop, name="snowflake-pool-keepalive", daemon=True)
+        self._keepalive_thread.start()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._lock.notify_all()
+        for conn, _ in idle:
+            self._safe_close(conn)
+
+    # ------------------------------------------
+    # Metrics
+    # ------------------------------------------
+    def stats(self):
+        with self._lock:
+            stats = dict(self._metrics)
+            stats["idle"] = len(self._idle)
+            stats["in_use"] = self._in_use
+            stats["size"] = len(self._idle) + self._in_use
+        checkouts = stats["checkouts"]
+        stats["avg_wait_seconds"] = stats["total_wait_seconds"] / checkouts if checkouts else 0.0
+        return stats
@@ -0,0 +1,94 @@
+import re
+
+# Category words -> canonical keyword used by the keyword (BM25) leg
+CATEGORIES = {
+    "running": ["running", "runner", "jogging", "marathon", "lari"],
+    "sneaker": ["sneaker", "sneakers", "trainer", "trainers"],
+    "boot": ["boot", "boots", "chelsea"],
+    "sandal": ["sandal", "sandals", "flip flop", "flip-flop", "slides", "sendal"],
+    "heel": ["heel", "heels", "pumps", "stiletto"],
+    "loafer": ["loafer", "loafers", "moccasin"],
+    "hiking": ["hiking", "trail", "trekking"],
+    "basketball": ["basketball"],
+    "slipper": ["slipper", "slippers"],
+    "oxford": ["oxford", "derby", "dress shoe", "formal"],
+}
+
+_NUM = r"(?:\$|rp\.?)?\s*(\d+(?:[.,]\d{1,2})?)\s*(?:usd|dollars?)?"
+_BETWEEN = re.compile(rf"(?:between|from)\s+{_NUM}\s*(?:and|to|-)\s*{_NUM}")
+_RANGE = re.compile(r"\$\s*(\d+(?:[.,]\d{1,2})?)\s*-\s*\$?\s*(\d+(?:[.,]\d{1,2})?)")
+# Bare "max"/"min" are also model names ("Air Max 90"): they only count next to a
+# price word ("max price 80", "budget max 80") or a currency marker ("max $80")
+_PRICE_WORD = r"(?:price|budget|harga)"
+_CURRENCY = r"(?=\s*(?:\$|rp\b|rp\.|\d+(?:[.,]\d{1,2})?\s*(?:usd|dollars?)\b))"
+
+
+def _bound(words, cap):
+    cap = rf"(?:{_PRICE_WORD}\s*{cap}|{cap}\s*{_PRICE_WORD}(?:\s*(?:of|is))?|{cap}{_CURRENCY})"
+    return re.compile(rf"(?:{words}|{cap})\s*:?\s*{_NUM}")
+
+
+_MAX = _bound(r"under|below|less than|cheaper than|up to|at most|<|di bawah", r"max(?:imum)?")
+_MIN = _bound(r"over|above|more than|at least|>|di atas", r"min(?:imum)?")
+
+_WORD = re.compile(r"[a-z0-9]+")
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "for", "with", "in", "on", "of", "to", "me", "my", "i", "some",
+    "show", "find", "want", "need", "looking", "recommend", "any", "something", "like", "please",
+    "shoe", "shoes", "under", "below", "over", "above", "than", "less", "more", "between", "usd", "dollar", "dollars",
+}
+
+
+def _price(value):
+    return float(value.replace(",", "."))
+
+
+def tokenize(text):
+    """Lowercase alphanumeric tokens without stopwords (shared by the BM25 index and queries)."""
+    return [t for t in _WORD.findall(str(text).lower()) if t not in STOPWORDS]
+
+
+def parse_query(text, known_brands=()):
+    """
+    Extracts structured filters from a shopping message, e.g.
+    "Nike running shoes under $80" ->
+    {"brands": ["Nike"], "min_price": None, "max_price": 80.0,
+     "category": "running", "keywords": ["nike", "running"]}
+    Brands are matched against `known_brands` (catalog values) so only real
+    brands become hard filters.
+    """
+    lower = str(text).lower()
+    filters = {"brands": [], "min_price": None, "max_price": None, "category": None, "keywords": []}
+
+    m = _BETWEEN.search(lower) or _RANGE.search(lower)
+    if m:
+        low, high = sorted((_price(m.group(1)), _price(m.group(2))))
+        filters["min_price"], filters["max_price"] = low, high
+    else:
+        m = _MAX.search(lower)
+        if m:
+            filters["max_price"] = _price(m.group(1))
+        m = _MIN.search(lower)
+        if m:
+            filters["min_price"] = _price(m.group(1))
+
+    for brand in sorted({b for b in known_brands if b}, key=len, reverse=True):
+        # Short brands ("On", "Ugg") double as common words: require their exact casing
+        haystack, needle = (text, brand) if len(brand) <= 3 else (lower, brand.lower())
+        if re.search(rf"(?<![A-Za-z0-9]){re.escape(needle)}(?![A-Za-z0-9])", str(haystack)):
+            if not any(brand.lower() in b.lower() for b in filters["brands"]):
+                filters["brands"].append(brand)
+
+    for category, words in CATEGORIES.items():
+        if any(re.search(rf"\b{re.escape(w)}\b", lower) for w in words):
+            filters["category"] = category
+            break
+
+    # Keyword leg: message tokens minus price numbers
+    filters["keywords"] = [t for t in tokenize(lower) if not t.isdigit()]
+    return filters
+
+
+def has_filters(filters):
+    return bool(filters) and bool(filters.get("brands") or filters.get("min_price") is not None
+                                  or filters.get("max_price") is not None)
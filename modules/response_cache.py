@@ -0,0 +1,118 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+
+def fingerprint(*parts):
+    """Short stable hash of the routing/context values a cached answer depends on."""
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(str(part).encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()[:16]
+
+
+def products_fingerprint(df, columns=("IMAGE_FILENAME", "TITLE", "PRICE", "PRODUCT_DETAILS_CLEAN")):
+    """
+    Hash of the retrieved product set (ids plus the fields the answer quotes),
+    so a cached answer is only reused when retrieval returned the same rows
+    with the same catalog content.
+    """
+    if df is None or df.empty:
+        return "empty"
+    cols = [c for c in columns if c in df.columns]
+    hashed = df[cols].astype(str).to_numpy().tolist()
+    return fingerprint(*hashed)
+
+
+class SemanticResponseCache:
+    """
+    Cache of generated answers keyed by query embedding.
+    A lookup hits when an entry with the same context fingerprint and product
+    set has cosine similarity >= threshold with the new query. Entries expire
+    after ttl_seconds; the least recently used are evicted at capacity.
+    """
+
+    def __init__(self, threshold=0.95, ttl_seconds=3600, capacity=2000):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.capacity = capacity
+        self._entries = OrderedDict()  # id -> dict(vector, context, products, response, ...)
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._matrix = None
+        self._ids = []
+        self._counters = {"hits": 0, "misses": 0, "saved_seconds": 0.0, "invalidations": 0}
+
+    def _rebuild(self):
+        self._ids = list(self._entries)
+        self._matrix = (np.vstack([self._entries[i]["vector"] for i in self._ids])
+                        if self._ids else np.zeros((0, 0), dtype=np.float32))
+
+    def lookup(self, vector, context_key, products_key):
+        """Returns a cached response dict or None."""
+        if vector is None or len(vector) == 0:
+            return None
+        q = np.asarray(vector, dtype=np.float32)
+        q = q / (np.linalg.norm(q) or 1.0)
+        now = time.time()
+        with self._lock:
+            expired = [i for i, e in self._entries.items() if now - e["created_at"] > self.ttl_seconds]
+            for i in expired:
+                del self._entries[i]
+            if expired or self._matrix is None:
+                self._rebuild()
+            best = None
+            if len(self._ids) and self._matrix.shape[1] == len(q):
+                sims = self._matrix @ q
+                for pos in np.argsort(-sims):
+                    if sims[pos] < self.threshold:
+                        break
+                    entry = self._entries[self._ids[pos]]
+                    if entry["context"] == context_key and entry["products"] == products_key:
+                        best = self._ids[pos]
+                        break
+            if best is None:
+                self._counters["misses"] += 1
+                return None
+            self._entries.move_to_end(best)
+            entry = self._entries[best]
+            self._counters["hits"] += 1
+            self._counters["saved_seconds"] += entry["latency"]
+            return dict(entry["response"])
+
+    def store(self, vector, context_key, products_key, response, latency):
+        if vector is None or len(vector) == 0 or not response:
+            return
+        q = np.asarray(vector, dtype=np.float32)
+        q = q / (np.linalg.norm(q) or 1.0)
+        with self._lock:
+            self._entries[self._next_id] = {
+                "vector": q,
+                "context": context_key,
+                "products": products_key,
+                "response": dict(response),
+                "latency": latency,
+                "created_at": time.time(),
+            }
+            self._next_id += 1
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def invalidate(self):
+        """Drops everything, e.g. after the product catalog changed."""
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+            self._counters["invalidations"] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,91 @@
+"""
+Import-time profile of the app's startup path.
+
+Imports everything main.py imports at module level in a fresh interpreter
+(`python -X importtime`), reports the slowest packages, and fails when the
+total exceeds a budget or when a dependency that should stay deferred until
+a chat turn (LangChain, Voyage, PIL, the Snowflake connector) is loaded:
+
+    python -m modules.startup                      # report as JSON
+    python -m modules.startup --budget-ms 2500     # regression check (exit 1)
+"""
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+
+ENTRYPOINT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+
+# Heavy packages that must only be imported on the code paths that need them
+DEFERRED_MODULES = ("langchain_core", "langchain_community", "voyageai", "PIL", "snowflake.connector")
+# pandas / numpy (~0.5 s of the startup imports) stay eager on purpose: the first
+# home render already reads the featured pool as a DataFrame, so deferring them
+# would move that cost into the first paint rather than remove it.
+
+
+def entrypoint_imports(path=ENTRYPOINT):
+    """Top-level import statements of main.py, as source lines."""
+    with open(path, encoding="utf-8") as f:
+        source = f.read()
+    return [ast.get_source_segment(source, node) for node in ast.parse(source).body
+            if isinstance(node, (ast.Import, ast.ImportFrom))]
+
+
+def profile_imports(statements, cwd=None):
+    """
+    Runs `statements` under -X importtime in a fresh interpreter.
+    Returns (total_ms, {top-level module: cumulative ms}, loaded module names).
+    """
+    code = "\n".join(statements + ["import sys, json", "print(json.dumps(sorted(sys.modules)))"])
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=cwd or os.path.dirname(ENTRYPOINT), capture_output=True, text=True, check=True,
+    )
+    cumulative = {}
+    for line in proc.stderr.splitlines():
+        # "import time: <self us> | <cumulative us> | <package>", nested imports indented under their parent
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[1].strip().isdigit() or fields[2].startswith("  "):
+            continue
+        cumulative[fields[2].strip()] = int(fields[1]) / 1000
+    return sum(cumulative.values()), cumulative, json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def deferred_violations(loaded, deferred=DEFERRED_MODULES):
+    return sorted(d for d in deferred if d in loaded)
+
+
+def run(budget_ms=None, top=15):
+    statements = entrypoint_imports()
+    total_ms, cumulative, loaded = profile_imports(statements)
+    report = {
+        "total_ms": round(total_ms, 1),
+        "modules_loaded": len(loaded),
+        "slowest": [{"module": m, "cumulative_ms": round(ms, 1)}
+                    for m, ms in sorted(cumulative.items(), key=lambda kv: kv[1], reverse=True)[:top]],
+        "deferred_loaded": deferred_violations(loaded),
+    }
+    failures = []
+    if report["deferred_loaded"]:
+        failures.append(f"deferred modules imported at startup: {', '.join(report['deferred_loaded'])}")
+    if budget_ms is not None and total_ms > budget_ms:
+        failures.append(f"startup imports took {total_ms:.0f} ms (budget {budget_ms:.0f} ms)")
+    report["failures"] = failures
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import-time profile of the SoleMate startup path.")
+    parser.add_argument("--budget-ms", type=float, default=None, help="fail when startup imports exceed this")
+    parser.add_argument("--top", type=int, default=15, help="number of slowest modules to list")
+    args = parser.parse_args()
+
+    report = run(budget_ms=args.budget_ms, top=args.top)
+    print(json.dumps(report, indent=2))
+    for failure in report["failures"]:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    sys.exit(1 if report["failures"] else 0)
@@ -0,0 +1,304 @@
+import contextlib
+import json
+import os
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Seconds; upper bounds of the stage duration histogram
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_local = threading.local()
+
+
+# ==========================================
+# TRACES
+# ==========================================
+class Span:
+    def __init__(self, trace, name, parent_id, attributes):
+        self.trace = trace
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attributes = dict(attributes)
+        self.start = time.time()
+        self.end = None
+        self.status = "OK"
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    @property
+    def duration(self):
+        return (self.end or time.time()) - self.start
+
+    def to_dict(self):
+        # OTLP/JSON span shape, so the file can be replayed into an OpenTelemetry collector
+        return {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "startTimeUnixNano": int(self.start * 1e9),
+            "endTimeUnixNano": int((self.end or time.time()) * 1e9),
+            "attributes": [{"key": k, "value": {"stringValue": str(v)}} for k, v in self.attributes.items()],
+            "status": {"code": self.status},
+        }
+
+
+class Trace:
+    """All spans of one chat turn. Spans may be opened from several threads."""
+
+    def __init__(self, name="turn", **attributes):
+        self.trace_id = uuid.uuid4().hex
+        self.spans = []
+        self._lock = threading.Lock()
+        self.root = self._open(name, None, attributes)
+
+    def _open(self, name, parent_id, attributes):
+        span = Span(self, name, parent_id, attributes)
+        with self._lock:
+            self.spans.append(span)
+        return span
+
+    @contextlib.contextmanager
+    def span(self, name, **attributes):
+        stack = _stack()
+        parent = stack[-1] if stack and stack[-1].trace is self else self.root
+        span = self._open(name, parent.span_id, attributes)
+        stack.append(span)
+        try:
+            yield span
+        except Exception as e:
+            span.status = "ERROR"
+            span.set(error=type(e).__name__)
+            raise
+        finally:
+            span.end = time.time()
+            stack.pop()
+
+    def finish(self):
+        if self.root.end is None:
+            self.root.end = time.time()
+
+
+class _NoopSpan:
+    def set(self, **attributes):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+def _stack():
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+def activate(trace):
+    """Makes `trace` the current trace of this thread (None to clear)."""
+    _local.trace = trace
+    _local.stack = []
+
+
+def current_trace():
+    return getattr(_local, "trace", None)
+
+
+@contextlib.contextmanager
+def span(name, **attributes):
+    """Child span of the current trace; a no-op when no turn is being traced."""
+    trace = current_trace()
+    if trace is None:
+        yield _NOOP
+        return
+    with trace.span(name, **attributes) as s:
+        yield s
+
+
+def annotate(**attributes):
+    """Adds attributes to the innermost open span of this thread (if any)."""
+    stack = _stack()
+    if stack:
+        stack[-1].set(**attributes)
+    elif current_trace() is not None:
+        current_trace().root.set(**attributes)
+
+
+# ==========================================
+# METRICS
+# ==========================================
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{str(v)}"' for k, v in sorted(labels)) + "}"
+
+
+class MetricsRegistry:
+    """Prometheus-style counters and histograms with text exposition."""
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self._counters = {}    # (name, labels) -> value
+        self._histograms = {}  # (name, labels) -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(labels.items()))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(labels.items()))
+        with self._lock:
+            h = self._histograms.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    h[i] += 1
+            h[-2] += value
+            h[-1] += 1
+
+    def render(self):
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items())
+        for name in sorted({k[0] for k, _ in counters}):
+            lines.append(f"# TYPE {name} counter")
+            lines += [f"{name}{_labels(labels)} {value}" for (n, labels), value in counters if n == name]
+        for name in sorted({k[0] for k, _ in histograms}):
+            lines.append(f"# TYPE {name} histogram")
+            for (n, labels), h in histograms:
+                if n != name:
+                    continue
+                for bound, count in zip(self.buckets, h):
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', bound),))} {count}")
+                lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {h[-1]}")
+                lines.append(f"{name}_sum{_labels(labels)} {h[-2]:.6f}")
+                lines.append(f"{name}_count{_labels(labels)} {h[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+# ==========================================
+# EXPORT
+# ==========================================
+class Telemetry:
+    """
+    Collects turn traces. Finished turns update the metrics registry and are
+    appended to `spans_path` (one OTLP-style JSON span per line); metrics are
+    written to `metrics_path` (Prometheus textfile format) and/or served on
+    http://localhost:<metrics_port>/metrics.
+    """
+
+    def __init__(self, spans_path=None, metrics_path=None, metrics_port=0, keep_last=50):
+        self.spans_path = spans_path
+        self.metrics_path = metrics_path
+        self.registry = MetricsRegistry()
+        self.recent = []
+        self.keep_last = keep_last
+        self._lock = threading.Lock()
+        self._server = None
+        for path in (spans_path, metrics_path):
+            if path:
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        if metrics_port:
+            self.serve(metrics_port)
+
+    def start_turn(self, **attributes):
+        trace = Trace("turn", **attributes)
+        activate(trace)
+        return trace
+
+    def finish(self, trace):
+        trace.finish()
+        activate(None)
+        for s in trace.spans:
+            if s.end is None:
+                continue
+            stage = "turn" if s is trace.root else s.name
+            self.registry.observe("solemate_stage_duration_seconds", s.duration, stage=stage)
+            if s.status != "OK":
+                self.registry.inc("solemate_stage_errors_total", stage=stage)
+            for key, value in s.attributes.items():
+                if key == "cache_hit":
+                    self.registry.inc("solemate_cache_lookups_total", stage=stage, hit=str(bool(value)).lower())
+                elif key in ("rows", "prompt_tokens", "response_tokens") and isinstance(value, (int, float)):
+                    self.registry.inc(f"solemate_{key}_total", value, stage=stage)
+        self.registry.inc("solemate_turns_total", intent=trace.root.attributes.get("intent", "unknown"))
+
+        with self._lock:
+            self.recent.append(trace)
+            del self.recent[:-self.keep_last]
+            if self.spans_path:
+                with open(self.spans_path, "a", encoding="utf-8") as f:
+                    for s in trace.spans:
+                        f.write(json.dumps(s.to_dict()) + "\n")
+            if self.metrics_path:
+                tmp = self.metrics_path + ".tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    f.write(self.registry.render())
+                os.replace(tmp, self.metrics_path)
+
+    def serve(self, port, host="127.0.0.1"):
+        registry = self.registry
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        try:
+            self._server = ThreadingHTTPServer((host, port), _Handler)
+        except OSError:
+            # Another process (e.g. a second Streamlit worker) already serves this port
+            return
+        threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+
+
+def waterfall(trace):
+    """Rows for the debug panel: span name (indented by depth), offset, duration, attributes."""
+    by_id = {s.span_id: s for s in trace.spans}
+
+    def _depth(s):
+        depth = 0
+        while s.parent_id and s.parent_id in by_id:
+            s = by_id[s.parent_id]
+            depth += 1
+        return depth
+
+    origin = trace.root.start
+    rows = []
+    for s in sorted(trace.spans, key=lambda s: s.start):
+        rows.append({
+            "span": "  " * _depth(s) + s.name,
+            "start_ms": round((s.start - origin) * 1000, 1),
+            "duration_ms": round(s.duration * 1000, 1),
+            "attributes": ", ".join(f"{k}={v}" for k, v in s.attributes.items()),
+        })
+    return rows
+
+
+def format_waterfall(trace, width=40):
+    """Text waterfall: one bar per span, positioned on the turn's timeline."""
+    rows = waterfall(trace)
+    total = max((r["start_ms"] + r["duration_ms"] for r in rows), default=0) or 1
+    name_width = max(len(r["span"]) for r in rows) if rows else 0
+    lines = []
+    for r in rows:
+        offset = int(r["start_ms"] / total * width)
+        length = max(1, int(r["duration_ms"] / total * width))
+        bar = " " * offset + "█" * min(length, width - offset)
+        lines.append(f"{r['span']:<{name_width}} |{bar:<{width}}| {r['duration_ms']:>8.1f} ms")
+    return "\n".join(lines)
@@ -0,0 +1,400 @@
+import copy
+import json
+import os
+from collections import defaultdict
+import numpy as np
+import pandas as pd
+from modules.query_parser import tokenize
+
+RRF_K = 60  # reciprocal-rank-fusion damping constant
+
+# Columns returned by every search backend, in the same order as the SQL in database.py
+RESULT_COLUMNS = ["TITLE", "BRAND", "PRICE", "PRODUCT_DETAILS_CLEAN", "IMAGE_FILENAME", "SIMILARITY_SCORE"]
+METADATA_COLUMNS = RESULT_COLUMNS[:-1]
+BATCH_RESULT_COLUMNS = ["QUERY_INDEX", "RANK"] + RESULT_COLUMNS
+
+
+def parse_prices(values):
+    """Numeric prices from strings like "$59.99" / "1,299.00" (NaN when unparseable)."""
+    cleaned = pd.Series(values, dtype="object").astype(str).str.replace(r"[^0-9.]", "", regex=True)
+    return pd.to_numeric(cleaned, errors="coerce").to_numpy(dtype=np.float64)
+
+
+class BM25Index:
+    """Small in-memory BM25 over product text (title, brand, details)."""
+
+    def __init__(self, documents, k1=1.2, b=0.75):
+        self.k1, self.b = k1, b
+        self.n = len(documents)
+        postings = defaultdict(lambda: defaultdict(int))
+        lengths = np.zeros(self.n, dtype=np.float32)
+        for doc_id, text in enumerate(documents):
+            tokens = tokenize(text)
+            lengths[doc_id] = len(tokens)
+            for token in tokens:
+                postings[token][doc_id] += 1
+        self.avg_len = float(lengths.mean()) if self.n else 0.0
+        self.lengths = lengths
+        self.postings = {
+            t: (np.fromiter(d.keys(), dtype=np.int64), np.fromiter(d.values(), dtype=np.float32))
+            for t, d in postings.items()
+        }
+
+    def scores(self, query_tokens):
+        out = np.zeros(self.n, dtype=np.float32)
+        for token in set(query_tokens):
+            if token not in self.postings:
+                continue
+            docs, tf = self.postings[token]
+            idf = np.log(1 + (self.n - len(docs) + 0.5) / (len(docs) + 0.5))
+            norm = tf + self.k1 * (1 - self.b + self.b * self.lengths[docs] / (self.avg_len or 1.0))
+            out[docs] += idf * tf * (self.k1 + 1) / norm
+        return out
+
+
+def normalize_rows(matrix):
+    """
+    L2-normalizes each row so cosine similarity becomes a plain dot product.
+    Zero rows are left as zeros instead of producing NaNs.
+    """
+    matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def top_k_indices(scores, k):
+    """
+    Returns the indices of the k highest scores per row, best first.
+    Uses argpartition so the cost is O(n) per query instead of a full sort.
+    """
+    scores = np.atleast_2d(scores)
+    n = scores.shape[1]
+    k = min(k, n)
+    if k <= 0:
+        return np.empty((scores.shape[0], 0), dtype=np.int64)
+    if k < n:
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        part = np.tile(np.arange(n), (scores.shape[0], 1))
+    part_scores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-part_scores, axis=1, kind="stable")
+    return np.take_along_axis(part, order, axis=1)
+
+
+class LocalVectorIndex:
+    """
+    In-process cosine-similarity index over the product catalog.
+    Vectors live in one contiguous, pre-normalized float32 matrix; metadata lives
+    in a DataFrame aligned row-by-row with it. Optionally builds an IVF
+    (inverted file) partitioning for approximate search on large catalogs.
+    """
+
+    def __init__(self, vectors, metadata):
+        if len(vectors) != len(metadata):
+            raise ValueError("vectors and metadata must have the same number of rows.")
+        self.vectors = normalize_rows(vectors) if len(vectors) else np.zeros((0, 0), dtype=np.float32)
+        self.metadata = metadata.reset_index(drop=True)
+        self.centroids = None
+        self.assignments = None
+        self._lists = None
+        self.info = {}
+        self._columns = None
+        self._bm25 = None
+
+    @classmethod
+    def from_frame(cls, df, vector_column="VECTOR_TEXT"):
+        """Builds an index from a DataFrame holding metadata plus a list-valued vector column."""
+        if df.empty:
+            return cls(np.zeros((0, 0), dtype=np.float32), df.reindex(columns=METADATA_COLUMNS))
+        vectors = np.asarray([_as_list(v) for v in df[vector_column]], dtype=np.float32)
+        return cls(vectors, df.drop(columns=[vector_column]))
+
+    def __len__(self):
+        return len(self.metadata)
+
+    @property
+    def dim(self):
+        return self.vectors.shape[1] if self.vectors.ndim == 2 else 0
+
+    # ------------------------------------------
+    # Approximate index (IVF)
+    # ------------------------------------------
+    def build_ivf(self, n_lists=None, iterations=10, seed=0):
+        """
+        Clusters the vectors with spherical k-means so queries only scan the
+        closest n_probe partitions. Worth it from roughly 50k products upwards.
+        """
+        n = len(self)
+        if n == 0:
+            return self
+        n_lists = n_lists or max(1, int(np.sqrt(n)))
+        n_lists = min(n_lists, n)
+        rng = np.random.default_rng(seed)
+        centroids = self.vectors[rng.choice(n, n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assignments = np.argmax(self.vectors @ centroids.T, axis=1)
+            for c in range(n_lists):
+                members = self.vectors[assignments == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+            centroids = normalize_rows(centroids)
+        self.centroids = centroids
+        self.assignments = np.argmax(self.vectors @ centroids.T, axis=1).astype(np.int32)
+        self._build_lists()
+        return self
+
+    def _build_lists(self):
+        order = np.argsort(self.assignments, kind="stable")
+        bounds = np.searchsorted(self.assignments[order], np.arange(len(self.centroids) + 1))
+        self._lists = [order[bounds[c]:bounds[c + 1]] for c in range(len(self.centroids))]
+
+    # ------------------------------------------
+    # Columnar metadata & filters
+    # ------------------------------------------
+    def columns(self):
+        """Lazily built columnar arrays used for pre-filter bitmasks."""
+        if self._columns is None:
+            self._columns = {
+                "price": parse_prices(self.metadata["PRICE"]) if len(self) else np.zeros(0),
+                "brand": self.metadata["BRAND"].fillna("").astype(str).str.lower().to_numpy() if len(self) else np.zeros(0, dtype=object),
+            }
+        return self._columns
+
+    def filter_mask(self, filters):
+        """Boolean row mask for brand / price filters, or None when nothing is filtered."""
+        if not filters:
+            return None
+        cols = self.columns()
+        mask = np.ones(len(self), dtype=bool)
+        filtered = False
+        if filters.get("brands"):
+            mask &= np.isin(cols["brand"], [b.lower() for b in filters["brands"]])
+            filtered = True
+        if filters.get("min_price") is not None:
+            mask &= cols["price"] >= filters["min_price"]
+            filtered = True
+        if filters.get("max_price") is not None:
+            mask &= cols["price"] <= filters["max_price"]
+            filtered = True
+        return mask if filtered else None
+
+    def bm25(self):
+        if self._bm25 is None:
+            text = (self.metadata["TITLE"].fillna("").astype(str) + " " +
+                    self.metadata["BRAND"].fillna("").astype(str) + " " +
+                    self.metadata["PRODUCT_DETAILS_CLEAN"].fillna("").astype(str))
+            self._bm25 = BM25Index(text.tolist())
+        return self._bm25
+
+    # ------------------------------------------
+    # Search
+    # ------------------------------------------
+    def search_indices(self, query_vectors, limit=5, n_probe=None, mask=None):
+        """
+        Scores a batch of query vectors with one matrix multiply.
+        `mask` (boolean, one per row) restricts scoring to the rows that pass filters.
+        Returns (indices, scores), both shaped (n_queries, <=limit), padded with -1.
+        """
+        queries = normalize_rows(np.atleast_2d(np.asarray(query_vectors, dtype=np.float32)))
+        if len(self) == 0:
+            empty = np.empty((len(queries), 0))
+            return empty.astype(np.int64), empty.astype(np.float32)
+
+        if self.centroids is None or not n_probe:
+            if mask is None:
+                scores = queries @ self.vectors.T
+                idx = top_k_indices(scores, limit)
+                return idx, np.take_along_axis(scores, idx, axis=1)
+            rows = np.flatnonzero(mask)
+            scores = queries @ self.vectors[rows].T
+            local = top_k_indices(scores, limit)
+            return rows[local], np.take_along_axis(scores, local, axis=1)
+
+        all_idx, all_scores = [], []
+        probes = top_k_indices(queries @ self.centroids.T, n_probe)
+        for query, lists in zip(queries, probes):
+            candidates = np.concatenate([self._lists[c] for c in lists])
+            if mask is not None:
+                candidates = candidates[mask[candidates]]
+            scores = self.vectors[candidates] @ query
+            local = top_k_indices(scores, limit)[0]
+            all_idx.append(candidates[local])
+            all_scores.append(scores[local])
+        width = max(len(i) for i in all_idx)
+        idx = np.full((len(queries), width), -1, dtype=np.int64)
+        out = np.full((len(queries), width), -np.inf, dtype=np.float32)
+        for row, (i, s) in enumerate(zip(all_idx, all_scores)):
+            idx[row, :len(i)] = i
+            out[row, :len(s)] = s
+        return idx, out
+
+    def search(self, query_vector, limit=5, n_probe=None, filters=None, keyword_weight=0.0):
+        """
+        Same contract as database.search_products_by_vector: a DataFrame of the
+        top `limit` products with a SIMILARITY_SCORE column, best first.
+        `filters` (see query_parser.parse_query) are applied as a pre-filter
+        bitmask; with keyword_weight > 0 a BM25 leg over the filter's keywords is
+        fused with the vector ranking (reciprocal rank fusion).
+        """
+        mask = self.filter_mask(filters)
+        keywords = (filters or {}).get("keywords") or []
+        use_keywords = keyword_weight > 0 and keywords and len(self)
+        depth = limit * 4 if use_keywords else limit
+        idx, scores = self.search_indices([query_vector], limit=depth, n_probe=n_probe, mask=mask)
+        keep = idx[0] >= 0
+        idx, scores = idx[0][keep], scores[0][keep]
+
+        if use_keywords:
+            kw = self.bm25().scores(keywords)
+            if mask is not None:
+                kw[~mask] = 0
+            kw_idx = top_k_indices(kw, depth)[0]
+            kw_idx = kw_idx[kw[kw_idx] > 0]
+            fused = defaultdict(float)
+            for rank, i in enumerate(idx):
+                fused[i] += (1 - keyword_weight) / (RRF_K + rank)
+            for rank, i in enumerate(kw_idx):
+                fused[i] += keyword_weight / (RRF_K + rank)
+            idx = np.asarray(sorted(fused, key=fused.get, reverse=True)[:limit], dtype=np.int64)
+            if len(idx):
+                q = normalize_rows([query_vector])[0]
+                scores = self.vectors[idx] @ q
+            else:
+                scores = np.zeros(0, dtype=np.float32)
+
+        df = self.metadata.iloc[idx[:limit]].reset_index(drop=True)
+        df["SIMILARITY_SCORE"] = np.asarray(scores[:limit], dtype=float)
+        return df.reindex(columns=RESULT_COLUMNS)
+
+    def search_many(self, query_vectors, limit=5, n_probe=None, filters=None):
+        """
+        Top `limit` products for each query vector with one matrix multiply.
+        Returns a long-format DataFrame: QUERY_INDEX, RANK (1-based), then the
+        usual result columns, ordered by query and rank.
+        """
+        queries = np.atleast_2d(np.asarray(query_vectors, dtype=np.float32))
+        if len(queries) == 0 or len(self) == 0:
+            return pd.DataFrame(columns=BATCH_RESULT_COLUMNS)
+        idx, scores = self.search_indices(queries, limit=limit, n_probe=n_probe, mask=self.filter_mask(filters))
+        query_index, rank = np.nonzero(idx >= 0)
+        rows = idx[query_index, rank]
+        df = self.metadata.iloc[rows].reset_index(drop=True)
+        df.insert(0, "QUERY_INDEX", query_index)
+        df.insert(1, "RANK", rank + 1)
+        df["SIMILARITY_SCORE"] = scores[query_index, rank].astype(float)
+        return df.reindex(columns=BATCH_RESULT_COLUMNS)
+
+    # ------------------------------------------
+    # Incremental updates
+    # ------------------------------------------
+    def apply_changes(self, upserts, delete_keys=(), key_column="IMAGE_FILENAME", vector_column="VECTOR_TEXT"):
+        """
+        Returns a NEW index with `upserts` (a catalog frame incl. vectors) inserted
+        or replaced by key and `delete_keys` removed. The current index is never
+        mutated, so searches running against it are unaffected; callers swap the
+        reference once the new one is ready. IVF centroids are kept and the
+        changed rows are assigned to their nearest partition.
+        """
+        delete_keys = set(delete_keys)
+        if not upserts.empty:
+            delete_keys |= set(upserts[key_column])
+        keep = ~self.metadata[key_column].isin(delete_keys).to_numpy() if len(self) else np.zeros(0, dtype=bool)
+
+        if upserts.empty:
+            new_vectors = np.zeros((0, self.dim), dtype=np.float32)
+            new_meta = self.metadata.iloc[:0]
+        else:
+            upserts = upserts.drop_duplicates(subset=[key_column], keep="last")
+            new_vectors = normalize_rows(np.asarray([_as_list(v) for v in upserts[vector_column]], dtype=np.float32))
+            new_meta = upserts.drop(columns=[vector_column])
+
+        if len(self):
+            vectors = np.concatenate([np.asarray(self.vectors)[keep], new_vectors])
+            metadata = pd.concat([self.metadata[keep], new_meta], ignore_index=True)
+        else:
+            vectors, metadata = new_vectors, new_meta.reset_index(drop=True)
+
+        index = LocalVectorIndex.__new__(LocalVectorIndex)
+        index.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        index.metadata = metadata.reset_index(drop=True)
+        index.info = dict(self.info)
+        index.centroids = index.assignments = index._lists = None
+        index._columns = index._bm25 = None
+        if self.centroids is not None and len(index):
+            new_assign = np.argmax(new_vectors @ self.centroids.T, axis=1).astype(np.int32) if len(new_vectors) else np.zeros(0, dtype=np.int32)
+            index.centroids = self.centroids
+            index.assignments = np.concatenate([self.assignments[keep], new_assign])
+            index._build_lists()
+        return index
+
+    # ------------------------------------------
+    # Persistence
+    # ------------------------------------------
+    def save(self, directory):
+        """
+        Writes the matrix as .npy (memory-mappable on load) plus metadata and
+        optional IVF arrays. Files are written to temp names and renamed so a
+        concurrent load never sees a half-written snapshot.
+        """
+        os.makedirs(directory, exist_ok=True)
+        files = {"vectors.npy": self.vectors}
+        if self.centroids is not None:
+            files["centroids.npy"] = self.centroids
+            files["assignments.npy"] = self.assignments
+        else:
+            # Don't leave a previous IVF snapshot's partitions next to the new vectors
+            for name in ("centroids.npy", "assignments.npy"):
+                if os.path.exists(os.path.join(directory, name)):
+                    os.remove(os.path.join(directory, name))
+        for name, array in files.items():
+            tmp = os.path.join(directory, name + ".tmp")
+            with open(tmp, "wb") as f:
+                np.save(f, array)
+            os.replace(tmp, os.path.join(directory, name))
+        tmp = os.path.join(directory, "metadata.pkl.tmp")
+        self.metadata.to_pickle(tmp)
+        os.replace(tmp, os.path.join(directory, "metadata.pkl"))
+        self.save_manifest(directory)
+
+    def save_manifest(self, directory):
+        """Rewrites only manifest.json (e.g. a new watermark when no rows changed)."""
+        manifest = {"rows": len(self), "dim": self.dim, "ivf": self.centroids is not None, "info": self.info}
+        tmp = os.path.join(directory, "manifest.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp, os.path.join(directory, "manifest.json"))
+
+    def with_info(self, **info):
+        """A shallow copy sharing the arrays, with `info` updated; the original is left untouched."""
+        index = copy.copy(self)
+        index.info = {**self.info, **info}
+        return index
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """Loads a snapshot written by save(); returns None if there is none."""
+        if not os.path.exists(os.path.join(directory, "manifest.json")):
+            return None
+        mode = "r" if mmap else None
+        with open(os.path.join(directory, "manifest.json")) as f:
+            manifest = json.load(f)
+        index = cls.__new__(cls)
+        index.info = manifest.get("info", {})
+        index.vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode=mode)
+        index.metadata = pd.read_pickle(os.path.join(directory, "metadata.pkl"))
+        index.centroids = index.assignments = index._lists = None
+        index._columns = index._bm25 = None
+        if manifest.get("ivf"):
+            index.centroids = np.load(os.path.join(directory, "centroids.npy"))
+            index.assignments = np.load(os.path.join(directory, "assignments.npy"))
+            index._build_lists()
+        return index
+
+
+def _as_list(value):
+    # The connector returns VECTOR columns as lists, but JSON strings show up
+    # when the column is read through pd.read_sql or a VARIANT cast.
+    if isinstance(value, str):
+        return json.loads(value)
+    return value
@@ -0,0 +1,246 @@
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from modules.image_store import stage_pattern
+from modules.cortex import CortexClient
+from modules import telemetry
+
+VISION_MODEL = "claude-3-5-sonnet"
+VISION_PROMPT = "Describe this image in detail. Is it footwear? If yes, describe color, material, and style. If no, say what object it is."
+VISION_DIR = "temp_vision"
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:32]
+
+
+def prepare_image(data, max_side=1024, quality=85):
+    """
+    Downsizes and re-encodes an upload to JPEG before it is staged; images
+    that are already small JPEGs are passed through untouched.
+    """
+    try:
+        from PIL import Image, ImageOps
+        with Image.open(io.BytesIO(data)) as img:
+            source_format = img.format
+            if source_format == "JPEG" and max(img.size) <= max_side:
+                return data
+            img = ImageOps.exif_transpose(img)
+            img.thumbnail((max_side, max_side))
+            if img.mode not in ("RGB", "L"):
+                img = img.convert("RGB")
+            out = io.BytesIO()
+            img.save(out, format="JPEG", quality=quality, optimize=True)
+            encoded = out.getvalue()
+            return encoded if len(encoded) < len(data) or source_format != "JPEG" else data
+    except Exception:
+        # Not something PIL can read: let Cortex decide
+        return data
+
+
+def _last_modified(row):
+    # LIST columns: name, size, md5, last_modified ("Mon, 16 Oct 2026 10:00:00 GMT")
+    try:
+        return parsedate_to_datetime(row[3]).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+class VisionService:
+    """
+    Cortex image description with content-addressed staging.
+    Uploads are hashed; the staged file is named by hash so a repeat image
+    skips the PUT, and descriptions are cached by hash so a repeat skips
+    COMPLETE too. COMPLETE goes through a CortexClient, so the connection used
+    for the PUT is back in the pool while the model runs. A background janitor
+    removes expired staged files in bulk.
+    """
+
+    def __init__(self, connection_factory, stage_path, model=VISION_MODEL, prompt=VISION_PROMPT,
+                 max_side=1024, quality=85, cache_size=512, cache_ttl=24 * 3600, staged_ttl=3600,
+                 cortex=None):
+        self.connection_factory = connection_factory
+        self.cortex = cortex or CortexClient(connection_factory)
+        self.stage_path = stage_path
+        self.model = model
+        self.prompt = prompt
+        self.max_side = max_side
+        self.quality = quality
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.staged_ttl = staged_ttl
+        self._descriptions = OrderedDict()  # hash -> (description, created_at)
+        self._staged = {}  # hash -> staged_at, for files this process uploaded
+        self._inflight = {}  # hash -> Event, so concurrent repeats wait for one call
+        self._lock = threading.Lock()
+        self._janitor = None
+        self.counters = {"cache_hits": 0, "put_skipped": 0, "uploads": 0, "bytes_saved": 0, "removed": 0}
+
+    def _cached(self, digest):
+        with self._lock:
+            entry = self._descriptions.get(digest)
+            if entry and time.time() - entry[1] < self.cache_ttl:
+                self._descriptions.move_to_end(digest)
+                return entry[0]
+            self._descriptions.pop(digest, None)
+        return None
+
+    def _remember(self, digest, description):
+        with self._lock:
+            self._descriptions[digest] = (description, time.time())
+            self._descriptions.move_to_end(digest)
+            while len(self._descriptions) > self.cache_size:
+                self._descriptions.popitem(last=False)
+
+    def _is_staged(self, digest):
+        with self._lock:
+            staged_at = self._staged.get(digest)
+        # Leave a margin so the janitor can't delete it between PUT-skip and COMPLETE
+        return staged_at is not None and time.time() - staged_at < self.staged_ttl * 0.8
+
+    def describe(self, image_file):
+        """Description of the uploaded image, or an "ERROR_VISION: ..." string."""
+        image_file.seek(0)
+        data = image_file.read()
+        digest = content_hash(data)
+
+        while True:
+            description = self._cached(digest)
+            if description is not None:
+                with self._lock:
+                    self.counters["cache_hits"] += 1
+                telemetry.annotate(cache_hit=True)
+                return description
+            with self._lock:
+                event = self._inflight.get(digest)
+                if event is None:
+                    self._inflight[digest] = threading.Event()
+                    break
+            event.wait()
+
+        telemetry.annotate(cache_hit=False)
+        try:
+            description = self._describe_uncached(digest, data)
+            if not description.startswith("ERROR_VISION"):
+                self._remember(digest, description)
+            return description
+        finally:
+            with self._lock:
+                self._inflight.pop(digest).set()
+
+    def _describe_uncached(self, digest, data):
+        stage_file_path = f"{VISION_DIR}/{digest}.jpg"
+        try:
+            if self._is_staged(digest):
+                with self._lock:
+                    self.counters["put_skipped"] += 1
+                telemetry.annotate(put_skipped=True)
+            else:
+                with telemetry.span("vision.put"), self.connection_factory() as conn:
+                    if not self._upload(conn.cursor(), digest, data):
+                        return "ERROR_VISION: Upload Failed."
+            with telemetry.span("vision.complete", model=self.model):
+                result = self.cortex.complete_file(self.model, self.prompt, self.stage_path, stage_file_path)
+            return str(result) if result is not None else "No description returned."
+        except Exception as e:
+            return f"ERROR_VISION: {str(e)}"
+
+    def _upload(self, cursor, digest, data):
+        payload = prepare_image(data, self.max_side, self.quality)
+        tmp_dir = tempfile.mkdtemp(prefix="vision-")
+        tmp_path = os.path.join(tmp_dir, f"{digest}.jpg")
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(payload)
+            abs_path = os.path.abspath(tmp_path).replace("\\", "/")
+            # OVERWRITE=FALSE: Snowflake skips the transfer when the hash-named file is already staged
+            status = self._put(cursor, abs_path, overwrite=False)
+            staged_at = time.time()
+            if status == "SKIPPED":
+                # The staged copy may be old and about to be removed by the janitor:
+                # use its real age, and re-upload it when it is close to expiry
+                staged_at = self._staged_at(cursor, digest)
+                if staged_at is None or time.time() - staged_at >= self.staged_ttl * 0.8:
+                    status = self._put(cursor, abs_path, overwrite=True)
+                    staged_at = time.time()
+            if status not in ("UPLOADED", "SKIPPED"):
+                return False
+            with self._lock:
+                self._staged[digest] = staged_at
+                self.counters["uploads" if status == "UPLOADED" else "put_skipped"] += 1
+                self.counters["bytes_saved"] += len(data) - len(payload)
+            return True
+        finally:
+            try:
+                os.remove(tmp_path)
+                os.rmdir(tmp_dir)
+            except OSError:
+                pass
+
+    def _put(self, cursor, abs_path, overwrite):
+        cursor.execute(f"PUT 'file://{abs_path}' {self.stage_path}/{VISION_DIR}/ AUTO_COMPRESS=FALSE "
+                       f"OVERWRITE={'TRUE' if overwrite else 'FALSE'}")
+        return cursor.fetchone()[6]
+
+    def _staged_at(self, cursor, digest):
+        """Last-modified time of a staged vision file (None if unknown)."""
+        rows = cursor.execute(f"LIST {self.stage_path}/{VISION_DIR}/{digest}.jpg").fetchall()
+        for row in rows:
+            modified = _last_modified(row)
+            if modified is not None:
+                return modified
+        return None
+
+    # ------------------------------------------
+    # Janitor
+    # ------------------------------------------
+    def cleanup(self, max_age=None, batch_size=200):
+        """
+        Removes staged vision files older than max_age seconds (default
+        staged_ttl) with one REMOVE per batch. Returns the number removed.
+        """
+        max_age = self.staged_ttl if max_age is None else max_age
+        cutoff = time.time() - max_age
+        with self.connection_factory() as conn:
+            cursor = conn.cursor()
+            rows = cursor.execute(f"LIST {self.stage_path}/{VISION_DIR}/").fetchall()
+            expired = []
+            for row in rows:
+                modified = _last_modified(row)
+                if modified is not None and modified < cutoff:
+                    expired.append(row[0].rsplit("/", 1)[-1])
+            for i in range(0, len(expired), batch_size):
+                names = [f"{VISION_DIR}/{name}" for name in expired[i:i + batch_size]]
+                cursor.execute(f"REMOVE {self.stage_path}/{VISION_DIR}/ PATTERN='{stage_pattern(names)}'")
+        with self._lock:
+            for name in expired:
+                self._staged.pop(name.split(".")[0], None)
+            self.counters["removed"] += len(expired)
+        return len(expired)
+
+    def start_janitor(self, interval):
+        if self._janitor is not None or interval <= 0:
+            return
+
+        def _loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.cleanup()
+                except Exception:
+                    pass
+
+        self._janitor = threading.Thread(target=_loop, name="vision-janitor", daemon=True)
+        self._janitor.start()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats["cached_descriptions"] = len(self._descriptions)
+            stats["staged_files"] = len(self._staged)
+        return stats
@@ -0,0 +1,51 @@
+import random
+import re
+import zlib
+import numpy as np
+import pandas as pd
+import pytest
+
+DIM = 64
+BRANDS = ["Nike", "Adidas", "Asics", "New Balance", "Vans"]
+STYLES = ["running shoe", "sneaker", "leather boot", "sandal", "loafer"]
+COLORS = ["white", "black", "red", "blue"]
+
+
+def _token_vector(token):
+    return np.random.default_rng(zlib.crc32(token.encode("utf-8"))).standard_normal(DIM).astype(np.float32)
+
+
+def bag_of_words(text):
+    """Deterministic embedding: texts sharing words get similar unit vectors."""
+    total = sum((_token_vector(t) for t in re.findall(r"[a-z0-9]+", text.lower())), np.zeros(DIM, dtype=np.float32))
+    norm = np.linalg.norm(total)
+    return (total / norm if norm else _token_vector("empty")).tolist()
+
+
+@pytest.fixture
+def embed():
+    return bag_of_words
+
+
+@pytest.fixture
+def make_catalog():
+    """Factory for a synthetic PRODUCTS_FINAL frame with embedded titles."""
+
+    def _make(n_products, seed=0):
+        rng = random.Random(seed)
+        rows = []
+        for i in range(n_products):
+            brand, style, color = rng.choice(BRANDS), rng.choice(STYLES), rng.choice(COLORS)
+            title = f"{brand} {color.title()} {style.title()} {i}"
+            details = f"{color} {style} with cushioned midsole and rubber outsole"
+            rows.append({
+                "TITLE": title,
+                "BRAND": brand,
+                "PRICE": f"${rng.randint(30, 250)}.99",
+                "PRODUCT_DETAILS_CLEAN": details,
+                "IMAGE_FILENAME": f"img_{i:06d}.jpg",
+                "VECTOR_TEXT": bag_of_words(f"{title} {details}"),
+            })
+        return pd.DataFrame(rows)
+
+    return _make
@@ -0,0 +1,92 @@
+import contextlib
+import pandas as pd
+import pytest
+from modules import database
+
+CFG = {"ivf_lists": 0, "sync_mode": "watermark", "watermark_column": "UPDATED_AT", "key_column": "IMAGE_FILENAME"}
+
+
+@pytest.fixture
+def catalog_sync(tmp_path, monkeypatch, make_catalog):
+    catalog = make_catalog(50)
+    pulls = []
+
+    def load_catalog_frame(where="", params=None, extra_columns=""):
+        pulls.append(where)
+        df = catalog if not where else catalog.iloc[:0]
+        return df.assign(SYNC_WATERMARK="2026-01-01") if extra_columns else df
+
+    monkeypatch.setattr(database, "INDEX_DIR", str(tmp_path / "index"))
+    monkeypatch.setattr(database, "load_catalog_frame", load_catalog_frame)
+    monkeypatch.setattr(database, "fetch_frame_batches", lambda sql, params=None: iter([catalog[["IMAGE_FILENAME"]]]))
+    monkeypatch.setattr(database.CatalogSync, "_server_now", lambda self: "2026-01-01")
+    monkeypatch.setattr(database.CatalogSync, "_initial_watermark", lambda self: "2026-01-01")
+    return database.CatalogSync(dict(CFG))
+
+
+def test_sync_without_changes_keeps_serving_index(catalog_sync, monkeypatch):
+    serving = catalog_sync.index
+    info_before = dict(serving.info)
+    monkeypatch.setattr(database, "save_index_snapshot", lambda index: pytest.fail("snapshot rewritten"))
+    catalog_sync.sync()
+
+    assert serving.info == info_before  # the old object is never mutated
+    assert catalog_sync.index.vectors is serving.vectors
+    assert catalog_sync.last_changes == {"upserts": 0, "deletes": 0}
+    assert database.LocalVectorIndex.load(database.INDEX_DIR).info["synced_at"] == catalog_sync.index.info["synced_at"]
+
+
+def test_row_updated_during_full_load_is_picked_up_by_next_sync(tmp_path, monkeypatch, make_catalog):
+    catalog = make_catalog(20).assign(UPDATED_AT="2026-01-01 00:00:00")
+    table = {"rows": catalog}
+    touched = "img_000003.jpg"
+
+    class Cursor:
+        def execute(self, sql, params=None):
+            self.row = (table["rows"]["UPDATED_AT"].max(),)
+            return self
+
+        def fetchone(self):
+            return self.row
+
+    class Connection:
+        def cursor(self):
+            return Cursor()
+
+    def load_catalog_frame(where="", params=None, extra_columns=""):
+        df = table["rows"]
+        if params:
+            df = df[df["UPDATED_AT"] > params[0]]
+        else:
+            # The bulk read sees the old row, but it is updated before the load finishes
+            updated = table["rows"].copy()
+            updated.loc[updated["IMAGE_FILENAME"] == touched, ["TITLE", "UPDATED_AT"]] = ["Renamed", "2026-01-01 00:05:00"]
+            table["rows"] = updated
+        df = df.assign(SYNC_WATERMARK=df["UPDATED_AT"]) if extra_columns else df
+        return df.drop(columns=["UPDATED_AT"])
+
+    monkeypatch.setattr(database, "INDEX_DIR", str(tmp_path / "index"))
+    monkeypatch.setattr(database, "db_connection", lambda: contextlib.nullcontext(Connection()))
+    monkeypatch.setattr(database, "load_catalog_frame", load_catalog_frame)
+    monkeypatch.setattr(database, "fetch_frame_batches",
+                        lambda sql, params=None: iter([table["rows"][["IMAGE_FILENAME"]]]))
+    sync = database.CatalogSync(dict(CFG))
+    assert sync.index.info["watermark"] == "2026-01-01 00:00:00"
+
+    sync.sync()
+    row = sync.index.metadata[sync.index.metadata["IMAGE_FILENAME"] == touched]
+    assert row["TITLE"].tolist() == ["Renamed"]
+    assert sync.last_changes == {"upserts": 1, "deletes": 0}
+
+
+def test_listeners_fire_only_when_the_catalog_changed(catalog_sync, monkeypatch):
+    calls = []
+    catalog_sync.add_listener(lambda: calls.append(1))
+    catalog_sync.sync()
+    assert calls == []
+
+    renamed = catalog_sync.index.metadata.head(1).assign(TITLE="Renamed")
+    renamed["VECTOR_TEXT"] = [catalog_sync.index.vectors[0].tolist()]
+    monkeypatch.setattr(database.CatalogSync, "_pull_watermark", lambda self: (renamed, set(), "2026-01-02"))
+    catalog_sync.sync()
+    assert calls == [1]
@@ -0,0 +1,20 @@
+import pandas as pd
+from modules.context import title_key, deduplicate
+
+
+def test_short_brand_only_stripped_as_leading_word():
+    keys = title_key(pd.Series(["On Running Cloud 5", "Running Shoe On Sale"]), pd.Series(["On", "On"]))
+    assert keys.tolist() == ["running cloud 5|on", "running shoe on sale|on"]
+
+
+def test_multi_word_brand_with_punctuation():
+    keys = title_key(pd.Series(["Dr. Martens 1460 Boot"]), pd.Series(["Dr. Martens"]))
+    assert keys.tolist() == ["1460 boot|dr. martens"]
+
+
+def test_size_variants_deduplicated():
+    df = pd.DataFrame({
+        "TITLE": ["Nike Pegasus 40 Men's Size 10", "Nike Pegasus 40 Men's Size 11", "Nike Vomero 17"],
+        "BRAND": ["Nike", "Nike", "Nike"],
+    })
+    assert deduplicate(df)["TITLE"].tolist() == ["Nike Pegasus 40 Men's Size 10", "Nike Vomero 17"]
@@ -0,0 +1,98 @@
+import contextlib
+import threading
+import time
+import pytest
+from modules.cortex import CortexClient, CortexError, CortexTimeoutError
+
+
+class FakeCursor:
+    def __init__(self, server):
+        self.server = server
+
+    def execute_async(self, sql, params=None):
+        self.sfqid = self.server.start(params[0])
+
+    def execute(self, sql, params=None):
+        pass
+
+    def get_results_from_sfqid(self, query_id):
+        self.row = (self.server.results[query_id],)
+
+    def fetchone(self):
+        return self.row
+
+
+class FakeServer:
+    """Queries finish instantly; `fail_release` makes returning the connection raise that many times."""
+
+    def __init__(self, fail_release=0):
+        self.fail_release = fail_release
+        self.results = {}
+        self.started = []
+        self._lock = threading.Lock()
+
+    def start(self, value):
+        with self._lock:
+            query_id = f"q{len(self.started)}"
+            self.started.append(value)
+            self.results[query_id] = value
+        return query_id
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def get_query_status_throw_if_error(self, query_id):
+        return "SUCCESS"
+
+    def is_still_running(self, status):
+        return False
+
+    @contextlib.contextmanager
+    def connection(self):
+        yield self
+        if self.fail_release:
+            self.fail_release -= 1
+            raise RuntimeError("connection could not be returned to the pool")
+
+
+def test_release_failure_does_not_restart_started_jobs():
+    server = FakeServer(fail_release=1)
+    client = CortexClient(server.connection, backoff=0.01, poll_interval=0.01)
+
+    assert client.run("SELECT %s", ("a",), wait=5) == "a"
+    time.sleep(0.1)  # a wrongly requeued copy would start on the next rounds
+    assert server.started == ["a"]
+    assert client.stats()["running"] == 0 and client.stats()["completed"] == 1
+
+
+def test_dead_poller_is_restarted():
+    server = FakeServer()
+    client = CortexClient(server.connection, poll_interval=0.01)
+    client._poller = threading.Thread(target=lambda: None)
+    client._poller.start()
+    client._poller.join()
+
+    assert client.run("SELECT %s", ("b",), wait=5) == "b"
+
+
+def test_default_wait_covers_every_attempt():
+    @contextlib.contextmanager
+    def never_connects():
+        raise RuntimeError("no connection")
+        yield
+
+    client = CortexClient(never_connects, timeout=0.05, retries=1, backoff=0.01, poll_interval=0.01)
+    assert client.max_wait() == pytest.approx(0.05 * 2 + 0.01 + 0.01)
+    started = time.monotonic()
+    with pytest.raises(CortexError, match="after 2 attempts"):
+        client.run("SELECT %s", ("c",))
+    assert time.monotonic() - started < client.max_wait() + 1
+
+
+def test_run_raises_cortex_timeout_when_nothing_comes_back():
+    server = FakeServer()
+    server.is_still_running = lambda status: True
+    client = CortexClient(server.connection, timeout=60, poll_interval=0.01)
+
+    with pytest.raises(CortexTimeoutError):
+        client.run("SELECT %s", ("d",), wait=0.05)
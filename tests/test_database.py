@@ -0,0 +1,21 @@
+import pandas as pd
+from modules import database
+from modules.vector_index import BATCH_RESULT_COLUMNS
+
+
+def test_batch_search_splits_statements_and_offsets_query_index(monkeypatch):
+    statements = []
+
+    def search_batch_in_snowflake(query_vectors, limit=5, filters=None, vector_weights=None):
+        statements.append(len(query_vectors))
+        return pd.DataFrame({"QUERY_INDEX": range(len(query_vectors)), "RANK": 1,
+                             "IMAGE_FILENAME": [f"{v[0]:.0f}.jpg" for v in query_vectors]}).reindex(columns=BATCH_RESULT_COLUMNS)
+
+    monkeypatch.setattr(database, "get_search_config", lambda: {"backend": "snowflake", "vector_weights": None})
+    monkeypatch.setattr(database, "search_batch_in_snowflake", search_batch_in_snowflake)
+    df = database.search_products_by_vectors([[float(i)] for i in range(5)], limit=1, batch_size=2)
+
+    assert statements == [2, 2, 1]
+    assert df["QUERY_INDEX"].tolist() == [0, 1, 2, 3, 4]
+    assert df["IMAGE_FILENAME"].tolist() == [f"{i}.jpg" for i in range(5)]
+    assert database.search_products_by_vectors([]).columns.tolist() == BATCH_RESULT_COLUMNS
@@ -0,0 +1,69 @@
+import threading
+import time
+import pytest
+from modules import embedder
+from modules.embedding_cache import EmbeddingCache, make_key
+
+
+class FakeVoyage:
+    """Embeds each text as [len(text)]; records the size of every request."""
+
+    def __init__(self, release=None):
+        self.batches = []
+        self.release = release
+
+    def multimodal_embed(self, inputs, model=None, input_type=None):
+        if self.release is not None and len(self.batches) > 0:
+            self.release.wait(2)
+        self.batches.append(len(inputs))
+        return type("Result", (), {"embeddings": [[float(len(parts[0]))] for parts in inputs]})()
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = EmbeddingCache()
+    monkeypatch.setattr(embedder, "get_embedding_cache", lambda: cache)
+    return cache
+
+
+def test_chunks_respect_input_and_token_limits(cache):
+    voyage = FakeVoyage()
+    texts = [f"text number {i:03d}" for i in range(10)]  # 15 chars = 3 tokens each
+    vectors = list(embedder.embed_batch(texts, voyage_client=voyage, max_inputs=4))
+    assert sorted(voyage.batches) == [2, 4, 4]
+    assert vectors == [[15.0]] * 10
+
+    voyage = FakeVoyage()
+    list(embedder.embed_batch([f"other text {i:03d}" for i in range(6)], voyage_client=voyage, max_tokens=7))
+    assert voyage.batches == [2, 2, 2]
+
+
+def test_cache_hits_skip_the_api(cache):
+    cache.put(make_key("text", "cached", embedder.MODEL_NAME, "query"), [-1.0])
+    voyage = FakeVoyage()
+    vectors = list(embedder.embed_batch(["cached", "new one"], input_type="query", voyage_client=voyage))
+    assert vectors == [[-1.0], [7.0]]
+    assert voyage.batches == [1]
+
+    voyage = FakeVoyage()
+    assert list(embedder.embed_batch(["cached", "new one"], input_type="query", voyage_client=voyage)) == [[-1.0], [7.0]]
+    assert voyage.batches == []
+
+
+def test_output_keeps_input_order_and_streams_finished_chunks(cache):
+    release = threading.Event()
+    voyage = FakeVoyage(release)
+    consumed = []
+
+    def texts():
+        for n in range(1, 13):
+            time.sleep(0.02)  # a slow source: the first chunk finishes while later items are read
+            consumed.append(n)
+            yield "a" * n
+
+    results = embedder.embed_batch(texts(), voyage_client=voyage, max_inputs=2, max_workers=8, use_cache=False)
+    # Later chunks block until released; the first one's vectors come out before the source is exhausted
+    assert [next(results), next(results)] == [[1.0], [2.0]]
+    assert len(consumed) < 12
+    release.set()
+    assert list(results) == [[float(n)] for n in range(3, 13)]
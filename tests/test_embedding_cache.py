@@ -0,0 +1,29 @@
+import sqlite3
+import time
+from modules.embedding_cache import EmbeddingCache
+
+
+def _disk_keys(path):
+    with sqlite3.connect(path) as db:
+        return {row[0] for row in db.execute("SELECT key FROM embeddings")}
+
+
+def test_disk_tier_is_pruned_to_its_cap(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite3")
+    cache = EmbeddingCache(max_entries=100, disk_path=path, disk_max_entries=10, prune_every=5)
+    for i in range(20):
+        cache.put(f"k{i}", [float(i)])
+        time.sleep(0.001)  # distinct stored_at, so "oldest first" is well defined
+    assert _disk_keys(path) == {f"k{i}" for i in range(10, 20)}
+    assert cache.stats()["prunes"] == 4
+
+
+def test_prune_drops_expired_rows(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite3")
+    cache = EmbeddingCache(disk_path=path, ttl_seconds=60, prune_every=0)
+    cache.put("old", [1.0])
+    with sqlite3.connect(path) as db:
+        db.execute("UPDATE embeddings SET stored_at = ?", (time.time() - 3600,))
+    cache.put("new", [2.0])
+    cache.prune_disk()
+    assert _disk_keys(path) == {"new"}
@@ -0,0 +1,34 @@
+import threading
+import time
+import pandas as pd
+from modules.featured import FeaturedCollection
+
+
+def _pool():
+    return pd.DataFrame({"IMAGE_FILENAME": [f"{i}.jpg" for i in range(30)], "TITLE": ["Shoe"] * 30})
+
+
+def test_cold_start_builds_the_first_pool_in_the_background(tmp_path):
+    release = threading.Event()
+    featured = FeaturedCollection(lambda: release.wait(5) and _pool(), snapshot_path=str(tmp_path / "featured.json"))
+    featured.start()  # returns while the first load is still blocked
+
+    assert featured.page().empty
+    release.set()
+    deadline = time.time() + 5
+    while featured.page().empty and time.time() < deadline:
+        time.sleep(0.01)
+    assert len(featured.page()) == featured.page_size
+    assert (tmp_path / "featured.json").exists()
+
+
+def test_snapshot_is_served_without_a_blocking_refresh(tmp_path):
+    path = str(tmp_path / "featured.json")
+    FeaturedCollection(_pool, snapshot_path=path).refresh()
+
+    calls = []
+    featured = FeaturedCollection(lambda: calls.append(1) or _pool(), snapshot_path=path)
+    featured.start()
+
+    assert len(featured.page()) == featured.page_size
+    assert calls == []
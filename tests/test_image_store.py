@@ -0,0 +1,24 @@
+import gzip
+import os
+from concurrent.futures import ThreadPoolExecutor
+from modules.image_store import ImageStore
+
+
+def _gz(path, payload):
+    with gzip.open(path, "wb") as f:
+        f.write(payload)
+    return path
+
+
+def test_concurrent_puts_of_one_file_never_publish_a_partial_write(tmp_path):
+    store = ImageStore(str(tmp_path / "images"))
+    payloads = [bytes([i]) * 2_000_000 for i in range(8)]
+    sources = [_gz(str(tmp_path / f"src{i}.jpg.gz"), p) for i, p in enumerate(payloads)]
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda src: store.put_file("shoe.jpg", src), sources))
+
+    with open(store.get("shoe.jpg"), "rb") as f:
+        assert f.read() in payloads
+    leftovers = [n for _, _, names in os.walk(store.directory) for n in names if n.endswith(".part")]
+    assert leftovers == []
@@ -0,0 +1,51 @@
+import pytest
+from modules import intent
+from modules.intent import PrototypeIntentClassifier, SmartRouter, classify_footwear, rule_route
+
+
+@pytest.fixture
+def router(embed, monkeypatch):
+    llm_calls = []
+
+    def llm_route(user_text, image_desc, llm):
+        llm_calls.append(user_text)
+        return {"is_footwear": True, "intent": "SEARCH"}
+
+    monkeypatch.setattr(intent, "llm_route", llm_route)
+    classifier = PrototypeIntentClassifier(lambda texts: [embed(t) for t in texts], threshold=0.05)
+    router = SmartRouter(embed, classifier, llm_factory=lambda: None)
+    router.llm_calls = llm_calls
+    return router
+
+
+def test_rules_catch_greetings_and_meta_questions():
+    assert rule_route("hello") == {"is_footwear": True, "intent": "CHAT"}
+    assert rule_route("which llm are you") == {"is_footwear": True, "intent": "CHAT"}
+    assert rule_route("show me white sneakers") is None
+
+
+def test_footwear_is_read_from_the_vision_description():
+    assert classify_footwear("No image uploaded.") is True
+    assert classify_footwear("A red leather boot with a zip") is True
+    assert classify_footwear("This is a cat on a sofa. It is not footwear.") is False
+    assert classify_footwear("A blurry photo") is None
+
+
+def test_confident_local_tier_skips_the_llm(router):
+    assert router.route("show me white sneakers", "No image uploaded.") == {"is_footwear": True, "intent": "SEARCH"}
+    assert router.route("thanks, that's helpful", "No image uploaded.")["intent"] == "CHAT"
+    assert router.counters["local"] == 2 and router.llm_calls == []
+
+
+def test_unsure_queries_fall_back_to_the_llm_once(router):
+    router.classifier.threshold = 2.0  # nothing is confident enough
+    for _ in range(2):
+        assert router.route("zzz qqq", "No image uploaded.")["intent"] == "SEARCH"
+    assert router.llm_calls == ["zzz qqq"]
+    assert router.counters["llm"] == 1 and router.counters["memo"] == 1
+
+
+def test_non_footwear_image_is_chat_without_any_model(router):
+    route = router.route("how much is this", "A dog in a park. Not footwear.")
+    assert route == {"is_footwear": False, "intent": "CHAT"}
+    assert router.llm_calls == []
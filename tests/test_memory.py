@@ -0,0 +1,53 @@
+import pandas as pd
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from modules.memory import ProductCache, build_chat_history, new_memory_state, schedule_summary, select_window
+
+
+def _conversation(turns):
+    messages = [{"role": "assistant", "content": "Hi! I'm SoleMate."}]
+    for i in range(turns):
+        messages.append({"role": "user", "content": f"show me running shoes option {i}"})
+        messages.append({"role": "assistant", "content": "Here are some options. " * 20})
+    return messages
+
+
+def test_window_respects_token_budget_and_message_cap():
+    messages = _conversation(10)
+    assert select_window(messages, token_budget=10_000, max_messages=4) == len(messages) - 4
+    start = select_window(messages, token_budget=300, max_messages=100)
+    kept = sum(len(m["content"]) // 4 for m in messages[start:])
+    assert 0 < start < len(messages) and kept <= 300
+
+
+def test_history_leads_with_the_summary_only_when_turns_were_dropped():
+    state = new_memory_state()
+    state["summary"] = "User wants white runners under $100."
+    short = _conversation(1)
+    assert [m.type for m in build_chat_history(short, state)] == ["ai", "human", "ai"]
+
+    history = build_chat_history(_conversation(10), state, token_budget=300)
+    assert history[0].type == "system" and "under $100" in history[0].content
+    assert history[-1].type == "ai"
+
+
+def test_summary_folds_evicted_turns_in_the_background():
+    messages, state = _conversation(10), new_memory_state()
+    assert schedule_summary(_conversation(1), state, llm_factory=None) is None  # nothing evicted yet
+
+    llm = FakeListChatModel(responses=["  Prefers running shoes.  "])
+    future = schedule_summary(messages, state, lambda: llm, token_budget=300)
+    future.result(timeout=5)
+    assert state["summary"] == "Prefers running shoes."
+    assert state["summarized_upto"] == select_window(messages, 300) and not state["pending"]
+    assert schedule_summary(messages, state, lambda: llm, token_budget=300) is None  # already covered
+
+
+def test_product_cache_rehydrates_evicted_rows():
+    cache = ProductCache(capacity=2)
+    ids = cache.put(pd.DataFrame({"IMAGE_FILENAME": ["a", "b", "c"], "TITLE": ["A", "B", "C"]}))
+    assert ids == ["a", "b", "c"]
+
+    loads = []
+    loader = lambda missing: loads.append(missing) or pd.DataFrame({"IMAGE_FILENAME": missing, "TITLE": ["A*"]})
+    assert cache.frame(["c", "a"], loader=loader)["TITLE"].tolist() == ["C", "A*"]
+    assert loads == [["a"]]
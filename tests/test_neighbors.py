@@ -0,0 +1,16 @@
+from modules import database
+from modules.neighbors import NeighborTable
+from modules.vector_index import LocalVectorIndex
+
+
+def test_table_built_after_startup_is_picked_up(tmp_path, monkeypatch, make_catalog):
+    monkeypatch.setattr(database, "NEIGHBORS_DIR", str(tmp_path / "neighbors"))
+    assert database.get_neighbor_table() is None
+    assert database.get_similar_products("img_000001.jpg").empty
+
+    NeighborTable.build(LocalVectorIndex.from_frame(make_catalog(40)), k=5).save(database.NEIGHBORS_DIR)
+
+    table = database.get_neighbor_table()
+    assert table is not None and len(table) == 40
+    similar = database.get_similar_products("img_000001.jpg", limit=3)
+    assert len(similar) == 3 and "img_000001.jpg" not in similar["IMAGE_FILENAME"].tolist()
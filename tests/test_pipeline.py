@@ -0,0 +1,72 @@
+import json
+import pandas as pd
+from modules.memory import new_memory_state
+from modules.pipeline import answer_turn, record_answer, DIRECT_RESPONSE_THOUGHT
+from modules.response_cache import SemanticResponseCache
+
+ANSWER = {"classification": "recommendation", "thought": "Picked the cheapest.", "response_text": "Try these."}
+
+
+class FakeChain:
+    def __init__(self, text):
+        self.text = text
+        self.calls = []
+
+    def stream(self, inputs):
+        self.calls.append(inputs)
+        for i in range(0, len(self.text), 7):
+            yield self.text[i:i + 7]
+
+    def invoke(self, inputs):
+        self.calls.append(inputs)
+        return self.text
+
+
+def _turn(chain, response_cache, searches, intent="SEARCH", text="nike runners under $100"):
+    messages = [{"role": "user", "content": text}]
+
+    def search(vector, limit, filters=None):
+        searches.append(filters)
+        return pd.DataFrame({"TITLE": ["Nike Pegasus"], "BRAND": ["Nike"], "PRICE": ["$90"],
+                             "PRODUCT_DETAILS_CLEAN": ["foam"], "IMAGE_FILENAME": ["a.jpg"]})
+
+    return answer_turn(
+        text, None, messages, new_memory_state(),
+        analyze_image=None,
+        route=lambda text, desc: {"intent": intent, "is_footwear": True},
+        embed_text=lambda text: [1.0, 0.0],
+        embed_image=None,
+        search=search,
+        known_brands=["Nike"],
+        chain=chain,
+        response_cache=response_cache,
+        build_context=lambda df: "ctx",
+    )
+
+
+def test_answer_turn_applies_filters_and_caches_search_answers():
+    chain, cache, searches = FakeChain(json.dumps(ANSWER)), SemanticResponseCache(), []
+    first = _turn(chain, cache, searches)
+    second = _turn(chain, cache, searches)
+
+    assert first["answer"]["response_text"] == "Try these."
+    assert not first["cached"] and second["cached"]
+    assert len(chain.calls) == 1
+    assert chain.calls[0]["context"] == "ctx"
+    assert searches[0]["brands"] == ["Nike"]
+    assert {"context", "generation", "total"} <= set(second["timings"])
+
+
+def test_answer_turn_wraps_non_json_output_as_chat():
+    chain = FakeChain("Hello there!")
+    turn = _turn(chain, SemanticResponseCache(), [], intent="CHAT", text="hi")
+
+    assert turn["products_df"].empty and not turn["cached"]
+    assert turn["answer"] == {"classification": "chat", "thought": DIRECT_RESPONSE_THOUGHT, "response_text": "Hello there!"}
+
+
+def test_record_answer_appends_assistant_message():
+    messages = [{"role": "user", "content": "hi"}]
+    record_answer(messages, new_memory_state(), {"response_text": "Hey", "thought": "t"}, llm_factory=None,
+                  product_ids=["a.jpg"])
+    assert messages[-1] == {"role": "assistant", "content": "Hey", "thought": "t", "product_ids": ["a.jpg"]}
@@ -0,0 +1,51 @@
+import time
+from modules.pool import ConnectionPool
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+
+    def is_closed(self):
+        return self.closed
+
+    def close(self):
+        self.closed = True
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql):
+        return self
+
+    def fetchone(self):
+        return (1,)
+
+
+def test_warm_up_reaches_min_size_with_idle_connections():
+    pool = ConnectionPool(FakeConnection, min_size=3, max_size=5)
+    pool.release(pool.acquire())  # one idle connection already there
+    pool.warm_up()
+    stats = pool.stats()
+    assert stats["idle"] == 3 and stats["in_use"] == 0 and stats["creations"] == 3
+
+
+def test_evict_idle_keeps_freshest_connections():
+    pool = ConnectionPool(FakeConnection, min_size=1, max_size=5, max_idle_seconds=10)
+    old, fresh = FakeConnection(), FakeConnection()
+    now = time.monotonic()
+    pool._idle = [(old, now - 100), (fresh, now - 50)]  # oldest first, like release() appends
+    pool.evict_idle()
+    assert [conn for conn, _ in pool._idle] == [fresh]
+    assert old.closed and not fresh.closed
+
+
+def test_keepalive_discards_dead_connections():
+    pool = ConnectionPool(FakeConnection, min_size=0, max_size=5, health_check_interval=10)
+    dead, alive = FakeConnection(), FakeConnection()
+    dead.closed = True
+    now = time.monotonic()
+    pool._idle = [(dead, now - 100), (alive, now - 100)]
+    pool.keepalive()
+    stats = pool.stats()
+    assert stats["health_check_failures"] == 1 and stats["idle"] == 1 and stats["in_use"] == 0
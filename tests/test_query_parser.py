@@ -0,0 +1,33 @@
+import pytest
+from modules.query_parser import parse_query
+
+BRANDS = ["Nike", "Adidas", "On", "New Balance"]
+
+
+@pytest.mark.parametrize("text", ["Nike Air Max 90 in white", "air max 270 size 42", "Nike Air Max 97 min 2 pairs"])
+def test_model_names_are_not_price_caps(text):
+    filters = parse_query(text, BRANDS)
+    assert filters["max_price"] is None and filters["min_price"] is None
+
+
+@pytest.mark.parametrize("text, low, high", [
+    ("Nike running shoes under $80", None, 80.0),
+    ("air max under 150", None, 150.0),
+    ("sneakers max $120", None, 120.0),
+    ("boots max price 200", None, 200.0),
+    ("budget max 90 dollars", None, 90.0),
+    ("sandals max 60 usd", None, 60.0),
+    ("min price 50 loafers", 50.0, None),
+    ("something over $100", 100.0, None),
+    ("between $50 and $100", 50.0, 100.0),
+    ("$40 - $70 slides", 40.0, 70.0),
+])
+def test_price_bounds(text, low, high):
+    filters = parse_query(text, BRANDS)
+    assert (filters["min_price"], filters["max_price"]) == (low, high)
+
+
+def test_brands_and_category():
+    filters = parse_query("Nike Air Max 90 running", BRANDS)
+    assert filters["brands"] == ["Nike"] and filters["category"] == "running"
+    assert parse_query("I want to go on a run", BRANDS)["brands"] == []
@@ -0,0 +1,48 @@
+import time
+import pandas as pd
+from modules.response_cache import SemanticResponseCache, fingerprint, products_fingerprint
+
+ANSWER = {"classification": "recommendation", "response_text": "Try the Pegasus."}
+PRODUCTS = pd.DataFrame({"IMAGE_FILENAME": ["a.jpg", "b.jpg"], "TITLE": ["Pegasus", "Ultraboost"],
+                         "PRICE": ["$90", "$180"], "PRODUCT_DETAILS_CLEAN": ["foam", "boost"]})
+CONTEXT = fingerprint("SEARCH", True, "text")
+
+
+def test_near_duplicate_query_with_same_products_hits(embed):
+    cache = SemanticResponseCache(threshold=0.9)
+    cache.store(embed("white nike running shoes"), CONTEXT, products_fingerprint(PRODUCTS), ANSWER, latency=2.5)
+
+    assert cache.lookup(embed("nike white running shoes"), CONTEXT, products_fingerprint(PRODUCTS)) == ANSWER
+    assert cache.lookup(embed("black leather boots"), CONTEXT, products_fingerprint(PRODUCTS)) is None
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1 and stats["saved_seconds"] == 2.5
+
+
+def test_key_covers_context_and_catalog_content(embed):
+    cache = SemanticResponseCache()
+    vector = embed("white nike running shoes")
+    cache.store(vector, CONTEXT, products_fingerprint(PRODUCTS), ANSWER, latency=1.0)
+
+    repriced = PRODUCTS.assign(PRICE=["$70", "$180"])
+    assert products_fingerprint(repriced) != products_fingerprint(PRODUCTS)
+    assert cache.lookup(vector, CONTEXT, products_fingerprint(repriced)) is None
+    assert cache.lookup(vector, fingerprint("SEARCH", True, "image"), products_fingerprint(PRODUCTS)) is None
+
+
+def test_invalidate_ttl_and_capacity(embed):
+    cache = SemanticResponseCache(ttl_seconds=60, capacity=2)
+    key = products_fingerprint(PRODUCTS)
+    for text in ("red sandals", "blue loafers", "grey boots"):
+        cache.store(embed(text), CONTEXT, key, ANSWER, latency=1.0)
+    assert cache.stats()["entries"] == 2
+    assert cache.lookup(embed("red sandals"), CONTEXT, key) is None  # evicted first
+
+    cache.ttl_seconds = 0
+    time.sleep(0.01)
+    assert cache.lookup(embed("grey boots"), CONTEXT, key) is None
+
+    cache.ttl_seconds = 60
+    cache.store(embed("grey boots"), CONTEXT, key, ANSWER, latency=1.0)
+    cache.invalidate()
+    assert cache.lookup(embed("grey boots"), CONTEXT, key) is None
+    assert cache.stats()["invalidations"] == 1
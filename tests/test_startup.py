@@ -0,0 +1,13 @@
+from modules.startup import deferred_violations, entrypoint_imports, profile_imports
+
+# Generous: catches a heavy new top-level import, not normal jitter (~1-1.5 s today)
+BUDGET_MS = 5000
+
+
+def test_startup_imports_stay_lean():
+    statements = entrypoint_imports()
+    assert any("modules.database" in s for s in statements)
+
+    total_ms, _, loaded = profile_imports(statements)
+    assert deferred_violations(loaded) == []
+    assert total_ms < BUDGET_MS
@@ -0,0 +1,83 @@
+import json
+import threading
+import urllib.request
+import pytest
+from modules import telemetry
+from modules.telemetry import MetricsRegistry, Telemetry, format_waterfall, waterfall
+
+
+def test_spans_nest_per_thread_and_record_errors():
+    hub = Telemetry()
+    trace = hub.start_turn(has_image=False)
+    with telemetry.span("retrieval") as outer:
+        with telemetry.span("vector_search", rows=3):
+            telemetry.annotate(backend="local")
+
+    def _worker():
+        telemetry.activate(trace)
+        with pytest.raises(ValueError):
+            with telemetry.span("vision"):
+                raise ValueError("boom")
+
+    worker = threading.Thread(target=_worker)
+    worker.start()
+    worker.join()
+    hub.finish(trace)
+
+    spans = {s.name: s for s in trace.spans}
+    assert spans["vector_search"].parent_id == outer.span_id
+    assert spans["vector_search"].attributes == {"rows": 3, "backend": "local"}
+    assert spans["vision"].parent_id == trace.root.span_id  # other threads hang off the root
+    assert spans["vision"].status == "ERROR" and spans["vision"].attributes["error"] == "ValueError"
+    assert telemetry.current_trace() is None
+
+
+def test_span_is_a_noop_without_a_turn():
+    telemetry.activate(None)
+    with telemetry.span("anything") as s:
+        s.set(ignored=True)
+    telemetry.annotate(ignored=True)
+
+
+def test_registry_renders_prometheus_text():
+    registry = MetricsRegistry(buckets=(0.1, 1.0))
+    registry.inc("solemate_turns_total", intent="SEARCH")
+    registry.inc("solemate_turns_total", intent="SEARCH")
+    registry.observe("solemate_stage_duration_seconds", 0.5, stage="routing")
+    text = registry.render()
+    assert 'solemate_turns_total{intent="SEARCH"} 2' in text
+    assert 'solemate_stage_duration_seconds_bucket{le="0.1",stage="routing"} 0' in text
+    assert 'solemate_stage_duration_seconds_bucket{le="1.0",stage="routing"} 1' in text
+    assert 'solemate_stage_duration_seconds_bucket{le="+Inf",stage="routing"} 1' in text
+    assert 'solemate_stage_duration_seconds_count{stage="routing"} 1' in text
+
+
+def test_finished_turns_are_exported(tmp_path):
+    spans_path, metrics_path = tmp_path / "spans.jsonl", tmp_path / "metrics.prom"
+    hub = Telemetry(spans_path=str(spans_path), metrics_path=str(metrics_path))
+    trace = hub.start_turn()
+    trace.root.set(intent="SEARCH")
+    with telemetry.span("response_cache") as s:
+        s.set(cache_hit=True)
+    hub.finish(trace)
+
+    lines = [json.loads(line) for line in spans_path.read_text().splitlines()]
+    assert [l["name"] for l in lines] == ["turn", "response_cache"]
+    assert {l["traceId"] for l in lines} == {trace.trace_id}
+    metrics = metrics_path.read_text()
+    assert 'solemate_turns_total{intent="SEARCH"} 1' in metrics
+    assert 'solemate_cache_lookups_total{hit="true",stage="response_cache"} 1' in metrics
+
+    rows = waterfall(trace)
+    assert [r["span"] for r in rows] == ["turn", "  response_cache"]
+    assert "response_cache" in format_waterfall(trace)
+
+
+def test_metrics_endpoint_serves_the_registry():
+    hub = Telemetry()
+    hub.registry.inc("solemate_turns_total", intent="CHAT")
+    hub.serve(0)
+    port = hub._server.server_address[1]
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+        assert 'solemate_turns_total{intent="CHAT"} 1' in response.read().decode()
+    hub._server.shutdown()
@@ -0,0 +1,51 @@
+import numpy as np
+from modules.vector_index import LocalVectorIndex
+
+
+def test_snapshot_round_trip(tmp_path, make_catalog, embed):
+    query = embed("white running shoe")
+    index = LocalVectorIndex.from_frame(make_catalog(500)).build_ivf(n_lists=8)
+    index.info["watermark"] = "2026-01-01"
+    index.save(tmp_path)
+
+    loaded = LocalVectorIndex.load(tmp_path)
+    assert len(loaded) == len(index) and loaded.info == index.info
+    np.testing.assert_array_equal(loaded.vectors, index.vectors)
+    np.testing.assert_array_equal(loaded.assignments, index.assignments)
+    for kwargs in ({}, {"n_probe": 2}):
+        assert loaded.search(query, limit=10, **kwargs).equals(index.search(query, limit=10, **kwargs))
+
+    # Filters and the keyword leg work on a loaded index too
+    filters = {"brands": ["Nike"], "max_price": 120, "keywords": ["running"]}
+    result = loaded.search(query, limit=10, filters=filters, keyword_weight=0.3)
+    assert not result.empty and (result["BRAND"] == "Nike").all()
+
+
+def test_flat_save_over_ivf_snapshot_drops_partitions(tmp_path, make_catalog):
+    catalog = make_catalog(200)
+    LocalVectorIndex.from_frame(catalog).build_ivf(n_lists=4).save(tmp_path)
+    LocalVectorIndex.from_frame(catalog).save(tmp_path)
+
+    loaded = LocalVectorIndex.load(tmp_path)
+    assert loaded.centroids is None and loaded.assignments is None
+    assert not (tmp_path / "centroids.npy").exists()
+
+
+def test_missing_snapshot_loads_none(tmp_path):
+    assert LocalVectorIndex.load(tmp_path / "nothing") is None
+
+
+def test_search_many_matches_one_search_per_query(make_catalog, embed):
+    index = LocalVectorIndex.from_frame(make_catalog(300))
+    queries = [embed(q) for q in ("white running shoe", "black leather boot", "red sandal")]
+    filters = {"brands": ["Nike", "Vans"], "max_price": 150}
+
+    for kwargs in ({}, {"filters": filters}):
+        batch = index.search_many(queries, limit=5, **kwargs)
+        assert batch["QUERY_INDEX"].tolist() == [i for i in range(3) for _ in range(5)]
+        assert batch["RANK"].tolist() == list(range(1, 6)) * 3
+        for i, query in enumerate(queries):
+            single = index.search(query, limit=5, **kwargs)
+            rows = batch[batch["QUERY_INDEX"] == i]
+            assert rows["IMAGE_FILENAME"].tolist() == single["IMAGE_FILENAME"].tolist()
+            np.testing.assert_allclose(rows["SIMILARITY_SCORE"], single["SIMILARITY_SCORE"], rtol=1e-5)
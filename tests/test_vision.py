@@ -0,0 +1,76 @@
+import contextlib
+import io
+import time
+from email.utils import formatdate
+from modules.vision import VisionService, content_hash
+
+
+class StageCursor:
+    """Answers PUT / LIST for one stage whose files have a given age."""
+
+    def __init__(self, stage):
+        self.stage = stage
+        self.rows = []
+
+    def execute(self, sql, params=None):
+        if sql.startswith("PUT"):
+            name = sql.split("'")[1].rsplit("/", 1)[-1]
+            if "OVERWRITE=FALSE" in sql and name in self.stage.files:
+                status = "SKIPPED"
+            else:
+                status = "UPLOADED"
+                self.stage.files[name] = time.time()
+                self.stage.uploads += 1
+            self.rows = [(name, name, 1, 1, "NONE", "NONE", status, "")]
+        elif sql.startswith("LIST"):
+            name = sql.rstrip("/").rsplit("/", 1)[-1]
+            self.rows = [(f"temp_vision/{n}", 1, "md5", formatdate(t, usegmt=True))
+                         for n, t in self.stage.files.items() if name in (n, "temp_vision")]
+        return self
+
+    def fetchone(self):
+        return self.rows[0]
+
+    def fetchall(self):
+        return self.rows
+
+
+class Stage:
+    def __init__(self):
+        self.files = {}
+        self.uploads = 0
+
+    @contextlib.contextmanager
+    def connection(self):
+        cursor = StageCursor(self)
+        yield type("Conn", (), {"cursor": lambda _self: cursor})()
+
+
+class FakeCortex:
+    def complete_file(self, model, prompt, stage_path, file_path):
+        return "a sneaker"
+
+
+def _service(stage):
+    return VisionService(stage.connection, "@STAGE", cortex=FakeCortex(), staged_ttl=3600)
+
+
+def test_old_skipped_file_is_reuploaded_and_aged_correctly():
+    stage, data = Stage(), b"not really a jpeg"
+    service = _service(stage)
+    digest = content_hash(data)
+    stage.files[f"{digest}.jpg"] = time.time() - 3500  # staged long ago, about to expire
+
+    assert service.describe(io.BytesIO(data)) == "a sneaker"
+    assert stage.uploads == 1  # re-uploaded instead of trusting the old copy
+    assert time.time() - service._staged[digest] < 60
+
+
+def test_recent_skipped_file_keeps_its_real_age():
+    stage, data = Stage(), b"another image"
+    service = _service(stage)
+    stage.files[f"{content_hash(data)}.jpg"] = time.time() - 600
+
+    service.describe(io.BytesIO(data))
+    assert stage.uploads == 0
+    assert 500 < time.time() - service._staged[content_hash(data)] < 700